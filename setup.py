@@ -1,8 +1,34 @@
 #!/usr/bin/env python3
 
 import os
+from subprocess import run, PIPE
 from setuptools import setup, find_packages
-from src.glados.__init__ import __version__
+
+#-------------------------------------------------------------------------------
+def updateVersion():
+    """Update the version file based on the git tag if possible. This runs at
+    build time only so that importing glados never spawns a subprocess.
+    """
+
+    versionFile = os.path.join("src", "glados", "version.py")
+
+    cmd = ["git", "describe", "--tags"]
+    proc = run(cmd, stdout=PIPE, stderr=PIPE, check=False)
+    if proc.returncode == 0:
+        gitVersion = proc.stdout.decode("utf-8").rstrip().split("-")
+        _version = gitVersion[0].lstrip("v")
+        if len(gitVersion) > 1:
+            _version += f"+{gitVersion[1]}"
+        if len(gitVersion) > 2:
+            _version += f".{gitVersion[2]}"
+        with open(versionFile, "w", encoding="UTF-8") as fout:
+            print(f'"""Version."""\n__version__ = "{_version}"', file=fout)
+
+updateVersion()
+
+# pylint: disable=wrong-import-position
+from src.glados.version import __version__
+# pylint: enable=wrong-import-position
 
 with open("requirements.txt", "r", encoding="UTF-8") as finp:
     required = finp.read().splitlines()
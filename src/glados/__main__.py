@@ -18,6 +18,13 @@ def main():
 
     if action == "turret":
         turretServer(args.port, args.config)
+    elif action == "bench":
+        # Only import the benchmarks when they are run.
+        from .bench import runBench # pylint: disable=import-outside-toplevel
+        sys.exit(runBench(args))
 
 #-------------------------------------------------------------------------------
-main()
+# Guarded so that spawned worker processes (e.g. of HostRootTurret) which
+# import this module do not run it.
+if __name__ == "__main__":
+    main()
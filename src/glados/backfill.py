@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Backfill of points which were rendered but never scraped.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+from collections import deque
+import os
+import os.path as op
+import threading
+import time
+from typing import Deque, Dict, List, Optional, Tuple
+
+from prometheus_client.metrics_core import Metric
+from prometheus_client.openmetrics.exposition import generate_latest
+from prometheus_client.samples import Sample
+
+#-------------------------------------------------------------------------------
+class StaticCollector:
+    """Collector of a fixed list of metric families."""
+    #---------------------------------------------------------------------------
+    def __init__(self, families: List[Metric]):
+        """Initialization."""
+        self.families = families
+
+    #---------------------------------------------------------------------------
+    def collect(self):
+        """Yield the families."""
+        return iter(self.families)
+
+#-------------------------------------------------------------------------------
+def mergeRenders(
+    renders: List[Tuple[float, Tuple[Metric, ...]]]
+) -> List[Metric]:
+    """Merge the families of several renders into one family per name, with
+    every sample timestamped (by its render if it has no timestamp of its own)
+    and the samples of each series in time order.
+
+    Args:
+        renders: List of (render time, families).
+
+    Returns:
+        families: Merged families.
+    """
+
+    merged: Dict[str, Metric] = {}
+    for renderTime, families in renders:
+        for family in families:
+            if family.name not in merged:
+                merged[family.name] = Metric(
+                    family.name, family.documentation, family.type, family.unit
+                )
+            samples = merged[family.name].samples
+            for sample in family.samples:
+                timestamp = sample.timestamp
+                if timestamp is None:
+                    timestamp = renderTime
+                samples.append(Sample(
+                    sample.name, sample.labels, sample.value, timestamp,
+                    sample.exemplar
+                ))
+
+    for family in merged.values():
+        # Points already reported with their own timestamp in an earlier
+        # render appear more than once.
+        unique = {
+            (s.name, tuple(sorted(s.labels.items())), s.timestamp): s
+            for s in family.samples
+        }
+        family.samples = [unique[k] for k in sorted(unique, key=_sortKey)]
+
+    return list(merged.values())
+
+#-------------------------------------------------------------------------------
+def _sortKey(key: Tuple) -> Tuple:
+    """Order samples by labels, then time and keep the samples of each point
+    (e.g. a counter's _total and _created) together.
+    """
+    name, labels, timestamp = key
+    return (labels, float(timestamp), name)
+
+#-------------------------------------------------------------------------------
+class BackfillSink:
+    """Keep the last renders of the exposition and, when a scrape arrives after
+    a gap, write the renders nobody scraped to an OpenMetrics file in a local
+    directory. Scrapes only queue the renders; flush writes them, off the
+    scrape path. The files can be imported with
+    'promtool tsdb create-blocks-from openmetrics <file> <data dir>'.
+    """
+    #---------------------------------------------------------------------------
+    def __init__(
+        self, directory: str, gap: float = 60.0, maxRenders: int = 720
+    ):
+        """Initialization.
+
+        Args:
+            directory: Directory to write backfill files to.
+            gap: Seconds without a scrape after which unscraped renders are
+                written out.
+            maxRenders: Number of renders kept (older ones are dropped).
+        """
+        self.directory = directory
+        self.gap = gap
+        self.files: List[str] = []
+        self._renders: Deque[Tuple[float, Tuple[Metric, ...]]] = deque(
+            maxlen=maxRenders
+        )
+        # Unscraped renders waiting for flush, one list per gap.
+        self._pending: List[List[Tuple[float, Tuple[Metric, ...]]]] = []
+        self._lastScrape = time.time()
+        self._lock = threading.Lock()
+
+    #---------------------------------------------------------------------------
+    def record(self, renderTime: float, families: Tuple[Metric, ...]) -> None:
+        """Keep a render.
+
+        Args:
+            renderTime: Time of the render.
+            families: Immutable families of the render.
+        """
+        with self._lock:
+            self._renders.append((renderTime, families))
+
+    #---------------------------------------------------------------------------
+    def scraped(self, renderTime: float, now: Optional[float] = None) -> None:
+        """Note a scrape of the render made at renderTime, queuing earlier
+        renders to be written if the previous scrape was more than gap seconds
+        ago.
+
+        Args:
+            renderTime: Time of the render which was served.
+            now: Time of the scrape (None -> time.time()).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            lastScrape, self._lastScrape = self._lastScrape, now
+            if now - lastScrape > self.gap:
+                unscraped = [r for r in self._renders
+                             if lastScrape <= r[0] < renderTime]
+                if unscraped:
+                    self._pending.append(unscraped)
+            while self._renders and self._renders[0][0] <= renderTime:
+                self._renders.popleft()
+
+    #---------------------------------------------------------------------------
+    def flush(self) -> List[str]:
+        """Write out the renders queued by scrapes.
+
+        Returns:
+            fileNames: The files written.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        fileNames = [self.write(renders) for renders in pending]
+        return [f for f in fileNames if f]
+
+    #---------------------------------------------------------------------------
+    def write(
+        self, renders: List[Tuple[float, Tuple[Metric, ...]]]
+    ) -> Optional[str]:
+        """Write renders to an OpenMetrics file.
+
+        Args:
+            renders: List of (render time, families).
+
+        Returns:
+            fileName: The file written, or None if it could not be.
+        """
+        start, end = renders[0][0], renders[-1][0]
+        fileName = op.join(
+            self.directory, f"glados-backfill-{start:.0f}-{end:.0f}.om"
+        )
+        body = generate_latest(StaticCollector(mergeRenders(renders)))
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(fileName + ".tmp", "wb") as fout:
+                fout.write(body)
+            os.replace(fileName + ".tmp", fileName)
+        except OSError as exc:
+            print(f"[W] Unable to write backfill {fileName}: {exc}")
+            return None
+
+        print(f"[I] Wrote {len(renders)} unscraped renders to {fileName}.")
+        self.files.append(fileName)
+        return fileName
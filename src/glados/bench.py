@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of turret parsing, collection and scrape latency on synthetic input.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+
+Each case generates input of a given size (e.g. an nvidia-smi table of 16 GPUs)
+and measures:
+    parseSec: Turning the input into metrics, without the file cache.
+    collectSec: A full, unscheduled collect() with a warm file cache.
+    peakKiB: Peak memory allocated while parsing.
+    renderSec: Rendering the registry as ExpositionCache does every cycle.
+    scrapeSec: An HTTP scrape of the rendered exposition over keep-alive.
+Times are medians. Results are saved as JSON and compared with a baseline so
+that regressions between commits fail 'glados bench --compare'.
+"""
+
+import http.client
+import json
+import os
+import os.path as op
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from prometheus_client.registry import CollectorRegistry
+
+from .exposition import ExpositionCache, startExpositionServer
+from .fileCache import FILE_CACHE
+from .turrets.CpuStatsTurret import CpuStatsTurret, parseCpuInfoSpeeds
+from .turrets.CsvTurret import CsvTurret, parseCsv
+from .turrets.JsonTurret import JsonTurret
+from .turrets.NvidiaGpuTurret import NvidiaGpuTurret, NvInfo
+from .turrets.StorageTurret import StorageUsageTurret
+from .turrets.Turret import Turret
+from .version import __version__
+
+# Input sizes of each kind of case: GPUs, mounts, vCPUs, JSON metrics and CSV
+# rows.
+BENCH_SIZES: Dict[str, Tuple[int, ...]] = {
+    "nvidia": (1, 4, 16),
+    "df": (10, 1000, 10000),
+    "cpuinfo": (4, 64, 512),
+    "json": (1000, 10000, 100000),
+    "csv": (1000, 100000),
+}
+QUICK_SIZES: Dict[str, Tuple[int, ...]] = {
+    "nvidia": (1, 16),
+    "df": (10, 1000),
+    "cpuinfo": (4, 512),
+    "json": (1000,),
+    "csv": (1000,),
+}
+COMPARE_METRICS = ("parseSec", "collectSec", "peakKiB", "renderSec",
+                   "scrapeSec")
+# Timing differences below this many seconds are noise, not regressions.
+NOISE_FLOOR = 5.0e-5
+
+_NV_RULE = "+-------------------------------+----------------------+" \
+           "----------------------+"
+
+#-------------------------------------------------------------------------------
+def nvidiaSmiTable(nGpus: int) -> str:
+    """Output of 'nvidia-smi' for a host with nGpus GPUs, each running a
+    process.
+    """
+    lines = [
+        "Wed Jul 19 21:12:01 2023",
+        "+" + "-" * 77 + "+",
+        "| NVIDIA-SMI 525.125.06   Driver Version: 525.125.06   "
+        "CUDA Version: 12.0     |",
+        "|-------------------------------+----------------------+"
+        "----------------------+",
+        f"|{' GPU  Name        Persistence-M':<31}|{' Bus-Id        Disp.A':<22}"
+        f"|{' Volatile Uncorr. ECC ':>22}|",
+        f"|{' Fan  Temp  Perf  Pwr:Usage/Cap':<31}|{'Memory-Usage ':>22}"
+        f"|{' GPU-Util  Compute M. ':>22}|",
+        f"|{'':31}|{'':22}|{'MIG M. ':>22}|",
+        "|===============================+======================+"
+        "======================|",
+    ]
+    for gpu in range(nGpus):
+        memUse = 1024 + 97 * gpu
+        lines += [
+            f"|{gpu:4d}  NVIDIA A100-SXM...  On   "
+            f"| 00000000:{16 + gpu:02X}:00.0 Off |{'0 ':>22}|",
+            f"| N/A   {30 + gpu % 40}C    P0   {60 + gpu:3d}W / 400W "
+            f"| {memUse:6d}MiB / 81920MiB |{(gpu * 7) % 101:7d}%      Default |",
+            f"|{'':31}|{'':22}|{'Disabled ':>22}|",
+            _NV_RULE,
+        ]
+    lines += [
+        " " * 79,
+        "+" + "-" * 77 + "+",
+        "| Processes:" + " " * 66 + "|",
+        "|  GPU   GI   CI        PID   Type   Process name"
+        "                  GPU Memory |",
+        "|        ID   ID                                "
+        "                   Usage      |",
+        "|" + "=" * 77 + "|",
+    ]
+    for gpu in range(nGpus):
+        lines.append(f"|  {gpu:3d}   N/A  N/A  {10000 + gpu:8d}      C   "
+                     f"{'/path/to/app' + str(gpu):<30}{1024 + 97 * gpu:6d}MiB |")
+    lines.append("+" + "-" * 77 + "+")
+
+    return "\n".join(lines) + "\n"
+
+#-------------------------------------------------------------------------------
+def dfOutput(nMounts: int) -> str:
+    """Output of 'df' for a host with nMounts mounts."""
+    lines = ["Filesystem      1K-blocks       Used  Available Use% Mounted on"]
+    for mnt in range(nMounts):
+        size = 1048576 * (1 + mnt % 512)
+        used = size * (mnt % 100) // 100
+        lines.append(
+            f"/dev/mapper/vg-lv{mnt:<5d} {size:11d} {used:10d} "
+            f"{size - used:10d} {mnt % 100:3d}% /mnt/project/data{mnt}"
+        )
+    return "\n".join(lines) + "\n"
+
+#-------------------------------------------------------------------------------
+def cpuInfo(nCpus: int) -> str:
+    """Contents of /proc/cpuinfo for a host with nCpus vCPUs."""
+    flags = ("fpu vme de pse tsc msr pae mce cx8 apic sep mtrr pge mca cmov "
+             "pat pse36 clflush mmx fxsr sse sse2 ss ht syscall nx pdpe1gb "
+             "rdtscp lm constant_tsc rep_good nopl xtopology nonstop_tsc cpuid "
+             "tsc_known_freq pni pclmulqdq ssse3 fma cx16 pcid sse4_1 sse4_2 "
+             "x2apic movbe popcnt aes xsave avx f16c rdrand hypervisor lahf_lm "
+             "abm 3dnowprefetch invpcid_single ssbd ibrs ibpb stibp fsgsbase "
+             "bmi1 hle avx2 smep bmi2 erms invpcid rtm avx512f avx512dq rdseed "
+             "adx smap clflushopt clwb avx512cd avx512bw avx512vl xsaveopt "
+             "xsavec xgetbv1 xsaves arat avx512_vnni md_clear arch_capabilities")
+    blocks = []
+    for cpu in range(nCpus):
+        blocks.append(
+            f"processor\t: {cpu}\n"
+            "vendor_id\t: GenuineIntel\n"
+            "cpu family\t: 6\n"
+            "model\t\t: 85\n"
+            "model name\t: Intel(R) Xeon(R) CPU @ 2.20GHz\n"
+            "stepping\t: 7\n"
+            "microcode\t: 0xffffffff\n"
+            f"cpu MHz\t\t: {2200 + (cpu * 37) % 1300}.{cpu % 1000:03d}\n"
+            "cache size\t: 39424 KB\n"
+            f"physical id\t: {cpu // 64}\n"
+            f"siblings\t: {min(nCpus, 64)}\n"
+            f"core id\t\t: {(cpu % 64) // 2}\n"
+            f"cpu cores\t: {min(nCpus, 64) // 2}\n"
+            f"apicid\t\t: {cpu}\n"
+            "fpu\t\t: yes\n"
+            "cpuid level\t: 13\n"
+            "wp\t\t: yes\n"
+            f"flags\t\t: {flags}\n"
+            "bogomips\t: 4400.41\n"
+            "clflush size\t: 64\n"
+            "cache_alignment\t: 64\n"
+            "address sizes\t: 46 bits physical, 48 bits virtual\n"
+            "power management:\n"
+        )
+    return "\n".join(blocks)
+
+#-------------------------------------------------------------------------------
+def jsonTurretData(nMetrics: int) -> Dict[str, Any]:
+    """Contents of a JsonTurret file with nMetrics series."""
+    return {
+        "name": "bench_sensor",
+        "description": "Synthetic sensor readings.",
+        "labels": ["room", "metric"],
+        "date": "2023-07-18T02:11:00Z",
+        "metrics": [
+            [[f"room{i // 4}", ("temp", "humidity", "co2", "lux")[i % 4]],
+             float(i % 1000) / 10.0]
+            for i in range(nMetrics)
+        ],
+    }
+
+#-------------------------------------------------------------------------------
+def csvTable(nRows: int) -> str:
+    """CSV capacity report of nRows mounts with three value columns."""
+    rows = ["host,mount,size,used,avail"]
+    for i in range(nRows):
+        size, used = (i % 97 + 1) * 2 ** 30, (i % 89) * 2 ** 29
+        rows.append(f"node{i // 8:04d},/mnt/vol{i % 8},{size},{used},"
+                    f"{size - used}")
+    return "\n".join(rows) + "\n"
+
+#-------------------------------------------------------------------------------
+def _writeFile(fileName: str, text: str) -> str:
+    """Write text to a file, creating its directory."""
+    os.makedirs(op.dirname(fileName), exist_ok=True)
+    with open(fileName, "w", encoding="UTF-8") as fout:
+        fout.write(text)
+    return fileName
+
+#-------------------------------------------------------------------------------
+def makeCase(
+    kind: str, size: int, workDir: str
+) -> Tuple[Turret, Callable[[], Any]]:
+    """Write the input of a case and build its turret.
+
+    Args:
+        kind: One of BENCH_SIZES.
+        size: Size of the input.
+        workDir: Directory to write the input to.
+
+    Returns:
+        turret: Turret reading the input.
+        parse: Function parsing the input once, bypassing the file cache.
+    """
+
+    caseDir = op.join(workDir, f"{kind}-{size}")
+    if kind == "nvidia":
+        text = nvidiaSmiTable(size)
+        turret = NvidiaGpuTurret(
+            _writeFile(op.join(caseDir, "NvidiaGpu.turret"), text)
+        )
+        return turret, lambda: NvInfo(text).deviceMetrics()
+
+    if kind == "df":
+        storage = StorageUsageTurret(
+            _writeFile(op.join(caseDir, "StorageUsage.turret"), dfOutput(size))
+        )
+        return storage, storage._parseDfInfo # pylint: disable=protected-access
+
+    if kind == "cpuinfo":
+        text = cpuInfo(size)
+        _writeFile(op.join(caseDir, "proc", "cpuinfo"), text)
+        return CpuStatsTurret(caseDir), lambda: parseCpuInfoSpeeds(text)
+
+    if kind == "json":
+        fileName = _writeFile(op.join(caseDir, "bench.json"),
+                              json.dumps(jsonTurretData(size)))
+        jsonTurret = JsonTurret(fileName)
+
+        def parse():
+            """Re-parse the file as if it had changed."""
+            FILE_CACHE.forget(jsonTurret.fileName)
+            jsonTurret.acquire()
+        return jsonTurret, parse
+
+    if kind == "csv":
+        text = csvTable(size)
+        csvTurret = CsvTurret(_writeFile(op.join(caseDir, "capacity.csv"), text))
+        return csvTurret, lambda: parseCsv(text)
+
+    raise ValueError(f"Unknown benchmark kind {kind}.")
+
+#-------------------------------------------------------------------------------
+def timeIt(fn: Callable[[], Any], repeat: int) -> float:
+    """Median seconds of repeat calls of fn."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+#-------------------------------------------------------------------------------
+def peakMemory(fn: Callable[[], Any]) -> float:
+    """Peak KiB allocated during a call of fn."""
+    tracing = tracemalloc.is_tracing()
+    if tracing and hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    else:
+        # Python 3.8 has no reset_peak; restarting also resets the peak.
+        tracemalloc.stop()
+        tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    if not tracing:
+        tracemalloc.stop()
+    return (peak - base) / 1024.0
+
+#-------------------------------------------------------------------------------
+def benchCase(
+    kind: str, size: int, workDir: str, repeat: int = 5
+) -> Dict[str, float]:
+    """Measure one case.
+
+    Args:
+        kind: One of BENCH_SIZES.
+        size: Size of the input.
+        workDir: Directory for the input.
+        repeat: Number of timed repetitions.
+
+    Returns:
+        result: Metric -> value (see the module docstring), plus the number
+            of series and the size of the exposition.
+    """
+
+    turret, parse = makeCase(kind, size, workDir)
+    result = {"parseSec": timeIt(parse, repeat)}
+    result["collectSec"] = timeIt(lambda: list(turret.collect()), repeat)
+    result["peakKiB"] = peakMemory(parse)
+    result["series"] = float(sum(len(f.samples) for f in turret.collect()))
+
+    registry = CollectorRegistry()
+    registry.register(turret)
+    cache = ExpositionCache(registry)
+    result["renderSec"] = timeIt(cache.render, repeat)
+    result["exposureBytes"] = float(len(cache.rendered[0]))
+
+    server = startExpositionServer(0, cache, "127.0.0.1")
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+    try:
+        def scrape():
+            """Fetch the exposition as Prometheus does."""
+            conn.request("GET", "/metrics", headers={
+                "Accept-Encoding": "gzip"
+            })
+            response = conn.getresponse()
+            response.read()
+            assert response.status == 200, response.status
+        scrape()
+        result["scrapeSec"] = timeIt(scrape, repeat)
+    finally:
+        conn.close()
+        server.shutdown()
+        server.server_close()
+
+    return result
+
+#-------------------------------------------------------------------------------
+def runBenchmarks(
+    sizes: Optional[Dict[str, Tuple[int, ...]]] = None, repeat: int = 5,
+    caseFilter: str = "", verbose: bool = False
+) -> Dict[str, Dict[str, float]]:
+    """Run all cases.
+
+    Args:
+        sizes: Kind -> input sizes (None -> BENCH_SIZES).
+        repeat: Number of timed repetitions per measurement.
+        caseFilter: Only run cases whose name ("<kind>-<size>") contains it.
+        verbose: Whether to print each result as it is measured.
+
+    Returns:
+        results: Case name -> result of benchCase.
+    """
+
+    sizes = BENCH_SIZES if sizes is None else sizes
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="glados-bench-") as workDir:
+        for kind, kindSizes in sizes.items():
+            for size in kindSizes:
+                name = f"{kind}-{size}"
+                if caseFilter not in name:
+                    continue
+                results[name] = benchCase(kind, size, workDir, repeat)
+                if verbose:
+                    print(formatResult(name, results[name]))
+    return results
+
+#-------------------------------------------------------------------------------
+def formatResult(name: str, result: Dict[str, float]) -> str:
+    """One line summary of a result."""
+    return (f"{name:<14} series={result['series']:<7.0f} "
+            f"parse={result['parseSec'] * 1e3:9.3f}ms "
+            f"collect={result['collectSec'] * 1e3:9.3f}ms "
+            f"peak={result['peakKiB']:9.1f}KiB "
+            f"render={result['renderSec'] * 1e3:9.3f}ms "
+            f"scrape={result['scrapeSec'] * 1e3:8.3f}ms")
+
+#-------------------------------------------------------------------------------
+def benchReport(
+    results: Dict[str, Dict[str, float]], label: str = ""
+) -> Dict[str, Any]:
+    """Results with what they were measured on.
+
+    Args:
+        results: Results of runBenchmarks.
+        label: Free form name of the run, e.g. a commit hash.
+    """
+    return {
+        "glados": __version__,
+        "label": label,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time": time.time(),
+        "results": results,
+    }
+
+#-------------------------------------------------------------------------------
+def compareResults(
+    baseline: Dict[str, Dict[str, float]],
+    results: Dict[str, Dict[str, float]], threshold: float = 0.2
+) -> List[Tuple[str, str, float, float, bool]]:
+    """Compare results with a baseline.
+
+    Args:
+        baseline: Results of an earlier run.
+        results: Results of this run.
+        threshold: Fractional increase of a metric counted as a regression.
+
+    Returns:
+        rows: (case, metric, baseline value, value, regressed) of every metric
+            of every case in both runs.
+    """
+
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in COMPARE_METRICS:
+            if metric not in result or metric not in baseline[name]:
+                continue
+            old, new = baseline[name][metric], result[metric]
+            regressed = new > old * (1.0 + threshold)
+            if metric.endswith("Sec") and new - old < NOISE_FLOOR:
+                regressed = False
+            rows.append((name, metric, old, new, regressed))
+    return rows
+
+#-------------------------------------------------------------------------------
+def printComparison(rows: List[Tuple[str, str, float, float, bool]]) -> None:
+    """Print the rows of compareResults."""
+    for name, metric, old, new, regressed in rows:
+        ratio = new / old if old else float("inf")
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<14} {metric:<11} {old:12.6g} -> {new:12.6g} "
+              f"({ratio:5.2f}x){flag}")
+
+#-------------------------------------------------------------------------------
+def runBench(args) -> int:
+    """Run 'glados bench'.
+
+    Args:
+        args: Parsed arguments of the bench action.
+
+    Returns:
+        exitCode: 1 if a metric regressed against the baseline, else 0.
+    """
+
+    results = runBenchmarks(
+        QUICK_SIZES if args.quick else BENCH_SIZES, args.repeat, args.filter,
+        verbose=True
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as fout:
+            json.dump(benchReport(results, args.label), fout, indent=1)
+        print(f"[I] Wrote results to {args.output}.")
+
+    if not args.compare:
+        return 0
+
+    with open(args.compare, "r", encoding="UTF-8") as finp:
+        baseline = json.load(finp)
+    print(f"[I] Comparing with {args.compare} "
+          f"({baseline.get('label') or baseline.get('glados')}).")
+    rows = compareResults(baseline["results"], results, args.threshold)
+    printComparison(rows)
+    regressions = [row for row in rows if row[-1]]
+    if regressions:
+        print(f"[W] {len(regressions)} metrics regressed by more than "
+              f"{args.threshold:.0%}.")
+        return 1
+    return 0
@@ -5,23 +5,36 @@ Serves Turrets.
 Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
 """
 
+import shutil
 import time
-import pkgutil
-from importlib import import_module
-from typing import List
+from typing import Dict, List, Optional
 
+import os
 import os.path as op
 
-from prometheus_client import make_wsgi_app, start_wsgi_server
 from prometheus_client.core import REGISTRY
 
-from .utils import runCommand, getParamsFromConfig
+from .backfill import BackfillSink
+from .exposition import ExpositionCache, startExpositionServer
+from .profiler import CollectionProfiler, installProfileSignal
+from .push import PushClient
+from .selfMetrics import TURRET_STATS
+from .utils import getParamsFromConfig
+from .scheduler import TurretScheduler, AsyncTurretScheduler
+from .watcher import JsonTurretWatcher
 from .turrets.JsonTurret import JsonTurret
+from .plugins import TurretPlugin, builtinPlugins, discoverPlugins
+from .turrets import TURRET_MANIFEST, loadTurretClass
 
 #-------------------------------------------------------------------------------
-def isSpecializedTurret(turretStr: str) -> bool:
-    """Whether or not a turret is specialized and not just "Turret"."""
-    return turretStr.endswith("Turret") and turretStr != "Turret"
+def hasNvidiaGpu() -> bool:
+    """Whether an Nvidia GPU and nvidia-smi are present, without running it.
+
+    Returns:
+        hasGpu: True if the driver's control device node and nvidia-smi exist.
+    """
+
+    return op.exists("/dev/nvidiactl") and shutil.which("nvidia-smi") is not None
 
 #-------------------------------------------------------------------------------
 def getTurretExcludeList() -> List[str]:
@@ -30,74 +43,101 @@ def getTurretExcludeList() -> List[str]:
     Args: None.
 
     Returns:
-        turretExcludeList: List of module names which should not be called by
+        turretExcludeList: List of turret names which should not be called by
             default with not extra arguments.
     """
 
-    # JsonTurret and CsvTurret are specialized and require input files.
-    turretExcludeList = ["JsonTurret", "CsvTurret"]
-    # NvidiaGpuTurret uses "nvidia-smi" and should not run if returnCode != 0.
-    if runCommand("nvidia-smi")[-1] != 0:
+    # Turrets which require input files (e.g. JsonTurret) are never defaults.
+    turretExcludeList = [
+        name for name, (_, isDefault) in TURRET_MANIFEST.items()
+        if not isDefault
+    ]
+    # NvidiaGpuTurret uses "nvidia-smi" and should not run without a GPU.
+    if not hasNvidiaGpu():
         turretExcludeList.append("NvidiaGpuTurret")
 
     return turretExcludeList
 
 #-------------------------------------------------------------------------------
-def getDefaultTurrets(turretsModulePath: str, excludeList: list) -> List:
-    """Find all "local" turrets in glados which should run by default input with
-    no extra file based input. Any turrets which should *not* be run should have
-    previously been added to the exclude list.
+def getDefaultTurrets(excludeList: list) -> List:
+    """Create all "local" turrets in glados which should run by default with no
+    extra file based input. Only the modules of these turrets are imported. Any
+    turrets which should *not* be run should have previously been added to the
+    exclude list.
 
     Args:
-        turretsModulePath: Path to module (directory) containing turret modules.
-        excludeList: List of strings to skip identifying specialized turrets.
+        excludeList: Names of turrets to skip.
 
     Returns:
-        defaultTurrets: List of all turret classes detected in turret modules.
+        defaultTurrets: List of instances of all default turrets.
     """
 
     defaultTurrets = []
-    for _, turretModule, _ in pkgutil.iter_modules([turretsModulePath]):
-        if isSpecializedTurret(turretModule):
-            turretClass = import_module(f"glados.turrets.{turretModule}")
-            for turretStr in dir(turretClass):
-                # Skip over any abstract / excluded turrets like "JsonTurret".
-                if any(b in turretStr for b in excludeList):
-                    continue
-                # Skip over anything in turretClass that is not "*Turret".
-                if isSpecializedTurret(turretStr):
-                    turret = getattr(turretClass, turretStr)
-                    defaultTurrets.append(turret())
+    for turretName in TURRET_MANIFEST:
+        if turretName in excludeList:
+            continue
+        defaultTurrets.append(loadTurretClass(turretName)())
 
     return defaultTurrets
 
 #-------------------------------------------------------------------------------
-def getFileTurrets(turretFiles: List) -> List:
+def getFileTurrets(
+    turretFiles: List, plugins: Optional[Dict[str, TurretPlugin]] = None
+) -> List:
     """Override a specialized turret with a file.
 
     Args:
         turretFiles: Turret files to use for overriding turret.
+        plugins: Turrets to choose from (None -> built-in turrets).
 
     Returns:
         turrets: Tuple of (server, Turret)
     """
 
+    plugins = plugins if plugins is not None else builtinPlugins()
+
     turrets = []
     for turretFile in turretFiles:
-        turretModule = op.basename(turretFile).replace(".turret", "")
-        try:
-            turretClass = import_module(f"glados.turrets.{turretModule}Turret")
-        except ModuleNotFoundError:
+        turretModule = op.basename(turretFile).replace(".turret", "") + "Turret"
+        # Built-in modules are named for their turret; plugins by class name.
+        turretPlugins = [
+            p for p in plugins.values()
+            if p.name == turretModule
+            or p.module.rsplit(".", maxsplit=1)[-1] == turretModule
+        ]
+        if not turretPlugins:
             print(f"[W] Unable to find module for {turretFile}.")
             continue
-        turretStrs = [t for t in dir(turretClass) if isSpecializedTurret(t)]
-        if len(turretStrs) == 1:
+        if len(turretPlugins) == 1:
             hostname = op.basename(op.dirname(turretFile))
-            turret = getattr(turretClass, turretStrs[0])
+            turret = turretPlugins[0].load()
             turrets.append(turret(turretFile, hostname))
 
     return turrets
 
+#-------------------------------------------------------------------------------
+def getPluginTurrets(
+    pluginNames: List[str], plugins: Dict[str, TurretPlugin]
+) -> List:
+    """Create the enabled plugin turrets. Only their modules are imported.
+
+    Args:
+        pluginNames: Names of the turrets to enable.
+        plugins: Discovered turrets by name.
+
+    Returns:
+        turrets: List of instances of the enabled turrets.
+    """
+
+    turrets = []
+    for pluginName in pluginNames:
+        if pluginName not in plugins:
+            print(f"[W] Unable to find turret plugin {pluginName}.")
+            continue
+        turrets.append(plugins[pluginName].load()())
+
+    return turrets
+
 #-------------------------------------------------------------------------------
 def getJsonTurrets(jsonFiles: List) -> List:
     """Deploys a turret from a JSON file.
@@ -115,6 +155,141 @@ def getJsonTurrets(jsonFiles: List) -> List:
 
     return jsonTurrets
 
+#-------------------------------------------------------------------------------
+def getJsonLinesTurrets(jsonLinesFiles: List) -> List:
+    """Deploys a turret tailing a JSON lines file.
+
+    Args:
+        jsonLinesFiles: Json lines files to use for turrets.
+
+    Returns:
+        jsonLinesTurrets: List of JsonLinesTurrets to call.
+    """
+
+    if not jsonLinesFiles:
+        return []
+    jsonLinesTurret = loadTurretClass("JsonLinesTurret")
+    return [jsonLinesTurret(jsonLinesFile) for jsonLinesFile in jsonLinesFiles]
+
+#-------------------------------------------------------------------------------
+def getCsvTurrets(csvFiles: List) -> List:
+    """Deploys a turret from a CSV file.
+
+    Args:
+        csvFiles: CSV files to use for turrets.
+
+    Returns:
+        csvTurrets: List of CsvTurrets to call.
+    """
+
+    # Imported on demand as CsvTurret needs numpy.
+    if not csvFiles:
+        return []
+    csvTurret = loadTurretClass("CsvTurret")
+    return [csvTurret(csvFile) for csvFile in csvFiles]
+
+#-------------------------------------------------------------------------------
+def getMmapTurrets(metricFiles: List) -> List:
+    """Deploys a turret from a binary metric file.
+
+    Args:
+        metricFiles: Files written by MmapMetricWriter.
+
+    Returns:
+        mmapTurrets: List of MmapTurrets to call.
+    """
+
+    if not metricFiles:
+        return []
+    mmapTurret = loadTurretClass("MmapTurret")
+    return [mmapTurret(metricFile) for metricFile in metricFiles]
+
+#-------------------------------------------------------------------------------
+def getSharedMemoryTurrets(segmentNames: List) -> List:
+    """Deploys a turret owning a shared-memory segment for workers to report
+    to.
+
+    Args:
+        segmentNames: Names of the segments to create.
+
+    Returns:
+        sharedMemoryTurrets: List of SharedMemoryTurrets to call.
+    """
+
+    if not segmentNames:
+        return []
+    sharedMemoryTurret = loadTurretClass("SharedMemoryTurret")
+    return [sharedMemoryTurret(name) for name in segmentNames]
+
+#-------------------------------------------------------------------------------
+def getHostRootTurrets(hostRoots: List) -> List:
+    """Deploys a turret serving the turret files of every host directory in a
+    root, in place of one FileTurret per file.
+
+    Args:
+        hostRoots: Directories of host directories of turret files.
+
+    Returns:
+        hostRootTurrets: List of HostRootTurrets to call.
+    """
+
+    if not hostRoots:
+        return []
+    hostRootTurret = loadTurretClass("HostRootTurret")
+    return [hostRootTurret(hostRoot) for hostRoot in hostRoots]
+
+#-------------------------------------------------------------------------------
+def getScriptTurrets(scriptDirs: List) -> List:
+    """Deploys a turret for every executable script in the directories.
+
+    Args:
+        scriptDirs: Directories of scripts emitting JSON lines.
+
+    Returns:
+        scriptTurrets: List of ScriptTurrets to call.
+    """
+
+    scriptTurrets: List = []
+    if not scriptDirs:
+        return scriptTurrets
+    scriptTurret = loadTurretClass("ScriptTurret")
+    for scriptDir in scriptDirs:
+        try:
+            names = sorted(os.listdir(scriptDir))
+        except OSError as exc:
+            print(f"[W] Unable to list scripts in {scriptDir}: {exc}")
+            continue
+        for name in names:
+            script = op.join(scriptDir, name)
+            if name.startswith(".") or not op.isfile(script) \
+                    or not os.access(script, os.X_OK):
+                continue
+            scriptTurrets.append(scriptTurret(script))
+
+    return scriptTurrets
+
+#-------------------------------------------------------------------------------
+def applyTurretSettings(turret, turretSettings: Dict) -> None:
+    """Apply per-turret settings (e.g. interval, timeout, maxStaleness) from the
+    config. Settings keyed by the turret class name are applied first, then any
+    keyed by the basename or path of the turret's file.
+
+    Args:
+        turret: Turret to configure.
+        turretSettings: Dictionary of {key: {attribute: value}}.
+    """
+
+    keys = [type(turret).__name__]
+    if turret.fileName:
+        keys += [op.basename(turret.fileName), turret.fileName]
+
+    for key in keys:
+        for attr, value in turretSettings.get(key, {}).items():
+            if attr.startswith("_") or not hasattr(turret, attr):
+                print(f"[W] Unknown setting '{attr}' for turret '{key}'.")
+                continue
+            setattr(turret, attr, value)
+
 #-------------------------------------------------------------------------------
 def turretServer(port: int, configFile=""):
     """Serve all turrets found.
@@ -132,23 +307,85 @@ def turretServer(port: int, configFile=""):
 
     # Make and start the app.
     print(f"[*] Serving turrets on port '{port}'")
-    make_wsgi_app(disable_compression=True)
-    start_wsgi_server(port)
+    backfill = None
+    if params["BackfillDir"]:
+        backfill = BackfillSink(
+            params["BackfillDir"], params["BackfillGap"],
+            params["BackfillRenders"]
+        )
+    # Collections may be profiled on SIGUSR1 or /debug/profile.
+    profiler = None
+    if params["ProfileDir"]:
+        profiler = CollectionProfiler(
+            params["ProfileDir"], params["ProfileSeconds"]
+        )
+        installProfileSignal(profiler)
+    exposition = ExpositionCache(
+        REGISTRY, params["sleepTime"], backfill, profiler
+    )
+    startExpositionServer(port, exposition)
 
-    turretsModulePath = op.join(op.dirname(__file__), "turrets")
-    turretExcludeList = getTurretExcludeList()
-    for turret in getDefaultTurrets(turretsModulePath, turretExcludeList):
+    turrets = []
+    for turret in getDefaultTurrets(getTurretExcludeList()):
         print(f"[I] Found turret {turretStr(turret)}.")
-        REGISTRY.register(turret)
-
-    for turret in getJsonTurrets(params["JsonTurrets"]):
-        print(f"[I] Found turret {turretStr(turret)}:\n    {turret._fileName}")
-        REGISTRY.register(turret)
+        turrets.append(turret)
 
-    for turret in getFileTurrets(params["FileTurrets"]):
-        print(f"[I] Found turret {turretStr(turret)}:\n    {turret._fileName}")
+    plugins = discoverPlugins(params["PluginDirs"], params["PluginCache"])
+    for turret in getPluginTurrets(params["Plugins"], plugins):
+        print(f"[I] Found turret {turretStr(turret)}.")
+        turrets.append(turret)
+
+    # Turrets of input files, directories or segments given in the config.
+    inputTurrets = [
+        getJsonTurrets(params["JsonTurrets"]),
+        getJsonLinesTurrets(params["JsonLinesTurrets"]),
+        getCsvTurrets(params["CsvTurrets"]),
+        getMmapTurrets(params["MmapTurrets"]),
+        getSharedMemoryTurrets(params["SharedMemorySegments"]),
+        getScriptTurrets(params["ScriptDirs"]),
+        getHostRootTurrets(params["HostRoots"]),
+        getFileTurrets(params["FileTurrets"], plugins),
+    ]
+    for turret in [t for found in inputTurrets for t in found]:
+        print(f"[I] Found turret {turretStr(turret)}:\n    {turret.fileName}")
+        turrets.append(turret)
+
+    for turret in turrets:
+        applyTurretSettings(turret, params["TurretSettings"])
+
+    # Acquisition happens in the background; scrapes only read snapshots.
+    if params["runtime"] == "asyncio":
+        schedulerClass = AsyncTurretScheduler
+    else:
+        schedulerClass = TurretScheduler
+    scheduler = schedulerClass(
+        turrets, params["sleepTime"], params["maxWorkers"]
+    )
+    for turret in turrets:
         REGISTRY.register(turret)
-
-    # Sleep between each collection.
+    REGISTRY.register(scheduler)
+    # Cost of each turret (glados_turret_collect_seconds etc.).
+    REGISTRY.register(TURRET_STATS)
+    scheduler.start()
+
+    # JsonTurrets in watched directories come and go with their files.
+    if params["JsonTurretDirs"]:
+        watcher = JsonTurretWatcher(
+            params["JsonTurretDirs"], REGISTRY, pollInterval=params["sleepTime"]
+        )
+        watcher.start()
+
+    # Scrapes are served from a render made as often as the most frequently
+    # refreshed turret publishes a snapshot.
+    exposition.interval = scheduler.minInterval
+    exposition.start()
+
+    # Optionally push as well, e.g. from nodes which cannot be scraped.
+    if params["Push"]:
+        pushParams = {"interval": params["sleepTime"], **params["Push"]}
+        pusher = PushClient(REGISTRY, **pushParams)
+        pusher.start()
+
+    # Keep serving; the scheduler threads are daemons.
     while True:
         time.sleep(params["sleepTime"])
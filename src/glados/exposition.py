@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Serve pre-rendered metrics.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+import gzip
+import hashlib
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from prometheus_client.exposition import (
+    CONTENT_TYPE_LATEST, ThreadingWSGIServer, generate_latest
+)
+from prometheus_client.registry import CollectorRegistry
+
+from .backfill import BackfillSink, StaticCollector
+from .profiler import CollectionProfiler
+
+# Rendered exposition: (plain body, gzipped body, ETag, time rendered).
+Rendered = Tuple[bytes, bytes, str, float]
+
+#-------------------------------------------------------------------------------
+class ExpositionCache:
+    """Render the registry once per collection cycle, in plain and gzipped
+    form, so that scrapes only copy bytes. Identical renders keep their ETag
+    and their gzipped body.
+    """
+    # Trade a slightly larger body for much cheaper compression than level 9.
+    compressLevel = 6
+
+    #---------------------------------------------------------------------------
+    def __init__(
+        self, registry: CollectorRegistry, interval: float = 5.0,
+        backfill: Optional[BackfillSink] = None,
+        profiler: Optional[CollectionProfiler] = None
+    ):
+        """Initialization.
+
+        Args:
+            registry: Registry to render.
+            interval: Seconds between renders.
+            backfill: Sink for renders which are not scraped in time.
+            profiler: Profiler controlled by local requests to
+                /debug/profile (None -> no such endpoint).
+        """
+        self.registry = registry
+        self.interval = interval
+        self.backfill = backfill
+        self.profiler = profiler
+        self.renders = 0
+        self._rendered: Optional[Rendered] = None
+        self._renderLock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    #---------------------------------------------------------------------------
+    def render(self) -> Rendered:
+        """Render the registry and atomically replace the cached bodies.
+
+        Returns:
+            rendered: (plain body, gzipped body, ETag, time rendered).
+        """
+        with self._renderLock:
+            now = time.time()
+            families = tuple(self.registry.collect())
+            plain = generate_latest(StaticCollector(list(families)))
+            if self.backfill:
+                self.backfill.record(now, families)
+            previous = self._rendered
+            if previous and previous[0] == plain:
+                self._rendered = (plain, previous[1], previous[2], now)
+            else:
+                gzipped = gzip.compress(plain, self.compressLevel, mtime=0)
+                etag = f'"{hashlib.blake2b(plain, digest_size=16).hexdigest()}"'
+                self._rendered = (plain, gzipped, etag, now)
+            self.renders += 1
+            return self._rendered
+
+    #---------------------------------------------------------------------------
+    @property
+    def rendered(self) -> Rendered:
+        """The latest render, rendering now if there is none yet."""
+        rendered = self._rendered
+        return rendered if rendered else self.render()
+
+    #---------------------------------------------------------------------------
+    def start(self) -> None:
+        """Render now and then every interval in a daemon thread."""
+        self._stopEvent.clear()
+        self._renderQuietly()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="glados-exposition"
+        )
+        self._thread.start()
+
+    #---------------------------------------------------------------------------
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop rendering and write out any queued backfill.
+
+        Args:
+            timeout: Seconds to wait for the render thread to finish.
+        """
+        self._stopEvent.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.backfill:
+            self.backfill.flush()
+
+    #---------------------------------------------------------------------------
+    def _run(self) -> None:
+        """Render until stopped."""
+        while not self._stopEvent.wait(self.interval):
+            self._renderQuietly()
+
+    #---------------------------------------------------------------------------
+    def _renderQuietly(self) -> None:
+        """Render, keeping the previous render if that fails, and write out
+        any backfill so that slow storage never delays a scrape.
+        """
+        try:
+            self.render()
+        except Exception as exc: # pylint: disable=broad-except
+            print(f"[W] Rendering metrics failed: {exc}")
+        if self.backfill:
+            self.backfill.flush()
+
+    #---------------------------------------------------------------------------
+    def app(self, environ, startResponse: Callable) -> List[bytes]:
+        """WSGI app serving the latest render.
+
+        Requests filtering by 'name[]' are rendered live as in
+        prometheus_client. Otherwise the cached body is served, gzipped if
+        accepted, or 304 if the client already has it.
+        """
+        params = parse_qs(
+            environ.get("QUERY_STRING", ""), keep_blank_values=True
+        )
+        if self.profiler and environ.get("PATH_INFO") == "/debug/profile":
+            return self._profileApp(environ, params, startResponse)
+        if "name[]" in params:
+            body = generate_latest(
+                self.registry.restricted_registry(params["name[]"])
+            )
+            startResponse("200 OK", [("Content-Type", CONTENT_TYPE_LATEST)])
+            return [body]
+
+        plain, gzipped, etag, renderTime = self.rendered
+        if self.backfill:
+            self.backfill.scraped(renderTime)
+        headers = [("Content-Type", CONTENT_TYPE_LATEST), ("ETag", etag),
+                   ("Vary", "Accept-Encoding")]
+
+        ifNoneMatch = environ.get("HTTP_IF_NONE_MATCH", "")
+        if ifNoneMatch:
+            tags = {t.strip() for t in ifNoneMatch.split(",")}
+            tags = {t[2:] if t.startswith("W/") else t for t in tags}
+            if etag in tags or "*" in tags:
+                startResponse("304 Not Modified", headers)
+                return []
+
+        if "gzip" in environ.get("HTTP_ACCEPT_ENCODING", ""):
+            headers.append(("Content-Encoding", "gzip"))
+            body = gzipped
+        else:
+            body = plain
+        headers.append(("Content-Length", str(len(body))))
+        startResponse("200 OK", headers)
+        return [body]
+
+    #---------------------------------------------------------------------------
+    def _profileApp(
+        self, environ, params: Dict[str, List[str]], startResponse: Callable
+    ) -> List[bytes]:
+        """Start profiling for 'seconds' (default: the profiler's), or stop it
+        with 'stop'. Only requests from the host itself are allowed.
+        """
+        assert self.profiler is not None
+        headers = [("Content-Type", "text/plain; charset=utf-8")]
+        if environ.get("REMOTE_ADDR") not in ("127.0.0.1", "::1"):
+            startResponse("403 Forbidden", headers)
+            return [b"Profiling is only allowed from localhost.\n"]
+
+        if "stop" in params:
+            files = self.profiler.stop()
+            startResponse("200 OK", headers)
+            return ["".join(f"{f}\n" for f in files).encode()]
+
+        try:
+            seconds = float(params.get("seconds", [self.profiler.seconds])[0])
+        except ValueError:
+            startResponse("400 Bad Request", headers)
+            return [b"Invalid seconds.\n"]
+        if not self.profiler.start(seconds):
+            startResponse("409 Conflict", headers)
+            return [b"Already profiling.\n"]
+        startResponse("202 Accepted", headers)
+        return [f"Profiling for {seconds}s into "
+                f"{self.profiler.directory}.\n".encode()]
+
+#-------------------------------------------------------------------------------
+class _SilentHandler(WSGIRequestHandler):
+    """WSGI handler that does not log requests."""
+    #---------------------------------------------------------------------------
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        """Log nothing."""
+
+#-------------------------------------------------------------------------------
+def startExpositionServer(
+    port: int, cache: ExpositionCache, addr: str = "0.0.0.0"
+) -> ThreadingWSGIServer:
+    """Bind a server for the cached exposition and serve it in a daemon
+    thread. Binding happens before returning so errors (e.g. PermissionError
+    or a port in use) are raised to the caller.
+
+    Args:
+        port: Port on which to serve.
+        cache: ExpositionCache to serve.
+        addr: Address on which to serve.
+
+    Returns:
+        server: The running server.
+    """
+
+    family, _, _, _, sockAddr = socket.getaddrinfo(addr, port)[0]
+    addr = sockAddr[0]
+
+    class Server(ThreadingWSGIServer):
+        """ThreadingWSGIServer for the address family of addr."""
+        address_family = family
+
+    server = make_server(addr, port, cache.app, Server, _SilentHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, daemon=True, name="glados-http"
+    )
+    thread.start()
+
+    return server
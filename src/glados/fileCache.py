@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Cache of file contents and parsed file contents for file based Turrets.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .selfMetrics import TURRET_STATS
+
+# (st_ino, st_dev, st_mtime_ns, st_size) identifying a version of a file.
+FileKey = Tuple[int, int, int, int]
+
+#-------------------------------------------------------------------------------
+def fileKey(path: str) -> Optional[FileKey]:
+    """Get the key identifying the current version of a file.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        key: Key of the file or None if it should not be cached. Files which
+            report a size of zero (e.g. in /proc) change without their stat
+            changing and so are never cached.
+    """
+
+    stat = os.stat(path)
+    if not stat.st_size:
+        return None
+    return (stat.st_ino, stat.st_dev, stat.st_mtime_ns, stat.st_size)
+
+#-------------------------------------------------------------------------------
+class FileCache:
+    """Cache of file contents and of objects parsed from them, keyed on path,
+    inode, mtime and size so that unchanged files cost a single stat.
+    Parsed objects are shared between callers and must not be mutated.
+    """
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        """Initialization."""
+        self.hits = 0
+        self.misses = 0
+        self._texts: Dict[str, Tuple[FileKey, str]] = {}
+        self._parsed: Dict[Tuple[str, str], Tuple[FileKey, Any]] = {}
+        self._lock = threading.Lock()
+
+    #---------------------------------------------------------------------------
+    def read(self, path: str) -> str:
+        """Read a file, only touching its contents if it has changed.
+
+        Args:
+            path: Path to the file.
+
+        Returns:
+            text: Contents of the file.
+        """
+        key = fileKey(path)
+        with self._lock:
+            cached = self._texts.get(path)
+            if key and cached and cached[0] == key:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        with open(path, "rb") as finp:
+            data = finp.read()
+        TURRET_STATS.countRead(path, len(data))
+        text = data.decode("UTF-8")
+
+        # Only cache if the file did not change while being read.
+        if key and key == fileKey(path):
+            with self._lock:
+                self._texts[path] = (key, text)
+
+        return text
+
+    #---------------------------------------------------------------------------
+    def parse(
+        self, path: str, parser: Callable[[str], Any], tag: str = ""
+    ) -> Any:
+        """Parse a file, only re-parsing it if it has changed.
+
+        Args:
+            path: Path to the file.
+            parser: Function of the file contents.
+            tag: Name under which to memoize (default: the parser's name).
+
+        Returns:
+            parsed: Result of parser, possibly shared with earlier callers.
+        """
+        tag = tag if tag else getattr(parser, "__qualname__", repr(parser))
+        key = fileKey(path)
+        with self._lock:
+            cached = self._parsed.get((path, tag))
+            if key and cached and cached[0] == key:
+                self.hits += 1
+                return cached[1]
+
+        parsed = parser(self.read(path))
+
+        if key and key == fileKey(path):
+            with self._lock:
+                self._parsed[(path, tag)] = (key, parsed)
+
+        return parsed
+
+    #---------------------------------------------------------------------------
+    def forget(self, path: str) -> None:
+        """Drop everything cached for a path.
+
+        Args:
+            path: Path to the file.
+        """
+        with self._lock:
+            self._texts.pop(path, None)
+            for cacheKey in [k for k in self._parsed if k[0] == path]:
+                del self._parsed[cacheKey]
+
+#-------------------------------------------------------------------------------
+# Cache shared by all Turrets.
+FILE_CACHE = FileCache()
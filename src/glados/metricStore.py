@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Compact, reusable storage of the series of a gauge.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+from array import array
+import math
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.samples import Sample
+
+#-------------------------------------------------------------------------------
+class StoreFamily(GaugeMetricFamily):
+    """Gauge family whose samples are only built when they are read, from the
+    label dicts of a MetricStore and a copy of its values and timestamps.
+    """
+    #---------------------------------------------------------------------------
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str],
+        labelDicts: List[Dict[str, str]], values: array,
+        timestamps: Optional[array] = None, timestamp: Optional[float] = None
+    ):
+        """Initialization.
+
+        Args:
+            name: Name of the gauge.
+            documentation: Help text of the gauge.
+            labels: Label names.
+            labelDicts: Label dicts of the series, shared with the store.
+            values: Values of the series, owned by this family.
+            timestamps: Timestamps of the series (NaN -> timestamp), owned by
+                this family (None -> timestamp for all).
+            timestamp: Default timestamp of the series.
+        """
+        super().__init__(name, documentation, labels=labels)
+        self._labelDicts = labelDicts
+        self._values = values
+        self._timestamps = timestamps
+        self.timestamp = timestamp
+
+    #---------------------------------------------------------------------------
+    @property
+    def nSamples(self) -> int:
+        """Number of samples, without building them."""
+        return len(self._values)
+
+    #---------------------------------------------------------------------------
+    @property
+    def samples(self) -> List[Sample]: # type: ignore[override]
+        """Samples of the family."""
+        if self._timestamps is None:
+            return [
+                Sample(self.name, labels, value, self.timestamp, None)
+                for labels, value in zip(self._labelDicts, self._values)
+            ]
+        return [
+            Sample(self.name, labels, value,
+                   self.timestamp if math.isnan(time) else time, None)
+            for labels, value, time in zip(
+                self._labelDicts, self._values, self._timestamps
+            )
+        ]
+
+    #---------------------------------------------------------------------------
+    @samples.setter
+    def samples(self, samples: List[Sample]) -> None:
+        """Samples are derived from the store; only resetting is allowed."""
+        assert not samples, "StoreFamily samples are read only."
+
+#-------------------------------------------------------------------------------
+class MetricStore:
+    """Series of a gauge kept across acquisitions. Label sets are interned
+    once and values live in a flat array updated in place, so an acquisition
+    which sees the same series as the last one allocates nothing per series.
+
+    Usage per acquisition:
+        store.begin()
+        store.set(["host", "mnt"], 1.0) ...
+        gauge = store.family()  # drops series which were not set
+
+    Samples are at store.timestamp unless set with their own timestamp.
+    """
+    #---------------------------------------------------------------------------
+    def __init__(self, name: str, documentation: str, labels: Sequence[str]):
+        """Initialization.
+
+        Args:
+            name: Name of the gauge.
+            documentation: Help text of the gauge.
+            labels: Label names.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = list(labels)
+        self.timestamp: Optional[float] = None
+        self._index: Dict[Tuple[str, ...], int] = {}
+        self._labelDicts: List[Dict[str, str]] = []
+        self._values = array("d")
+        # Per series timestamps (NaN -> store.timestamp), only kept once a
+        # series is set with a timestamp.
+        self._timestamps: Optional[array] = None
+        self._seen = bytearray()
+
+    #---------------------------------------------------------------------------
+    def __len__(self) -> int:
+        """Number of series."""
+        return len(self._values)
+
+    #---------------------------------------------------------------------------
+    def begin(self) -> None:
+        """Start an acquisition; series not set before family() are dropped."""
+        self._seen = bytearray(len(self._values))
+
+    #---------------------------------------------------------------------------
+    def set(
+        self, labels: Sequence[str], value: float,
+        timestamp: Optional[float] = None
+    ) -> None:
+        """Set the value of a series, adding it if it is new.
+
+        Args:
+            labels: Label values.
+            value: Value of the series.
+            timestamp: Time of the value (None -> store.timestamp).
+        """
+        key = tuple(labels)
+        idx = self._index.get(key)
+        if idx is None:
+            key = tuple(sys.intern(str(l)) for l in key)
+            idx = self._index.get(key)
+        if idx is None:
+            if len(key) != len(self.labels):
+                raise ValueError(f"Expected labels {self.labels}, got {key}.")
+            idx = len(self._values)
+            self._index[key] = idx
+            self._labelDicts.append(dict(zip(self.labels, key)))
+            self._values.append(value)
+            self._seen.append(1)
+            if self._timestamps is not None:
+                self._timestamps.append(math.nan)
+        else:
+            self._values[idx] = value
+            self._seen[idx] = 1
+
+        if timestamp is not None or self._timestamps is not None:
+            if self._timestamps is None:
+                self._timestamps = array("d", [math.nan]) * len(self._values)
+            self._timestamps[idx] = math.nan if timestamp is None else timestamp
+
+    #---------------------------------------------------------------------------
+    def _sweep(self) -> None:
+        """Drop series which were not set since begin(). New containers are
+        built so that families handed out earlier are unaffected.
+        """
+        if 0 not in self._seen:
+            return
+        keep = [i for i, seen in enumerate(self._seen) if seen]
+        keys = list(self._index)
+        self._index = {keys[i]: n for n, i in enumerate(keep)}
+        self._labelDicts = [self._labelDicts[i] for i in keep]
+        self._values = array("d", (self._values[i] for i in keep))
+        if self._timestamps is not None:
+            self._timestamps = array("d", (self._timestamps[i] for i in keep))
+        self._seen = bytearray(b"\x01" * len(keep))
+
+    #---------------------------------------------------------------------------
+    def family(self) -> StoreFamily:
+        """Drop series not set since begin() and return a family of the rest.
+        The family holds a copy of the values so later updates do not change
+        it.
+
+        Returns:
+            family: Gauge family of all series.
+        """
+        self._sweep()
+        timestamps = None
+        if self._timestamps is not None:
+            timestamps = array("d", self._timestamps)
+        return StoreFamily(
+            self.name, self.documentation, self.labels, self._labelDicts,
+            array("d", self._values), timestamps, self.timestamp
+        )
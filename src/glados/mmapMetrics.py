@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Binary metric files which producers update in place and glados maps.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+
+Layout (little-endian):
+    header (64 bytes): magic, version, number of series, sequence number,
+        time of the last update, offset and size of the metadata, offset of
+        the values
+    metadata (UTF-8 JSON, written once): name, description, label names, the
+        interned label values ("strings") and each series as indices into them
+    values: one float64 per series
+
+The label table never changes while the file exists; a producer with new
+series writes a new file and renames it over the old one. Values are updated
+in place under a seqlock: the sequence number is odd while an update is in
+progress, so a reader which sees the same even number before and after
+copying the values has a consistent copy. Only one writer per file is
+supported.
+
+A producer:
+    writer = MmapMetricWriter("/run/app.metrics", "app_queue",
+                              "Queue depths.", ["queue"], [["in"], ["out"]])
+    writer.set(["in"], 12)
+    with writer.update():
+        writer.values[0] = 13
+        writer.values[1] = 4
+"""
+
+from array import array
+import contextlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+MAGIC = b"GLDMETR\0"
+VERSION = 1
+# magic, version, number of series, sequence number, update time, metadata
+# offset, metadata size, values offset.
+HEADER = struct.Struct("<8sIIQdQQQ")
+HEADER_SIZE = 64
+# Offsets of the sequence number and update time in the header.
+_SEQ_OFFSET = 16
+_TIME_OFFSET = 24
+_SEQ = struct.Struct("<Q")
+_TIME = struct.Struct("<d")
+
+#-------------------------------------------------------------------------------
+class MmapMetricWriter:
+    """Create a binary metric file and update its values in place."""
+    #---------------------------------------------------------------------------
+    def __init__(
+        self, path: str, name: str, description: str, labels: Sequence[str],
+        series: Sequence[Sequence[str]]
+    ):
+        """Create (or atomically replace) the file.
+
+        Args:
+            path: Path of the file.
+            name: Name of the gauge.
+            description: Help text of the gauge.
+            labels: Label names.
+            series: Label values of each series.
+        """
+        strings: Dict[str, int] = {}
+        indices = []
+        for labelValues in series:
+            if len(labelValues) != len(labels):
+                raise ValueError(f"Expected labels {list(labels)}, got "
+                                 f"{list(labelValues)}.")
+            indices.append([strings.setdefault(str(v), len(strings))
+                            for v in labelValues])
+        meta = json.dumps({
+            "name": name, "description": description, "labels": list(labels),
+            "strings": list(strings), "series": indices,
+        }).encode()
+        valuesOffset = (HEADER_SIZE + len(meta) + 7) // 8 * 8
+        size = valuesOffset + 8 * len(series)
+
+        self.path = path
+        self._index = {tuple(str(v) for v in s): i for i, s in enumerate(series)}
+        self._seq = 0
+        tmpPath = f"{path}.{os.getpid()}.tmp"
+        with open(tmpPath, "wb") as fout:
+            fout.write(HEADER.pack(MAGIC, VERSION, len(series), 0, time.time(),
+                                   HEADER_SIZE, len(meta), valuesOffset))
+            fout.write(bytes(HEADER_SIZE - HEADER.size) + meta)
+            fout.truncate(size)
+        with open(tmpPath, "r+b") as fout:
+            self._mmap = mmap.mmap(fout.fileno(), size)
+        os.replace(tmpPath, path)
+
+        # Values of the series, updated in place.
+        self.values = memoryview(self._mmap)[valuesOffset:size].cast("d")
+
+    #---------------------------------------------------------------------------
+    def index(self, labels: Sequence[str]) -> int:
+        """Index of a series in values."""
+        return self._index[tuple(str(l) for l in labels)]
+
+    #---------------------------------------------------------------------------
+    @contextlib.contextmanager
+    def update(self) -> Iterator[memoryview]:
+        """Update several values so that readers see all or none of them.
+
+        Yields:
+            values: Values of the series.
+        """
+        self._seq += 1
+        _SEQ.pack_into(self._mmap, _SEQ_OFFSET, self._seq)
+        try:
+            yield self.values
+        finally:
+            _TIME.pack_into(self._mmap, _TIME_OFFSET, time.time())
+            self._seq += 1
+            _SEQ.pack_into(self._mmap, _SEQ_OFFSET, self._seq)
+
+    #---------------------------------------------------------------------------
+    def set(self, labels: Sequence[str], value: float) -> None:
+        """Set the value of one series."""
+        idx = self.index(labels)
+        with self.update() as values:
+            values[idx] = value
+
+    #---------------------------------------------------------------------------
+    def close(self) -> None:
+        """Stop writing; the file keeps its last values."""
+        self.values.release()
+        self._mmap.close()
+
+#-------------------------------------------------------------------------------
+class MmapMetricReader:
+    """Map a binary metric file and copy out consistent values."""
+    # Attempts at a consistent copy before giving up on a busy writer.
+    maxRetries = 100
+
+    #---------------------------------------------------------------------------
+    def __init__(self, path: str):
+        """Map the file.
+
+        Args:
+            path: Path of the file.
+        """
+        self.path = path
+        self.name = ""
+        self.description = ""
+        self.labels: List[str] = []
+        # Label dicts of the series, built once per file.
+        self.labelDicts: List[Dict[str, str]] = []
+        self._mmap: Optional[mmap.mmap] = None
+        self._fileId: Tuple[int, int] = (0, 0)
+        # View of the mapped values.
+        self._values: Optional[memoryview] = None
+        self._map()
+
+    #---------------------------------------------------------------------------
+    def _map(self) -> None:
+        """Map the file at the path and read its label table."""
+        with open(self.path, "rb") as finp:
+            stat = os.fstat(finp.fileno())
+            data = mmap.mmap(finp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, nSeries, _, _, metaOffset, metaSize,
+             valuesOffset) = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{self.path} is not a glados metric file.")
+            meta = json.loads(data[metaOffset:metaOffset + metaSize])
+            if len(data) < valuesOffset + 8 * nSeries:
+                raise ValueError(f"{self.path} is truncated.")
+        except (ValueError, struct.error):
+            data.close()
+            raise
+
+        self.close()
+        self._mmap = data
+        self._fileId = (stat.st_ino, stat.st_dev)
+        self._values = memoryview(data)[valuesOffset:valuesOffset + 8 * nSeries]
+        self.name = meta["name"]
+        self.description = meta["description"]
+        self.labels = meta["labels"]
+        strings = [sys.intern(s) for s in meta["strings"]]
+        self.labelDicts = [
+            dict(zip(self.labels, [strings[i] for i in indices]))
+            for indices in meta["series"]
+        ]
+
+    #---------------------------------------------------------------------------
+    def refresh(self) -> bool:
+        """Map the file again if it was replaced.
+
+        Returns:
+            replaced: Whether the label table may have changed.
+        """
+        stat = os.stat(self.path)
+        if (stat.st_ino, stat.st_dev) == self._fileId:
+            return False
+        self._map()
+        return True
+
+    #---------------------------------------------------------------------------
+    def read(self) -> Optional[Tuple[array, float]]:
+        """Copy the values while no update is in progress.
+
+        Returns:
+            values: Values of the series and the time of the last update, or
+                None if the writer never let a consistent copy be made.
+        """
+        data = self._mmap
+        assert data is not None and self._values is not None
+        for attempt in range(self.maxRetries):
+            seq = _SEQ.unpack_from(data, _SEQ_OFFSET)[0]
+            if not seq & 1:
+                # The only copy made of the values.
+                values = array("d")
+                values.frombytes(self._values)
+                updated = _TIME.unpack_from(data, _TIME_OFFSET)[0]
+                if _SEQ.unpack_from(data, _SEQ_OFFSET)[0] == seq:
+                    return values, updated
+            if attempt:
+                # Let the writer finish its update.
+                time.sleep(0)
+        return None
+
+    #---------------------------------------------------------------------------
+    def close(self) -> None:
+        """Unmap the file."""
+        if self._values is not None:
+            self._values.release()
+            self._values = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Discovery of turrets shipped outside of glados.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+
+Turrets are found in three places:
+    - glados.turrets, as listed in TURRET_MANIFEST.
+    - The 'glados.turrets' entry point group, e.g. in a plugin's setup.py:
+        entry_points={"glados.turrets": ["FooTurret = foo.turrets:FooTurret"]}
+    - Python files in plugin directories defining Turret subclasses.
+Plugin metadata is cached so plugins are only imported when they are enabled
+or when they are installed or changed.
+"""
+
+from dataclasses import dataclass
+import importlib.metadata
+import importlib.util
+from importlib import import_module
+import json
+import os
+import os.path as op
+import sys
+from typing import Any, Dict, List, Optional
+
+from .fileCache import fileKey
+from .turrets import TURRET_MANIFEST
+from .turrets.Turret import Turret
+
+ENTRY_POINT_GROUP = "glados.turrets"
+# Prefix of module names under which plugin directory files are imported.
+PLUGIN_MODULE_PREFIX = "glados_plugin_"
+
+#-------------------------------------------------------------------------------
+@dataclass
+class TurretPlugin:
+    """Where to find a turret class and its cached metadata."""
+    name: str
+    module: str
+    # Name of the class in module (None -> name).
+    attr: Optional[str] = None
+    # "builtin", "entrypoint" or "directory".
+    source: str = "builtin"
+    # Source file of turrets from plugin directories.
+    path: str = ""
+    interval: Optional[float] = None
+    cost: str = "low"
+
+    #---------------------------------------------------------------------------
+    def load(self) -> type:
+        """Import the turret's module and return the turret class."""
+        module = _importModule(self.module, self.path)
+        return getattr(module, self.attr or self.name)
+
+    #---------------------------------------------------------------------------
+    def describe(self) -> "TurretPlugin":
+        """Fill in the metadata by importing the turret."""
+        turretClass = self.load()
+        self.interval = turretClass.interval
+        self.cost = turretClass.cost
+        return self
+
+    #---------------------------------------------------------------------------
+    def metadata(self) -> Dict[str, Any]:
+        """Metadata to cache."""
+        return {"name": self.name, "module": self.module, "attr": self.attr,
+                "interval": self.interval, "cost": self.cost}
+
+#-------------------------------------------------------------------------------
+def _importModule(moduleName: str, path: str = ""):
+    """Import a module by name or, if path is given, from a file."""
+    if not path:
+        return import_module(moduleName)
+
+    module = sys.modules.get(moduleName)
+    if module is not None:
+        return module
+    spec = importlib.util.spec_from_file_location(moduleName, path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[moduleName] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[moduleName]
+        raise
+    return module
+
+#-------------------------------------------------------------------------------
+def defaultPluginCache() -> str:
+    """Path of the plugin metadata cache (under $XDG_CACHE_HOME)."""
+    cacheHome = os.environ.get("XDG_CACHE_HOME") or op.expanduser("~/.cache")
+    return op.join(cacheHome, "glados", "plugins.json")
+
+#-------------------------------------------------------------------------------
+def entryPoints() -> List[importlib.metadata.EntryPoint]:
+    """Entry points in the glados.turrets group."""
+    eps = importlib.metadata.entry_points()
+    if hasattr(eps, "select"):
+        return list(eps.select(group=ENTRY_POINT_GROUP))
+    return list(eps.get(ENTRY_POINT_GROUP, [])) # Python < 3.10
+
+#-------------------------------------------------------------------------------
+def builtinPlugins() -> Dict[str, TurretPlugin]:
+    """Turrets in glados.turrets, without importing them."""
+    return {
+        name: TurretPlugin(name, f"glados.turrets.{module}")
+        for name, (module, _) in TURRET_MANIFEST.items()
+    }
+
+#-------------------------------------------------------------------------------
+def scanPluginFile(fileName: str) -> List[TurretPlugin]:
+    """Import a plugin file and describe the turrets it defines.
+
+    Args:
+        fileName: Path to a Python file.
+
+    Returns:
+        plugins: Described plugins of all Turret subclasses in the file.
+    """
+
+    stem = op.splitext(op.basename(fileName))[0]
+    moduleName = PLUGIN_MODULE_PREFIX + stem
+    module = _importModule(moduleName, fileName)
+
+    plugins = []
+    for name, obj in vars(module).items():
+        if (isinstance(obj, type) and issubclass(obj, Turret)
+                and obj.__module__ == moduleName):
+            plugin = TurretPlugin(name, moduleName, None, "directory", fileName)
+            plugins.append(plugin.describe())
+    return plugins
+
+#-------------------------------------------------------------------------------
+def _writeCache(cacheFile: str, cache: Dict) -> None:
+    """Atomically write the metadata cache, ignoring unwritable locations."""
+    try:
+        os.makedirs(op.dirname(cacheFile), exist_ok=True)
+        tmpFile = f"{cacheFile}.{os.getpid()}.tmp"
+        with open(tmpFile, "w", encoding="UTF-8") as fout:
+            json.dump(cache, fout, indent=1)
+        os.replace(tmpFile, cacheFile)
+    except OSError as exc:
+        print(f"[W] Unable to write plugin cache {cacheFile}: {exc}")
+
+#-------------------------------------------------------------------------------
+def discoverPlugins(
+    pluginDirs: Optional[List[str]] = None, cacheFile: str = ""
+) -> Dict[str, TurretPlugin]:
+    """Find all turrets, built-in or plugin. Plugins are only imported if their
+    metadata is not cached yet or their source has changed.
+
+    Args:
+        pluginDirs: Directories of Python files defining turrets.
+        cacheFile: Metadata cache to use ("" -> defaultPluginCache()).
+
+    Returns:
+        plugins: Turret name -> TurretPlugin.
+    """
+
+    cacheFile = cacheFile if cacheFile else defaultPluginCache()
+    try:
+        with open(cacheFile, "r", encoding="UTF-8") as finp:
+            cache = json.load(finp)
+    except (OSError, ValueError):
+        cache = {}
+    newCache: Dict[str, List[Dict[str, Any]]] = {}
+
+    plugins = builtinPlugins()
+
+    def addPlugins(key: str, source: str, path: str, describe) -> None:
+        """Add the plugins cached under key, or describe and cache them."""
+        if key in cache:
+            found = [TurretPlugin(source=source, path=path, **m)
+                     for m in cache[key]]
+        else:
+            try:
+                found = describe()
+            except Exception as exc: # pylint: disable=broad-except
+                print(f"[W] Unable to load turret plugin {key}: {exc}")
+                return
+        newCache[key] = [p.metadata() for p in found]
+        for plugin in found:
+            if plugin.name in plugins:
+                print(f"[W] Ignoring duplicate turret plugin {plugin.name}.")
+                continue
+            plugins[plugin.name] = plugin
+
+    # Entry points are keyed by their distribution's version so upgrading a
+    # plugin package refreshes its metadata.
+    for ep in entryPoints():
+        module, _, attr = ep.value.partition(":")
+        dist = getattr(ep, "dist", None)
+        version = f"{dist.name}=={dist.version}" if dist else ""
+        plugin = TurretPlugin(ep.name, module, attr.strip(), "entrypoint")
+        addPlugins(f"entrypoint:{ep.name}={ep.value}@{version}", "entrypoint",
+                   "", lambda p=plugin: [p.describe()])
+
+    # Plugin files are keyed by their inode, mtime and size.
+    for pluginDir in pluginDirs or []:
+        try:
+            names = sorted(os.listdir(pluginDir))
+        except OSError as exc:
+            print(f"[W] Unable to read plugin directory {pluginDir}: {exc}")
+            continue
+        for name in names:
+            if not name.endswith(".py") or name.startswith("_"):
+                continue
+            fileName = op.realpath(op.join(pluginDir, name))
+            key = f"directory:{fileName}:{fileKey(fileName)}"
+            addPlugins(key, "directory", fileName,
+                       lambda f=fileName: scanPluginFile(f))
+
+    if newCache != cache:
+        _writeCache(cacheFile, newCache)
+
+    return plugins
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Opt-in profiling of turret collections on a live process.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+
+While a CollectionProfiler is running, every collection measured by
+TURRET_STATS runs under a cProfile profile of its turret. When it stops (after
+a number of seconds or when toggled again), one pstats file per turret and a
+text summary are written, e.g.:
+    kill -USR1 <pid>
+    curl 'http://localhost:<port>/debug/profile?seconds=30'
+    python -m pstats glados-profile-<time>-NvidiaGpuTurret.pstats
+Nothing is profiled, and nothing costs more than one attribute check, while it
+is not running.
+
+Before Python 3.12 a profile only sees the thread it was enabled in, so
+turrets collecting concurrently in other threads are told apart. From 3.12 on
+cProfile is process-wide: one collection is profiled at a time while any
+others run unprofiled, and its profile also counts what other threads run in
+the meantime. Attribution to turrets is then only exact when they collect one
+after another.
+"""
+
+import cProfile
+import io
+import os
+import os.path as op
+import pstats
+import re
+import signal
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .selfMetrics import TURRET_STATS, TurretKey, TurretStats
+
+#-------------------------------------------------------------------------------
+class _ProfiledAwaitable:
+    """Await a coroutine, profiling each of its steps but not the time it is
+    suspended, so that concurrent turrets on one event loop are told apart.
+    """
+    #---------------------------------------------------------------------------
+    def __init__(self, profiler: "CollectionProfiler", key: TurretKey, coro):
+        """Initialization."""
+        self._profiler = profiler
+        self._key = key
+        self._coro = coro
+
+    #---------------------------------------------------------------------------
+    def __await__(self):
+        """Drive the coroutine one step at a time."""
+        coro = self._coro
+        value: Any = None
+        error: Optional[BaseException] = None
+        while True:
+            profile = self._profiler.begin(self._key)
+            try:
+                if error is None:
+                    yielded = coro.send(value)
+                else:
+                    yielded = coro.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self._profiler.end(self._key, profile)
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as exc: # pylint: disable=broad-except
+                value, error = None, exc
+
+#-------------------------------------------------------------------------------
+class CollectionProfiler:
+    """Profile the collections of all turrets for a number of seconds."""
+    # Functions listed per turret in the text summary.
+    summaryLines = 25
+    # Seconds stop() waits for collections being profiled to finish a step.
+    stopTimeout = 10.0
+
+    #---------------------------------------------------------------------------
+    def __init__(
+        self, directory: str, seconds: float = 30.0,
+        stats: TurretStats = TURRET_STATS
+    ):
+        """Initialization.
+
+        Args:
+            directory: Directory to write profiles to.
+            seconds: Default length of a profiling run.
+            stats: TurretStats whose collections are profiled.
+        """
+        self.directory = directory
+        self.seconds = seconds
+        self.stats = stats
+        self.files: List[str] = []
+        # Profiles of each turret; one per concurrent collection.
+        self._profiles: Dict[TurretKey, List[cProfile.Profile]] = {}
+        self._idle: Dict[TurretKey, List[cProfile.Profile]] = {}
+        self._busy = 0
+        self._started = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._cond = threading.Condition()
+
+    #---------------------------------------------------------------------------
+    @property
+    def active(self) -> bool:
+        """Whether collections are being profiled."""
+        return self.stats.profiler is self
+
+    #---------------------------------------------------------------------------
+    def start(self, seconds: Optional[float] = None) -> bool:
+        """Profile collections until stopped or for some seconds.
+
+        Args:
+            seconds: Length of the run (None -> self.seconds, 0 -> until
+                stopped).
+
+        Returns:
+            started: False if a run is already in progress.
+        """
+        seconds = self.seconds if seconds is None else seconds
+        with self._cond:
+            if self.stats.profiler is not None:
+                return False
+            self._profiles, self._idle = {}, {}
+            self._started = time.time()
+            self.stats.profiler = self
+            if seconds:
+                self._timer = threading.Timer(seconds, self.stop)
+                self._timer.daemon = True
+                self._timer.start()
+        length = f"for {seconds}s" if seconds else "until stopped"
+        print(f"[I] Profiling turret collections {length}.")
+        return True
+
+    #---------------------------------------------------------------------------
+    def stop(self) -> List[str]:
+        """Stop profiling and write the profiles.
+
+        Returns:
+            files: Files written.
+        """
+        with self._cond:
+            if self.stats.profiler is not self:
+                return []
+            self.stats.profiler = None
+            # Let collections which are being profiled finish their step.
+            self._cond.wait_for(lambda: self._busy == 0, self.stopTimeout)
+            profiles, self._profiles, self._idle = self._profiles, {}, {}
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        return self.write(profiles)
+
+    #---------------------------------------------------------------------------
+    def toggle(self) -> None:
+        """Start profiling, or stop it if it is running."""
+        if not self.start():
+            self.stop()
+
+    #---------------------------------------------------------------------------
+    def begin(self, key: TurretKey) -> Optional[cProfile.Profile]:
+        """Enable a profile of a turret in the current thread.
+
+        Returns:
+            profile: The enabled profile, or None if not profiling.
+        """
+        with self._cond:
+            if self.stats.profiler is not self:
+                return None
+            idle = self._idle.setdefault(key, [])
+            if idle:
+                profile = idle.pop()
+            else:
+                profile = cProfile.Profile()
+                self._profiles.setdefault(key, []).append(profile)
+            self._busy += 1
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profile is already active, in this thread before Python
+            # 3.12 or in any thread from 3.12 on.
+            self._release(key, profile)
+            return None
+        return profile
+
+    #---------------------------------------------------------------------------
+    def end(self, key: TurretKey, profile: Optional[cProfile.Profile]) -> None:
+        """Disable a profile returned by begin."""
+        if profile is None:
+            return
+        profile.disable()
+        self._release(key, profile)
+
+    #---------------------------------------------------------------------------
+    def _release(self, key: TurretKey, profile: cProfile.Profile) -> None:
+        """Return a profile for reuse by the turret's next collection."""
+        with self._cond:
+            self._idle.setdefault(key, []).append(profile)
+            self._busy -= 1
+            self._cond.notify_all()
+
+    #---------------------------------------------------------------------------
+    def run(self, key: TurretKey, fn: Callable[[], Any]) -> Any:
+        """Call fn under the turret's profile."""
+        profile = self.begin(key)
+        try:
+            return fn()
+        finally:
+            self.end(key, profile)
+
+    #---------------------------------------------------------------------------
+    async def runAsync(
+        self, key: TurretKey, coroFn: Callable[[], Awaitable]
+    ) -> Any:
+        """Await coroFn() under the turret's profile."""
+        return await _ProfiledAwaitable(self, key, coroFn())
+
+    #---------------------------------------------------------------------------
+    def write(
+        self, profiles: Dict[TurretKey, List[cProfile.Profile]]
+    ) -> List[str]:
+        """Write one pstats file per turret and a text summary of them all.
+
+        Args:
+            profiles: Profiles of each turret.
+
+        Returns:
+            files: Files written.
+        """
+        prefix = op.join(self.directory, f"glados-profile-{self._started:.0f}")
+        summary = io.StringIO()
+        files = []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for (turretName, fileName), turretProfiles in profiles.items():
+                stats = _mergeProfiles(turretProfiles, summary)
+                if stats is None:
+                    continue
+                name = turretName
+                if fileName:
+                    name += "-" + re.sub(r"[^\w.-]", "_", op.basename(fileName))
+                stats.dump_stats(f"{prefix}-{name}.pstats")
+                files.append(f"{prefix}-{name}.pstats")
+
+                summary.write(f"==== {turretName} {fileName}\n")
+                stats.sort_stats("cumulative").print_stats(self.summaryLines)
+
+            if files:
+                with open(f"{prefix}.txt", "w", encoding="UTF-8") as fout:
+                    fout.write(summary.getvalue())
+                files.append(f"{prefix}.txt")
+        except OSError as exc:
+            print(f"[W] Unable to write profiles to {self.directory}: {exc}")
+
+        print(f"[I] Wrote {len(files)} profile files to {self.directory}.")
+        self.files += files
+        return files
+
+#-------------------------------------------------------------------------------
+def _mergeProfiles(
+    profiles: List[cProfile.Profile], stream: io.StringIO
+) -> Optional[pstats.Stats]:
+    """Combine the profiles of a turret (None if none recorded anything)."""
+    stats = None
+    for profile in profiles:
+        try:
+            if stats is None:
+                stats = pstats.Stats(profile, stream=stream)
+            else:
+                stats.add(profile)
+        except TypeError:
+            # Never enabled, so there is nothing to add.
+            continue
+    return stats
+
+#-------------------------------------------------------------------------------
+def installProfileSignal(
+    profiler: CollectionProfiler, signum: int = signal.SIGUSR1
+) -> None:
+    """Toggle profiling on a signal. Must be called from the main thread.
+
+    Args:
+        profiler: Profiler to toggle.
+        signum: Signal to toggle on.
+    """
+
+    def handler(_signum, _frame):
+        """Toggle without blocking the main thread while profiles are written."""
+        threading.Thread(
+            target=profiler.toggle, daemon=True, name="glados-profiler"
+        ).start()
+
+    signal.signal(signum, handler)
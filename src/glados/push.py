@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Push metrics to a Pushgateway or a Prometheus text import endpoint.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+import glob
+import gzip
+import http.client
+import os
+import os.path as op
+import threading
+import time
+from typing import Iterable, List, Optional
+from urllib.parse import quote, urlsplit
+
+from prometheus_client.exposition import generate_latest
+from prometheus_client.metrics_core import Metric
+from prometheus_client.registry import CollectorRegistry
+from prometheus_client.samples import Sample
+
+from .backfill import StaticCollector
+
+#-------------------------------------------------------------------------------
+def withTimestamp(
+    families: Iterable[Metric], timestamp: Optional[float]
+) -> List[Metric]:
+    """Copy families, giving samples without a timestamp the one given, or
+    removing all timestamps if it is None.
+
+    Args:
+        families: Families to copy.
+        timestamp: Time for samples without one (None -> strip timestamps).
+
+    Returns:
+        families: Copied families.
+    """
+
+    copies = []
+    for family in families:
+        copy = Metric(family.name, family.documentation, family.type,
+                      family.unit)
+        for s in family.samples:
+            sampleTime = None
+            if timestamp is not None:
+                sampleTime = timestamp if s.timestamp is None else s.timestamp
+            copy.samples.append(
+                Sample(s.name, s.labels, s.value, sampleTime, s.exemplar)
+            )
+        copies.append(copy)
+
+    return copies
+
+#-------------------------------------------------------------------------------
+class PushClient:
+    """Push all metrics of a registry every interval over one keep-alive
+    connection.
+
+    Formats:
+        "pushgateway": PUT the latest values (without timestamps) to
+            <url>/metrics/job/<job>/instance/<instance>, replacing the group.
+        "import": POST timestamped samples to <url> (e.g. VictoriaMetrics'
+            /api/v1/import/prometheus). Batches which cannot be sent are
+            spooled to disk and replayed in order, so no points are lost.
+    """
+    #---------------------------------------------------------------------------
+    def __init__(
+        self, registry: CollectorRegistry, url: str,
+        format: str = "pushgateway", # pylint: disable=redefined-builtin
+        job: str = "glados", instance: str = "", interval: float = 15.0,
+        timeout: float = 10.0, retries: int = 2, compress: bool = True,
+        spoolDir: str = "", maxSpool: int = 100
+    ):
+        """Initialization.
+
+        Args:
+            registry: Registry to push.
+            url: Base URL of the receiver.
+            format: "pushgateway" or "import".
+            job: Pushgateway job label.
+            instance: Pushgateway instance label ("" -> hostname).
+            interval: Seconds between pushes.
+            timeout: Seconds to wait on the receiver.
+            retries: Retries of a failed push before giving up on it.
+            compress: Whether to gzip request bodies.
+            spoolDir: Directory to spool unsent batches to ("" -> memory
+                only). Only used by the "import" format.
+            maxSpool: Maximum number of spooled batches; the oldest are
+                dropped first (0 -> unsent batches are dropped).
+        """
+        assert format in ("pushgateway", "import"), f"Unknown format {format}"
+        self.registry = registry
+        self.format = format
+        self.interval = interval
+        self.timeout = timeout
+        self.retries = retries
+        self.compress = compress
+        self.spoolDir = spoolDir
+        self.maxSpool = maxSpool
+        self.pushes = 0
+        self.failures = 0
+
+        parts = urlsplit(url)
+        self._https = parts.scheme == "https"
+        self._netloc = parts.netloc
+        path = parts.path.rstrip("/")
+        if format == "pushgateway":
+            instance = instance if instance else os.uname().nodename
+            path += (f"/metrics/job/{quote(job, safe='')}"
+                     f"/instance/{quote(instance, safe='')}")
+        self._path = path if path else "/"
+        self._conn: Optional[http.client.HTTPConnection] = None
+        # Unsent batches, oldest first, when not spooling to disk.
+        self._memSpool: List[bytes] = []
+        self._stopEvent = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    #---------------------------------------------------------------------------
+    def start(self) -> None:
+        """Push every interval in a daemon thread."""
+        self._stopEvent.clear()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="glados-push"
+        )
+        self._thread.start()
+
+    #---------------------------------------------------------------------------
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop pushing.
+
+        Args:
+            timeout: Seconds to wait for the push thread to finish.
+        """
+        self._stopEvent.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close()
+
+    #---------------------------------------------------------------------------
+    def _run(self) -> None:
+        """Push until stopped."""
+        while not self._stopEvent.is_set():
+            started = time.monotonic()
+            try:
+                self.push()
+            except Exception as exc: # pylint: disable=broad-except
+                print(f"[W] Push failed: {exc}")
+            delay = self.interval - (time.monotonic() - started)
+            self._stopEvent.wait(max(delay, 0.0))
+
+    #---------------------------------------------------------------------------
+    def render(self) -> bytes:
+        """Render one batch of all metrics in the registry."""
+        families = self.registry.collect()
+        timestamp = time.time() if self.format == "import" else None
+        body = generate_latest(
+            StaticCollector(withTimestamp(families, timestamp))
+        )
+        if self.compress:
+            body = gzip.compress(body, 6, mtime=0)
+        return body
+
+    #---------------------------------------------------------------------------
+    def push(self) -> bool:
+        """Render and send a batch, first replaying any spooled batches.
+
+        Returns:
+            sent: Whether all batches were sent.
+        """
+        body = self.render()
+        if self.format == "pushgateway":
+            # Only the latest values matter to a Pushgateway.
+            return self._send(body)
+
+        for spooled in self._spooled():
+            if not self._send(self._readSpool(spooled)):
+                self._spool(body)
+                return False
+            self._unspool(spooled)
+
+        if not self._send(body):
+            self._spool(body)
+            return False
+        return True
+
+    #---------------------------------------------------------------------------
+    def _send(self, body: bytes) -> bool:
+        """Send a body, retrying with backoff on failure."""
+        method = "PUT" if self.format == "pushgateway" else "POST"
+        headers = {"Content-Type": "text/plain; version=0.0.4"}
+        if self.compress:
+            headers["Content-Encoding"] = "gzip"
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                backoff = min(0.5 * 2 ** (attempt - 1), self.interval)
+                self._stopEvent.wait(backoff)
+            try:
+                conn = self._connection()
+                conn.request(method, self._path, body, headers)
+                response = conn.getresponse()
+                response.read()
+                if response.will_close:
+                    self._close()
+                if 200 <= response.status < 300:
+                    self.pushes += 1
+                    return True
+                print(f"[W] Push rejected: {response.status} "
+                      f"{response.reason}")
+                # Retrying will not help requests the receiver refuses.
+                if 400 <= response.status < 500 and response.status != 429:
+                    break
+            except (OSError, http.client.HTTPException) as exc:
+                print(f"[W] Push to {self._netloc} failed: {exc}")
+                self._close()
+
+        self.failures += 1
+        return False
+
+    #---------------------------------------------------------------------------
+    def _connection(self) -> http.client.HTTPConnection:
+        """The keep-alive connection, (re)connecting if needed."""
+        if self._conn is None:
+            connClass = (http.client.HTTPSConnection if self._https
+                         else http.client.HTTPConnection)
+            self._conn = connClass(self._netloc, timeout=self.timeout)
+        return self._conn
+
+    #---------------------------------------------------------------------------
+    def _close(self) -> None:
+        """Close the connection."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    #---------------------------------------------------------------------------
+    def _spooled(self) -> List:
+        """Spooled batches, oldest first."""
+        if not self.spoolDir:
+            return list(self._memSpool)
+        return sorted(glob.glob(op.join(self.spoolDir, "push-*.batch")))
+
+    #---------------------------------------------------------------------------
+    def _readSpool(self, spooled) -> bytes:
+        """Body of a spooled batch."""
+        if not self.spoolDir:
+            return spooled
+        with open(spooled, "rb") as finp:
+            return finp.read()
+
+    #---------------------------------------------------------------------------
+    def _unspool(self, spooled) -> None:
+        """Drop a spooled batch once sent."""
+        if not self.spoolDir:
+            self._memSpool.remove(spooled)
+            return
+        try:
+            os.remove(spooled)
+        except FileNotFoundError:
+            pass
+
+    #---------------------------------------------------------------------------
+    def _spool(self, body: bytes) -> None:
+        """Keep an unsent batch, dropping the oldest beyond maxSpool."""
+        if self.maxSpool <= 0:
+            # Keep nothing (slicing with [:-0] would keep everything).
+            self._memSpool.clear()
+            return
+        if not self.spoolDir:
+            self._memSpool.append(body)
+            del self._memSpool[:-self.maxSpool]
+            return
+
+        fileName = op.join(self.spoolDir, f"push-{time.time_ns():020d}.batch")
+        try:
+            os.makedirs(self.spoolDir, exist_ok=True)
+            with open(fileName + ".tmp", "wb") as fout:
+                fout.write(body)
+            os.replace(fileName + ".tmp", fileName)
+        except OSError as exc:
+            print(f"[W] Unable to spool push batch: {exc}")
+        spooled = self._spooled()
+        for old in spooled[:max(len(spooled) - self.maxSpool, 0)]:
+            print(f"[W] Push spool full; dropping {old}.")
+            self._unspool(old)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Background collection of Turrets.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+import heapq
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client.core import CounterMetricFamily
+from prometheus_client.registry import Collector
+
+from .turrets.Turret import Turret
+
+#-------------------------------------------------------------------------------
+class TurretScheduler(Collector):
+    """Refresh each turret on its own interval on a bounded thread pool so that
+    scrapes only ever read the latest published snapshot. A turret which runs
+    past its timeout keeps serving its last good snapshot and is counted in
+    glados_turret_timeout_total.
+    """
+    #---------------------------------------------------------------------------
+    def __init__(
+        self, turrets: List[Turret], interval: float = 5.0,
+        maxWorkers: Optional[int] = None
+    ):
+        """Initialization.
+
+        Args:
+            turrets: Turrets whose acquisition is owned by this scheduler.
+            interval: Default seconds between refreshes for turrets which do
+                not set their own interval.
+            maxWorkers: Size of the thread pool (None -> ThreadPoolExecutor
+                default).
+        """
+        self.turrets = list(turrets)
+        self.interval = interval
+        self.maxWorkers = maxWorkers if maxWorkers else None
+        self.timeouts: Dict[Turret, int] = {}
+        self._stopEvent = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Turret -> (future, start time, whether it has already timed out).
+        self._inFlight: Dict[Turret, Tuple[Future, float, bool]] = {}
+        self._lock = threading.Lock()
+
+        for turret in self.turrets:
+            if turret.interval is None:
+                turret.interval = interval
+            if turret.timeout is None:
+                turret.timeout = turret.interval
+            if turret.maxStaleness is None:
+                turret.maxStaleness = 3 * turret.interval
+            turret.scheduled = True
+            self.timeouts[turret] = 0
+
+    #---------------------------------------------------------------------------
+    @property
+    def minInterval(self) -> float:
+        """Shortest refresh interval of any turret (or the default), at which
+        new snapshots may be published.
+        """
+        return min([self.interval] + [t.interval for t in self.turrets])
+
+    #---------------------------------------------------------------------------
+    def start(self) -> None:
+        """Start the dispatcher thread and the worker pool."""
+        self._stopEvent.clear()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.maxWorkers, thread_name_prefix="glados-turret"
+        )
+        self._thread = threading.Thread(
+            target=self._dispatch, daemon=True, name="glados-scheduler"
+        )
+        self._thread.start()
+
+    #---------------------------------------------------------------------------
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop dispatching. Refreshes which are still running are abandoned.
+
+        Args:
+            timeout: Seconds to wait for the dispatcher thread to finish.
+        """
+        self._stopEvent.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    #---------------------------------------------------------------------------
+    def _dispatch(self) -> None:
+        """Submit turrets as they come due and enforce their timeouts."""
+        queue = [(time.monotonic(), i, t) for i, t in enumerate(self.turrets)]
+        heapq.heapify(queue)
+
+        while not self._stopEvent.is_set():
+            now = time.monotonic()
+            wakeUp = self._checkTimeouts(now)
+
+            while queue and queue[0][0] <= now:
+                _, idx, turret = heapq.heappop(queue)
+                with self._lock:
+                    busy = turret in self._inFlight
+                if not busy:
+                    self._submit(turret, now)
+                heapq.heappush(queue, (now + turret.interval, idx, turret))
+
+            if queue:
+                wakeUp = min(wakeUp, queue[0][0])
+            self._stopEvent.wait(max(wakeUp - now, 0.001))
+
+    #---------------------------------------------------------------------------
+    def _submit(self, turret: Turret, now: float) -> None:
+        """Run one refresh of a turret on the pool."""
+        assert self._executor is not None
+        with self._lock:
+            future = self._executor.submit(turret.gatherAll)
+            self._inFlight[turret] = (future, now, False)
+        future.add_done_callback(lambda f: self._finish(turret, f))
+
+    #---------------------------------------------------------------------------
+    def _finish(self, turret: Turret, future: Future) -> None:
+        """Publish a finished refresh unless it already timed out. A failing
+        refresh keeps the previous snapshot until it becomes stale.
+        """
+        with self._lock:
+            _, _, timedOut = self._inFlight.pop(turret)
+        if timedOut or future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            print(f"[W] Refresh of {type(turret).__name__} failed: {exc}")
+            return
+        turret.publish(future.result())
+
+    #---------------------------------------------------------------------------
+    def _checkTimeouts(self, now: float) -> float:
+        """Mark refreshes which exceeded their turret's timeout. Their results
+        are discarded whenever they eventually finish.
+
+        Args:
+            now: Current time.monotonic().
+
+        Returns:
+            deadline: Earliest time at which a running refresh will time out.
+        """
+        deadline = now + self.interval
+        with self._lock:
+            for turret, (future, started, timedOut) in self._inFlight.items():
+                if timedOut:
+                    continue
+                if now - started <= turret.timeout:
+                    deadline = min(deadline, started + turret.timeout)
+                    continue
+                self._inFlight[turret] = (future, started, True)
+                self.timeouts[turret] += 1
+                print(f"[W] Refresh of {type(turret).__name__} timed out "
+                      f"after {turret.timeout}s.")
+
+        return deadline
+
+    #---------------------------------------------------------------------------
+    def collect(self):
+        """Yield the number of timed out refreshes per turret."""
+        counter = CounterMetricFamily(
+            "glados_turret_timeout",
+            "Number of turret refreshes which exceeded their timeout.",
+            labels=["turret", "file"],
+        )
+        for turret, count in self.timeouts.items():
+            counter.add_metric([type(turret).__name__, turret.fileName], count)
+        yield counter
+
+#-------------------------------------------------------------------------------
+class AsyncTurretScheduler(TurretScheduler):
+    """Refresh turrets from a single asyncio event loop. Turrets implementing
+    acquireAsync (e.g. command backed turrets) are awaited natively so hundreds
+    may be in flight without a thread each; others fall back to an executor.
+    """
+    #---------------------------------------------------------------------------
+    def __init__(
+        self, turrets: List[Turret], interval: float = 5.0,
+        maxWorkers: Optional[int] = None
+    ):
+        """Initialization.
+
+        Args:
+            turrets: Turrets whose acquisition is owned by this scheduler.
+            interval: Default seconds between refreshes for turrets which do
+                not set their own interval.
+            maxWorkers: Maximum number of concurrent refreshes (None -> no
+                limit).
+        """
+        super().__init__(turrets, interval, maxWorkers)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopAsync: Optional[asyncio.Event] = None
+
+    #---------------------------------------------------------------------------
+    def start(self) -> None:
+        """Run the event loop in a daemon thread."""
+        started = threading.Event()
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self.run(started)), daemon=True,
+            name="glados-scheduler"
+        )
+        self._thread.start()
+        started.wait()
+
+    #---------------------------------------------------------------------------
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the event loop.
+
+        Args:
+            timeout: Seconds to wait for the event loop thread to finish.
+        """
+        if self._loop and self._stopAsync:
+            self._loop.call_soon_threadsafe(self._stopAsync.set)
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    #---------------------------------------------------------------------------
+    async def run(self, started: Optional[threading.Event] = None) -> None:
+        """Refresh all turrets until stopped.
+
+        Args:
+            started: Set once the event loop is ready to be stopped.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stopAsync = asyncio.Event()
+        limit = asyncio.Semaphore(self.maxWorkers or max(len(self.turrets), 1))
+        if started:
+            started.set()
+
+        await asyncio.gather(*(self._runTurret(t, limit) for t in self.turrets))
+
+    #---------------------------------------------------------------------------
+    async def _runTurret(self, turret: Turret, limit: asyncio.Semaphore):
+        """Refresh a single turret until stopped. A refresh which fails or
+        times out keeps the previous snapshot until it becomes stale. A timed
+        out refresh is cancelled, which kills its commands, but one running in
+        an executor thread cannot be stopped: like TurretScheduler, the turret
+        is skipped while it is still in flight and its late result discarded.
+        """
+        assert self._loop is not None and self._stopAsync is not None
+        refresh: Optional[asyncio.Future] = None
+        while not self._stopAsync.is_set():
+            started = self._loop.time()
+            if refresh is None or refresh.done():
+                refresh = asyncio.ensure_future(
+                    self._refresh(turret, limit)
+                )
+                done, _ = await asyncio.wait({refresh}, timeout=turret.timeout)
+                if done:
+                    families = refresh.result()
+                    if families is not None:
+                        turret.publish(families)
+                else:
+                    self.timeouts[turret] += 1
+                    print(f"[W] Refresh of {type(turret).__name__} timed out "
+                          f"after {turret.timeout}s.")
+                    refresh.cancel()
+
+            delay = max(started + turret.interval - self._loop.time(), 0.0)
+            try:
+                await asyncio.wait_for(self._stopAsync.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    #---------------------------------------------------------------------------
+    @staticmethod
+    async def _refresh(
+        turret: Turret, limit: asyncio.Semaphore
+    ) -> Optional[Tuple]:
+        """Gather a turret once.
+
+        Returns:
+            families: Gathered metric families (None -> failed or cancelled).
+        """
+        try:
+            async with limit:
+                return await turret.gatherAllAsync()
+        except asyncio.CancelledError:
+            return None
+        except Exception as exc: # pylint: disable=broad-except
+            print(f"[W] Refresh of {type(turret).__name__} failed: {exc}")
+            return None
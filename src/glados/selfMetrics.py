@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Metrics of glados itself: what each turret costs to collect.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+import contextvars
+import math
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from prometheus_client.core import (
+    CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+)
+from prometheus_client.registry import Collector
+
+from .metricStore import StoreFamily
+
+# (turret class name, turret file) labelling the series of a turret.
+TurretKey = Tuple[str, str]
+
+# Turret being collected in the current thread or task, so that file reads and
+# subprocesses are attributed to it.
+_CURRENT_TURRET: contextvars.ContextVar[Optional[TurretKey]] = \
+    contextvars.ContextVar("gladosTurret", default=None)
+
+#-------------------------------------------------------------------------------
+def turretKey(turret) -> TurretKey:
+    """Labels of a turret's series."""
+    return (type(turret).__name__, turret.fileName)
+
+#-------------------------------------------------------------------------------
+def sampleCount(families: Tuple) -> int:
+    """Number of samples in families, without building a StoreFamily's."""
+    return sum(
+        f.nSamples if isinstance(f, StoreFamily) else len(f.samples)
+        for f in families
+    )
+
+#-------------------------------------------------------------------------------
+class _TurretStat:
+    """Accumulated statistics of one turret."""
+    __slots__ = ("buckets", "seconds", "samples", "errors", "lastSuccess")
+
+    #---------------------------------------------------------------------------
+    def __init__(self, nBuckets: int):
+        """Initialization."""
+        self.buckets = [0] * nBuckets
+        self.seconds = 0.0
+        self.samples = 0
+        self.errors = 0
+        self.lastSuccess = 0.0
+
+#-------------------------------------------------------------------------------
+class TurretStats(Collector):
+    """Time, samples and outcome of every turret collection, and the file
+    bytes read and subprocesses forked on behalf of each turret. Exported as:
+        glados_turret_collect_seconds (histogram)
+        glados_turret_samples
+        glados_turret_errors_total
+        glados_turret_last_success_timestamp
+        glados_turret_file_read_bytes_total (by file read)
+        glados_turret_subprocess_forks_total
+    """
+    # Upper bounds of the collection time histogram in seconds.
+    collectBuckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                      1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        """Initialization."""
+        self._stats: Dict[TurretKey, _TurretStat] = {}
+        # (turret class name, file read) -> bytes.
+        self._readBytes: Dict[TurretKey, int] = {}
+        self._forks: Dict[TurretKey, int] = {}
+        self._lock = threading.Lock()
+        # CollectionProfiler which is running, if any.
+        self.profiler = None
+
+    #---------------------------------------------------------------------------
+    def measure(self, turret, gather: Callable[[], Tuple]) -> Tuple:
+        """Collect a turret, recording the time taken, the number of samples
+        and whether it failed.
+
+        Args:
+            turret: Turret being collected.
+            gather: Function returning the turret's metric families.
+
+        Returns:
+            families: Result of gather.
+        """
+        key = turretKey(turret)
+        token = _CURRENT_TURRET.set(key)
+        profiler = self.profiler
+        start = time.perf_counter()
+        try:
+            if profiler is None:
+                families = gather()
+            else:
+                families = profiler.run(key, gather)
+        except Exception:
+            self._record(key, time.perf_counter() - start, None)
+            raise
+        finally:
+            _CURRENT_TURRET.reset(token)
+        self._record(key, time.perf_counter() - start, families)
+        return families
+
+    #---------------------------------------------------------------------------
+    async def measureAsync(
+        self, turret, gatherAsync: Callable[[], Awaitable[Tuple]]
+    ) -> Tuple:
+        """Async counterpart of measure. A cancelled (e.g. timed out)
+        collection is not recorded.
+        """
+        key = turretKey(turret)
+        token = _CURRENT_TURRET.set(key)
+        profiler = self.profiler
+        start = time.perf_counter()
+        try:
+            if profiler is None:
+                families = await gatherAsync()
+            else:
+                families = await profiler.runAsync(key, gatherAsync)
+        except Exception:
+            self._record(key, time.perf_counter() - start, None)
+            raise
+        finally:
+            _CURRENT_TURRET.reset(token)
+        self._record(key, time.perf_counter() - start, families)
+        return families
+
+    #---------------------------------------------------------------------------
+    def profiled(self, fn: Callable[[], Any]) -> Callable[[], Any]:
+        """Wrap fn to be profiled as part of the current turret's collection,
+        e.g. when it is handed to an executor, if a profiler is running.
+        """
+        profiler = self.profiler
+        key = _CURRENT_TURRET.get()
+        if profiler is None or key is None:
+            return fn
+        return lambda: profiler.run(key, fn)
+
+    #---------------------------------------------------------------------------
+    def _record(
+        self, key: TurretKey, seconds: float, families: Optional[Tuple]
+    ) -> None:
+        """Record one collection (families None -> it failed)."""
+        samples = sampleCount(families) if families is not None else 0
+        bucket = next(i for i, upper in enumerate(self.collectBuckets)
+                      if seconds <= upper)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = _TurretStat(len(self.collectBuckets))
+            stat.buckets[bucket] += 1
+            stat.seconds += seconds
+            if families is None:
+                stat.errors += 1
+            else:
+                stat.samples = samples
+                stat.lastSuccess = time.time()
+
+    #---------------------------------------------------------------------------
+    def countRead(self, path: str, nBytes: int) -> None:
+        """Count bytes read from a file by the turret being collected.
+
+        Args:
+            path: File read.
+            nBytes: Number of bytes read.
+        """
+        current = _CURRENT_TURRET.get()
+        key = (current[0] if current else "", path)
+        with self._lock:
+            self._readBytes[key] = self._readBytes.get(key, 0) + nBytes
+
+    #---------------------------------------------------------------------------
+    def countFork(self) -> None:
+        """Count a subprocess started by the turret being collected."""
+        key = _CURRENT_TURRET.get() or ("", "")
+        with self._lock:
+            self._forks[key] = self._forks.get(key, 0) + 1
+
+    #---------------------------------------------------------------------------
+    def forget(self, turret) -> None:
+        """Drop the series of a removed turret."""
+        key = turretKey(turret)
+        with self._lock:
+            self._stats.pop(key, None)
+            self._forks.pop(key, None)
+            self._readBytes.pop(key, None)
+
+    #---------------------------------------------------------------------------
+    def collect(self):
+        """Yield the self metrics of all turrets."""
+        labels = ["turret", "file"]
+        histogram = HistogramMetricFamily(
+            "glados_turret_collect_seconds",
+            "Time taken to collect a turret.", labels=labels
+        )
+        samples = GaugeMetricFamily(
+            "glados_turret_samples",
+            "Samples produced by the last successful collection.", labels=labels
+        )
+        errors = CounterMetricFamily(
+            "glados_turret_errors", "Failed turret collections.", labels=labels
+        )
+        lastSuccess = GaugeMetricFamily(
+            "glados_turret_last_success_timestamp",
+            "Unix time of the last successful collection.", labels=labels
+        )
+        readBytes = CounterMetricFamily(
+            "glados_turret_file_read_bytes",
+            "Bytes of files read by turrets, by file read.", labels=labels
+        )
+        forks = CounterMetricFamily(
+            "glados_turret_subprocess_forks",
+            "Subprocesses started by turrets.", labels=labels
+        )
+
+        with self._lock:
+            stats = [(key, list(s.buckets), s.seconds, s.samples, s.errors,
+                      s.lastSuccess) for key, s in self._stats.items()]
+            reads = list(self._readBytes.items())
+            forkCounts = list(self._forks.items())
+
+        for key, buckets, seconds, nSamples, nErrors, lastTime in stats:
+            cumulative: List[Tuple[str, float]] = []
+            total = 0
+            for upper, count in zip(self.collectBuckets, buckets):
+                total += count
+                bound = "+Inf" if math.isinf(upper) else str(upper)
+                cumulative.append((bound, total))
+            histogram.add_metric(list(key), cumulative, seconds)
+            samples.add_metric(list(key), nSamples)
+            errors.add_metric(list(key), nErrors)
+            if lastTime:
+                lastSuccess.add_metric(list(key), lastTime)
+        for key, nBytes in reads:
+            readBytes.add_metric(list(key), nBytes)
+        for key, count in forkCounts:
+            forks.add_metric(list(key), count)
+
+        yield from (histogram, samples, errors, lastSuccess, readBytes, forks)
+
+#-------------------------------------------------------------------------------
+# Statistics of all turrets.
+TURRET_STATS = TurretStats()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Shared-memory segment in which the workers of a job report metrics.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+
+glados creates the segment (see SharedMemoryTurret); each worker process
+attaches a SharedMetricsProducer to it by name:
+    producer = SharedMetricsProducer("glados_training")
+    loss = producer.register("train_loss", {"job": "resnet"}, "max")
+    producer.set(loss, 0.25)
+Every worker has its own row of values, so setting a value is a plain store
+without any lock. Claiming a row and registering a series, which are rare,
+take a file lock kept next to the segment. A thread of each producer stamps
+its row with a heartbeat; glados frees rows whose heartbeat stops, which
+works across PID namespaces (e.g. containers sharing /dev/shm).
+
+Layout:
+    header (64 bytes): magic, version, maximum workers, maximum series,
+        number of series
+    pids: one int64 per worker row (0 -> free), for information only
+    heartbeats: one float64 per worker row, time the worker last showed life
+    series: one record per series of its aggregation and its name and labels
+        as length-prefixed JSON
+    values: float64 [worker, series] (NaN -> not set by that worker)
+    times: float64 [worker, series], when each value was set
+"""
+
+import fcntl
+import json
+import os
+import os.path as op
+import struct
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"GLDSHMEM"
+VERSION = 2
+# magic, version, maximum workers, maximum series, number of series.
+HEADER = struct.Struct("<8sIIII")
+HEADER_SIZE = 64
+_NSERIES = struct.Struct("<I")
+_NSERIES_OFFSET = 20
+# Aggregation kind and JSON length of a series record.
+RECORD = struct.Struct("<BH")
+RECORD_SIZE = 256
+# How the values of all workers combine into one series.
+AGGREGATIONS = ("sum", "max", "last")
+
+# (name, labels) identifying a series.
+SeriesKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+#-------------------------------------------------------------------------------
+class SharedSegment:
+    """Views of the parts of a metrics segment."""
+    #---------------------------------------------------------------------------
+    def __init__(self, shm: shared_memory.SharedMemory):
+        """Initialization.
+
+        Args:
+            shm: Attached shared memory of the segment.
+        """
+        magic, version, maxWorkers, maxSeries, _ = HEADER.unpack_from(shm.buf)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{shm.name} is not a glados metrics segment.")
+        self.shm = shm
+        self.maxWorkers = maxWorkers
+        self.maxSeries = maxSeries
+
+        offset = HEADER_SIZE
+        self.pids = np.ndarray((maxWorkers,), np.int64, shm.buf, offset)
+        offset += 8 * maxWorkers
+        self.heartbeats = np.ndarray(
+            (maxWorkers,), np.float64, shm.buf, offset
+        )
+        offset += 8 * maxWorkers
+        self.recordsOffset = offset
+        offset += RECORD_SIZE * maxSeries
+        self.values = np.ndarray(
+            (maxWorkers, maxSeries), np.float64, shm.buf, offset
+        )
+        offset += 8 * maxWorkers * maxSeries
+        self.times = np.ndarray(
+            (maxWorkers, maxSeries), np.float64, shm.buf, offset
+        )
+
+    #---------------------------------------------------------------------------
+    @staticmethod
+    def size(maxWorkers: int, maxSeries: int) -> int:
+        """Bytes of a segment."""
+        return (HEADER_SIZE + 16 * maxWorkers + RECORD_SIZE * maxSeries
+                + 16 * maxWorkers * maxSeries)
+
+    #---------------------------------------------------------------------------
+    @classmethod
+    def create(
+        cls, name: str, maxWorkers: int, maxSeries: int
+    ) -> "SharedSegment":
+        """Create an empty segment.
+
+        Args:
+            name: Name of the segment.
+            maxWorkers: Maximum number of attached producers.
+            maxSeries: Maximum number of series.
+
+        Returns:
+            segment: The new segment.
+        """
+        shm = shared_memory.SharedMemory(
+            name, create=True, size=cls.size(maxWorkers, maxSeries)
+        )
+        HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, maxWorkers, maxSeries, 0)
+        segment = cls(shm)
+        segment.pids[:] = 0
+        segment.heartbeats[:] = 0.0
+        segment.values[:] = np.nan
+        return segment
+
+    #---------------------------------------------------------------------------
+    @classmethod
+    def attach(cls, name: str) -> "SharedSegment":
+        """Attach to an existing segment without taking ownership of it."""
+        shm = shared_memory.SharedMemory(name)
+        # Only the creator may unlink it, not the tracker of this process.
+        resource_tracker.unregister(
+            getattr(shm, "_name", "/" + name), "shared_memory"
+        )
+        return cls(shm)
+
+    #---------------------------------------------------------------------------
+    @property
+    def nSeries(self) -> int:
+        """Number of registered series."""
+        return _NSERIES.unpack_from(self.shm.buf, _NSERIES_OFFSET)[0]
+
+    #---------------------------------------------------------------------------
+    def records(self, start: int = 0) -> Iterator[Tuple[str, Dict, str]]:
+        """Yield (name, labels, aggregation) of the series from start on."""
+        buf = self.shm.buf
+        for idx in range(start, self.nSeries):
+            offset = self.recordsOffset + RECORD_SIZE * idx
+            agg, length = RECORD.unpack_from(buf, offset)
+            begin = offset + RECORD.size
+            name, labels = json.loads(bytes(buf[begin:begin + length]))
+            yield name, labels, AGGREGATIONS[agg]
+
+    #---------------------------------------------------------------------------
+    def addRecord(self, name: str, labels: Dict[str, str], agg: str) -> int:
+        """Append a series record (under the segment lock).
+
+        Returns:
+            idx: Index of the series.
+        """
+        idx = self.nSeries
+        if idx >= self.maxSeries:
+            raise ValueError(f"{self.shm.name} is full ({idx} series).")
+        data = json.dumps([name, labels]).encode()
+        if RECORD.size + len(data) > RECORD_SIZE:
+            raise ValueError(f"Series {name} {labels} is too long.")
+        offset = self.recordsOffset + RECORD_SIZE * idx
+        RECORD.pack_into(
+            self.shm.buf, offset, AGGREGATIONS.index(agg), len(data)
+        )
+        begin = offset + RECORD.size
+        self.shm.buf[begin:begin + len(data)] = data
+        # Publish the record only once it is complete.
+        _NSERIES.pack_into(self.shm.buf, _NSERIES_OFFSET, idx + 1)
+        return idx
+
+    #---------------------------------------------------------------------------
+    def lock(self) -> "_SegmentLock":
+        """Lock serializing changes to the workers and series of a segment."""
+        return _SegmentLock(self.shm.name)
+
+    #---------------------------------------------------------------------------
+    def close(self) -> None:
+        """Detach from the segment."""
+        del self.pids, self.heartbeats, self.values, self.times
+        self.shm.close()
+
+#-------------------------------------------------------------------------------
+class _SegmentLock:
+    """Exclusive lock on a segment, held through a file next to the segment
+    so that every process finds the same one whatever its TMPDIR.
+    """
+    # Where POSIX shared memory lives on Linux.
+    directory = "/dev/shm"
+
+    #---------------------------------------------------------------------------
+    def __init__(self, name: str):
+        """Initialization."""
+        directory = self.directory
+        if not op.isdir(directory):
+            directory = tempfile.gettempdir()
+        self.path = op.join(directory, f"{name.lstrip('/')}.lock")
+        self._fd = -1
+
+    #---------------------------------------------------------------------------
+    def __enter__(self):
+        """Take the lock."""
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    #---------------------------------------------------------------------------
+    def __exit__(self, *exc):
+        """Release the lock."""
+        os.close(self._fd)
+        self._fd = -1
+
+#-------------------------------------------------------------------------------
+class SharedMetricsProducer:
+    """Report the metrics of one worker process through a segment."""
+    # Seconds between heartbeats; glados frees the row of a worker whose
+    # heartbeat is older than its workerTimeout.
+    heartbeatInterval = 5.0
+
+    #---------------------------------------------------------------------------
+    def __init__(self, segmentName: str):
+        """Attach to the segment and claim a worker row.
+
+        Args:
+            segmentName: Name of a segment created by glados.
+        """
+        self.segment = SharedSegment.attach(segmentName)
+        with self.segment.lock():
+            free = np.flatnonzero(self.segment.pids == 0)
+            if not free.size:
+                self.segment.close()
+                raise ValueError(f"No free worker rows in {segmentName}.")
+            self.worker = int(free[0])
+            self.segment.values[self.worker] = np.nan
+            self.segment.heartbeats[self.worker] = time.time()
+            self.segment.pids[self.worker] = os.getpid()
+        self._index: Dict[SeriesKey, int] = {}
+        self._known = 0
+        self._values = self.segment.values[self.worker]
+        self._times = self.segment.times[self.worker]
+        self._stopEvent = threading.Event()
+        self._thread = threading.Thread(
+            target=self._beat, daemon=True, name="glados-heartbeat"
+        )
+        self._thread.start()
+
+    #---------------------------------------------------------------------------
+    def _beat(self) -> None:
+        """Stamp this worker's row until closed or the process exits."""
+        heartbeats = self.segment.heartbeats
+        while not self._stopEvent.wait(self.heartbeatInterval):
+            heartbeats[self.worker] = time.time()
+
+    #---------------------------------------------------------------------------
+    def register(
+        self, name: str, labels: Optional[Dict[str, str]] = None,
+        aggregation: str = "sum"
+    ) -> int:
+        """Register a series, or find it if another worker already has.
+
+        Args:
+            name: Name of the gauge.
+            labels: Labels of the series.
+            aggregation: "sum", "max" or "last" (value set most recently)
+                across workers. The first registration decides.
+
+        Returns:
+            idx: Index of the series for set().
+        """
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {aggregation}.")
+        labels = {str(k): str(v) for k, v in (labels or {}).items()}
+        key = (name, tuple(sorted(labels.items())))
+        if key in self._index:
+            return self._index[key]
+        with self.segment.lock():
+            self._refresh()
+            if key not in self._index:
+                self._index[key] = self.segment.addRecord(
+                    name, labels, aggregation
+                )
+                self._known += 1
+        return self._index[key]
+
+    #---------------------------------------------------------------------------
+    def _refresh(self) -> None:
+        """Learn the series registered by other workers."""
+        for name, labels, _ in self.segment.records(self._known):
+            self._index[(name, tuple(sorted(labels.items())))] = self._known
+            self._known += 1
+
+    #---------------------------------------------------------------------------
+    def set(self, idx: int, value: float) -> None:
+        """Set this worker's value of a series."""
+        self._values[idx] = value
+        self._times[idx] = time.time()
+
+    #---------------------------------------------------------------------------
+    def close(self) -> None:
+        """Withdraw this worker's values and free its row."""
+        self._stopEvent.set()
+        self._thread.join()
+        with self.segment.lock():
+            self._values[:] = np.nan
+            self.segment.pids[self.worker] = 0
+            self.segment.heartbeats[self.worker] = 0.0
+        del self._values, self._times
+        self.segment.close()
+
+#-------------------------------------------------------------------------------
+def aggregate(
+    segment: SharedSegment, nSeries: int, aggs: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Combine the values of all workers in one vectorized pass.
+
+    Args:
+        segment: Segment to read.
+        nSeries: Number of series to combine.
+        aggs: Index into AGGREGATIONS of each series.
+
+    Returns:
+        values: Combined value of each series.
+        isSet: Whether any worker set each series.
+    """
+
+    values = segment.values[:, :nSeries].copy()
+    times = segment.times[:, :nSeries].copy()
+    isSetBy = ~np.isnan(values)
+    isSet = isSetBy.any(axis=0)
+
+    sums = np.where(isSetBy, values, 0.0).sum(axis=0)
+    maxes = np.where(isSetBy, values, -np.inf).max(axis=0)
+    latest = np.where(isSetBy, times, -np.inf).argmax(axis=0)
+    lasts = values[latest, np.arange(nSeries)]
+
+    combined = np.select([aggs == 0, aggs == 1], [sums, maxes], lasts)
+    return combined, isSet
+
+#-------------------------------------------------------------------------------
+def staleWorkers(segment: SharedSegment, timeout: float) -> np.ndarray:
+    """Rows of workers whose heartbeat is older than timeout seconds.
+
+    Args:
+        segment: Segment to check.
+        timeout: Seconds without a heartbeat after which a worker is gone.
+
+    Returns:
+        rows: Indices of the stale rows.
+    """
+    claimed = segment.pids != 0
+    return np.flatnonzero(
+        claimed & (segment.heartbeats < time.time() - timeout)
+    )
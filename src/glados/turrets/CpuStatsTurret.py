@@ -1,44 +1,100 @@
 #!/usr/bin/env python3
 """
 CPU Stats collector.
-Example of not using 'acquire' and doing everything through 'collect' natively.
+Example of not using 'acquire' and doing everything through 'gather' natively.
 
 Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
 """
 
-from prometheus_client.core import GaugeMetricFamily as GMF
+import glob
+import os.path as op
+import re
+from typing import List, Tuple
 
+from ..metricStore import MetricStore
 from .Turret import Turret
 
+# Only the "processor" and "cpu MHz" lines of /proc/cpuinfo are of interest.
+# Anchoring on a literal newline (rather than ^ with re.MULTILINE) lets the
+# regex engine skip straight to candidate lines.
+_CPUINFO_MHZ = re.compile(
+    r"\nprocessor\s*:\s*(\d+)|\ncpu MHz\s*:\s*([\d.]+)"
+)
+
+#-------------------------------------------------------------------------------
+def parseCpuInfoSpeeds(cpuInfo: str) -> List[Tuple[str, float]]:
+    """Get the speed of each vCPU from /proc/cpuinfo.
+
+    Args:
+        cpuInfo: Contents of /proc/cpuinfo.
+
+    Returns:
+        speeds: List of (vCore, GHz).
+    """
+
+    speeds = []
+    vCore = "-1"
+    for processor, mhz in _CPUINFO_MHZ.findall("\n" + cpuInfo):
+        if processor:
+            vCore = processor
+        else:
+            speeds.append((vCore, float(mhz) / 1000.0))
+
+    return speeds
+
 #-------------------------------------------------------------------------------
 class CpuStatsTurret(Turret):
     """Collect CPU statistics."""
-    #---------------------------------------------------------------------------
-    def __init__(self):
-        """Initialization."""
-        super().__init__()
-        self._fileName = "/proc/cpuinfo"
+    # "cpuinfo" scans /proc/cpuinfo while "cpufreq" reads each vCPU's
+    # scaling_cur_freq from sysfs.
+    source = "cpuinfo"
 
     #---------------------------------------------------------------------------
-    def collect(self):
-        """Run the collector."""
-        self._readFileInfo()
-        vCoreSpeeds = GMF(
+    def __init__(self, root: str = "/"):
+        """Initialization.
+
+        Args:
+            root: Directory under which proc and sys are found.
+        """
+        super().__init__()
+        self.root = root
+        self._fileName = op.join(root, "proc", "cpuinfo")
+        self._freqFiles: List[Tuple[str, str]] = []
+        self.store = MetricStore(
             "vcore_speeds",
             f"Gauge of current vCPU speeds for {self.hostname}",
-            labels=["host", "vcore"],
+            ["host", "vcore"],
         )
-        vCore = -1
-        vCoreGHz = 0.0
-        for line in self._turretFileInfo.splitlines():
-            words = line.split(":")
-            key = words[0].strip()
-            value = words[-1].strip()
-            if key == "processor":
-                vCore = int(value)
-            elif key == "cpu MHz":
-                vCoreGHz = float(value) / 1000.0
-            if ":" not in line:
-                vCoreSpeeds.add_metric([self.hostname, f"{vCore}"], vCoreGHz)
-
-        yield vCoreSpeeds
+
+    #---------------------------------------------------------------------------
+    def _readCpuFreqSpeeds(self) -> List[Tuple[str, float]]:
+        """Get the speed of each vCPU from sysfs. The files are globbed once."""
+        if not self._freqFiles:
+            pattern = op.join(self.root, "sys", "devices", "system", "cpu",
+                              "cpu[0-9]*", "cpufreq", "scaling_cur_freq")
+            for freqFile in glob.glob(pattern):
+                vCore = op.basename(op.dirname(op.dirname(freqFile)))[3:]
+                self._freqFiles.append((vCore, freqFile))
+            self._freqFiles.sort(key=lambda f: int(f[0]))
+
+        speeds = []
+        for vCore, freqFile in self._freqFiles:
+            with open(freqFile, "r", encoding="UTF-8") as finp:
+                speeds.append((vCore, float(finp.read()) / 1.0e6))
+
+        return speeds
+
+    #---------------------------------------------------------------------------
+    def gather(self):
+        """Run the collector."""
+        if self.source == "cpufreq":
+            speeds = self._readCpuFreqSpeeds()
+        else:
+            self._readFileInfo()
+            speeds = parseCpuInfoSpeeds(self._turretFileInfo)
+
+        self.store.begin()
+        for vCore, vCoreGHz in speeds:
+            self.store.set([self.hostname, vCore], vCoreGHz)
+
+        yield self.store.family()
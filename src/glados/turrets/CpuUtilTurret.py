@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+CPU Utilization Turret.
+Per vCPU utilization from the change in /proc/stat between acquisitions.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+import os.path as op
+from typing import Dict, Tuple
+
+from ..metricStore import MetricStore
+from .Turret import Turret
+
+#-------------------------------------------------------------------------------
+def parseProcStat(procStat: str) -> Dict[str, Tuple[int, int]]:
+    """Get busy and total jiffies of each cpu line in /proc/stat.
+
+    Args:
+        procStat: Contents of /proc/stat.
+
+    Returns:
+        jiffies: vCore ("all" for the aggregate line) -> (busy, total). Guest
+            time is already part of user time and so is not counted twice.
+    """
+
+    jiffies = {}
+    for line in procStat.splitlines():
+        if not line.startswith("cpu"):
+            break
+        words = line.split()
+        values = [int(w) for w in words[1:9]]
+        total = sum(values)
+        idle = values[3] + values[4]
+        vCore = words[0][3:] if words[0] != "cpu" else "all"
+        jiffies[vCore] = (total - idle, total)
+
+    return jiffies
+
+#-------------------------------------------------------------------------------
+class CpuUtilTurret(Turret):
+    """Collect vCPU utilization."""
+    #---------------------------------------------------------------------------
+    def __init__(self, root: str = "/"):
+        """Initialization.
+
+        Args:
+            root: Directory under which proc is found.
+        """
+        super().__init__()
+        self._fileName = op.join(root, "proc", "stat")
+        self._lastJiffies: Dict[str, Tuple[int, int]] = {}
+        self.store = MetricStore(
+            "vcore_utilization_pct",
+            f"Utilization of each vCPU for {self.hostname}",
+            ["host", "vcore"],
+        )
+
+    #---------------------------------------------------------------------------
+    def acquire(self):
+        """Acquire the utilization since the previous acquisition (or since boot
+        for the first one).
+        """
+        jiffies = parseProcStat(self._turretFileInfo)
+
+        self.store.begin()
+        for vCore, (busy, total) in jiffies.items():
+            lastBusy, lastTotal = self._lastJiffies.get(vCore, (0, 0))
+            if total > lastTotal:
+                usage = 100.0 * (busy - lastBusy) / (total - lastTotal)
+            else:
+                usage = 0.0
+            self.store.set([self.hostname, vCore], usage)
+
+        self.gauge = self.store.family()
+        self._lastJiffies = jiffies
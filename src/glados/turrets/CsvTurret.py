@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+CsvTurret which serves a table of metrics from a CSV file.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+
+The first row names the columns; label columns are followed (or interleaved)
+by value columns, e.g.:
+    host,mount,size,used
+    node01,/scratch,1.2e12,8.0e11
+Every value column becomes a series per row, labelled by the label columns
+and "metric" (the name of the value column).
+
+Unless labelColumns are given, label columns are those holding anything but
+numbers (or empty fields) in any row. Labels which look like numbers, such as
+node IDs (001), ranks or job IDs, would be served as values instead and must
+be named in labelColumns (e.g. through TurretSettings).
+"""
+
+import csv
+from array import array
+import functools
+import io
+import math
+import os.path as op
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..fileCache import FILE_CACHE
+from ..metricStore import StoreFamily
+from .Turret import Turret
+
+#-------------------------------------------------------------------------------
+def _isNumber(field: str) -> bool:
+    """Whether a CSV field holds a number."""
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+#-------------------------------------------------------------------------------
+def _toFloat(field: str) -> float:
+    """Value of a CSV field, NaN if it is not a number."""
+    return float(field) if _isNumber(field) else math.nan
+
+# Element-wise _toFloat of an array of fields.
+_toFloats = np.frompyfunc(_toFloat, 1, 1)
+
+#-------------------------------------------------------------------------------
+class CsvTable:
+    """Label and value columns of a CSV file."""
+    __slots__ = ("labelNames", "valueNames", "labels", "values")
+
+    #---------------------------------------------------------------------------
+    def __init__(
+        self, labelNames: List[str], valueNames: List[str], labels: np.ndarray,
+        values: np.ndarray
+    ):
+        """Initialization.
+
+        Args:
+            labelNames: Names of the label columns.
+            valueNames: Names of the value columns.
+            labels: Label values, one row per CSV row.
+            values: Values, one row per CSV row.
+        """
+        self.labelNames = labelNames
+        self.valueNames = valueNames
+        self.labels = labels
+        self.values = values
+
+#-------------------------------------------------------------------------------
+def parseCsv(
+    text: str, labelColumns: Optional[Sequence[str]] = None,
+    delimiter: str = ","
+) -> CsvTable:
+    """Parse a CSV table in bulk, a column set at a time.
+
+    Args:
+        text: Contents of the CSV file, with a header row.
+        labelColumns: Names of the label columns (None -> the columns with
+            a field which is not a number in any row).
+        delimiter: Field delimiter.
+
+    Returns:
+        table: Parsed table. Values which are not numbers are NaN.
+    """
+
+    rows = csv.reader(io.StringIO(text), delimiter=delimiter)
+    header = [h.strip() for h in next(rows, [])]
+    firstRow = next(rows, [])
+    if not header:
+        raise ValueError("Missing CSV header.")
+
+    def load(columns: List[int], dtype) -> np.ndarray:
+        """Load some columns of all rows."""
+        if not firstRow:
+            return np.empty((0, len(columns)), dtype)
+        return np.loadtxt(
+            io.StringIO(text), dtype=dtype, delimiter=delimiter, skiprows=1,
+            usecols=columns, ndmin=2, comments=None, quotechar='"'
+        )
+
+    if labelColumns is not None:
+        missing = [c for c in labelColumns if c not in header]
+        if missing:
+            raise ValueError(f"Missing label columns {missing}.")
+        labelIdx = [header.index(c) for c in labelColumns]
+    else:
+        firsts = firstRow + [""] * (len(header) - len(firstRow))
+        labelIdx = [i for i in range(len(header))
+                    if not _isValueColumn(load, i, firsts[i].strip())]
+    valueIdx = [i for i in range(len(header)) if i not in labelIdx]
+    if not valueIdx:
+        raise ValueError("No value columns.")
+
+    try:
+        values = load(valueIdx, np.float64)
+    except ValueError:
+        # Slower, but turns values which are not numbers into NaN.
+        values = _toFloats(load(valueIdx, str)).astype(np.float64)
+    if labelIdx:
+        labels = load(labelIdx, str)
+    else:
+        labels = np.empty((len(values), 0), str)
+
+    return CsvTable(
+        [header[i] for i in labelIdx], [header[i] for i in valueIdx], labels,
+        values
+    )
+
+#-------------------------------------------------------------------------------
+def _isValueColumn(
+    load: Callable[[List[int], type], np.ndarray], idx: int, first: str
+) -> bool:
+    """Whether every field of a column is a number or empty.
+
+    Args:
+        load: Function loading some columns of all rows as a dtype.
+        idx: Index of the column.
+        first: Field of the column in the first row.
+    """
+    if first and not _isNumber(first):
+        return False
+    try:
+        load([idx], np.float64)
+        return True
+    except ValueError:
+        fields = load([idx], str)[:, 0]
+    try:
+        # Empty fields are gaps, not labels.
+        np.where(fields == "", "nan", fields).astype(np.float64)
+        return True
+    except ValueError:
+        return False
+
+#-------------------------------------------------------------------------------
+class CsvTurret(Turret):
+    """Serve a CSV table, only re-parsing it when the file changes. Values
+    are copied out of the parsed columns in bulk; label sets are only rebuilt
+    when the label columns change.
+    """
+    # Names of the label columns (None -> columns which are not all numbers).
+    labelColumns: Optional[List[str]] = None
+    # Name of the gauge (None -> the file name without extension).
+    metricName: Optional[str] = None
+    delimiter = ","
+
+    #---------------------------------------------------------------------------
+    def __init__(self, csvFile: str, hostname=""):
+        """Initialization.
+
+        Args:
+            csvFile: Path to a CSV file of metrics.
+        """
+        super().__init__(csvFile, hostname)
+        self.table: Optional[CsvTable] = None
+        # Label dicts of every series and the table they were built for.
+        self._labelDicts: List[Dict[str, str]] = []
+        self._labelTable: Optional[CsvTable] = None
+
+        self.acquire()
+
+    #---------------------------------------------------------------------------
+    @property
+    def name(self) -> str:
+        """Name of the gauge."""
+        if self.metricName:
+            return self.metricName
+        name = re.sub(r"\W", "_", op.splitext(op.basename(self._fileName))[0])
+        return name if not name[:1].isdigit() else "csv_" + name
+
+    #---------------------------------------------------------------------------
+    def _sameLabels(self, table: CsvTable) -> bool:
+        """Whether the label dicts were built for the labels of table."""
+        old = self._labelTable
+        return (old is not None and old.labelNames == table.labelNames
+                and old.valueNames == table.valueNames
+                and np.array_equal(old.labels, table.labels))
+
+    #---------------------------------------------------------------------------
+    def _setGauge(self, table: CsvTable) -> None:
+        """Build the gauge of a newly parsed table. Series are ordered by
+        value column, then by row.
+        """
+        labelNames = table.labelNames + ["metric"]
+        if not self._sameLabels(table):
+            rows = table.labels.tolist()
+            labelDicts: List[Dict[str, str]] = []
+            for valueName in table.valueNames:
+                labelDicts += map(dict, map(
+                    zip, [labelNames] * len(rows),
+                    (row + [valueName] for row in rows)
+                ))
+            self._labelDicts = labelDicts
+            self._labelTable = table
+
+        values = array("d", table.values.tobytes("F"))
+        self.gauge = StoreFamily(
+            self.name, f"Metrics of {op.basename(self._fileName)}.",
+            labelNames, self._labelDicts, values, None, self.fileTimestamp()
+        )
+
+    #---------------------------------------------------------------------------
+    def acquire(self) -> None:
+        """Parse the file if it has changed and rebuild the gauge."""
+        labelColumns = None
+        if self.labelColumns is not None:
+            labelColumns = tuple(self.labelColumns)
+        table = FILE_CACHE.parse(
+            self._fileName,
+            functools.partial(parseCsv, labelColumns=labelColumns,
+                              delimiter=self.delimiter),
+            tag=f"CsvTurret:{labelColumns}:{self.delimiter}"
+        )
+        if table is self.table and self.gauge.name == self.name:
+            return
+        self._setGauge(table)
+        self.table = table
+
+    #---------------------------------------------------------------------------
+    def gather(self):
+        """Yield the gauge without reading the file beyond acquire."""
+        self.acquire()
+        yield self.gauge
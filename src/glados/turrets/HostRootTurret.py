@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+HostRootTurret which serves the turret files of many hosts from one root.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+
+The root holds a directory per host of turret files, as collected onto shared
+storage from a cluster:
+    <root>/node001/NvidiaGpu.turret
+    <root>/node001/Storage.turret
+    <root>/node002/NvidiaGpu.turret
+Each file is served as getFileTurrets would, with the host named by its
+directory. Hosts and files may come and go.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import os.path as op
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client.metrics_core import Metric
+
+from ..fileCache import FILE_CACHE, FileKey, fileKey
+from . import TURRET_MANIFEST, loadTurretClass
+from .Turret import Turret
+
+# (name, documentation, type, samples) of a family, as sent between processes.
+FamilyRows = Tuple[str, str, str, list]
+# (path, host, turret class name) of a turret file to parse.
+TurretFile = Tuple[str, str, str]
+
+#-------------------------------------------------------------------------------
+def turretClassName(fileName: str) -> Optional[str]:
+    """Name of the turret class serving a turret file, as getFileTurrets
+    matches "<Name>.turret" to the module "<Name>Turret".
+    """
+    moduleName = op.basename(fileName).replace(".turret", "") + "Turret"
+    for className, (module, _) in TURRET_MANIFEST.items():
+        if module == moduleName:
+            return className
+    return None
+
+#-------------------------------------------------------------------------------
+def parseTurretFiles(
+    turretFiles: List[TurretFile]
+) -> List[Tuple[str, Optional[List[FamilyRows]], str]]:
+    """Collect turret files once each. Runs in pool processes.
+
+    Args:
+        turretFiles: Files to collect.
+
+    Returns:
+        results: (path, families or None if it failed, error) of each file.
+    """
+
+    results = []
+    for path, host, className in turretFiles:
+        try:
+            turret = loadTurretClass(className)(path, host)
+            families = [(f.name, f.documentation, f.type, list(f.samples))
+                        for f in turret.gather()]
+            results.append((path, families, ""))
+        except Exception as exc: # pylint: disable=broad-except
+            results.append((path, None, f"{type(exc).__name__}: {exc}"))
+        finally:
+            # Every file is only parsed once per change; do not keep it.
+            FILE_CACHE.forget(path)
+    return results
+
+#-------------------------------------------------------------------------------
+class HostRootTurret(Turret):
+    """Serve every turret file under a root of host directories. Only files
+    which changed since the last acquire are parsed, sharded across a pool of
+    processes when there are many, and families of the same name are merged
+    across hosts.
+    """
+    # Processes parsing changed files (None -> one per CPU).
+    maxProcesses: Optional[int] = None
+    # Changed files below which parsing happens in this process.
+    minPoolFiles = 64
+    # Files handed to a pool process at a time.
+    chunkSize = 32
+
+    #---------------------------------------------------------------------------
+    def __init__(self, root: str, hostname=""):
+        """Initialization.
+
+        Args:
+            root: Directory of host directories of turret files.
+        """
+        super().__init__(root, hostname)
+        # Path -> (file key when parsed, families of the file).
+        self._parsed: Dict[str, Tuple[Optional[FileKey], List[FamilyRows]]] = {}
+        self._families: Tuple = ()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.hosts = 0
+
+        self.acquire()
+
+    #---------------------------------------------------------------------------
+    def scan(self) -> Dict[str, Tuple[str, str]]:
+        """Find the turret files under the root.
+
+        Returns:
+            files: Path -> (host, turret class name).
+        """
+        files = {}
+        hosts = 0
+        with os.scandir(self._fileName) as hostDirs:
+            for hostDir in hostDirs:
+                if hostDir.name.startswith(".") or not hostDir.is_dir():
+                    continue
+                hosts += 1
+                try:
+                    entries = list(os.scandir(hostDir.path))
+                except OSError:
+                    # Removed while scanning.
+                    continue
+                for entry in entries:
+                    if not entry.name.endswith(".turret"):
+                        continue
+                    className = turretClassName(entry.name)
+                    if className is not None:
+                        files[entry.path] = (hostDir.name, className)
+        self.hosts = hosts
+        return files
+
+    #---------------------------------------------------------------------------
+    def _parse(self, turretFiles: List[TurretFile]) -> List:
+        """Parse files here or, if there are many, in the pool."""
+        if len(turretFiles) < self.minPoolFiles:
+            return parseTurretFiles(turretFiles)
+
+        if self._executor is None:
+            # Spawned workers do not inherit the threads of this process.
+            self._executor = ProcessPoolExecutor(
+                self.maxProcesses, multiprocessing.get_context("spawn")
+            )
+        chunks = [turretFiles[i:i + self.chunkSize]
+                  for i in range(0, len(turretFiles), self.chunkSize)]
+        return [r for results in self._executor.map(parseTurretFiles, chunks)
+                for r in results]
+
+    #---------------------------------------------------------------------------
+    def acquire(self) -> None:
+        """Parse new and changed files, drop removed ones and merge."""
+        files = self.scan()
+        changed = len(self._parsed)
+        self._parsed = {p: v for p, v in self._parsed.items() if p in files}
+        changed -= len(self._parsed)
+
+        keys = {}
+        toParse = []
+        for path, (host, className) in files.items():
+            try:
+                keys[path] = fileKey(path)
+            except OSError:
+                continue
+            cached = self._parsed.get(path)
+            if cached is None or cached[0] is None or cached[0] != keys[path]:
+                toParse.append((path, host, className))
+
+        for path, families, error in self._parse(toParse):
+            if families is None:
+                print(f"[W] Unable to parse {path}: {error}")
+                families = []
+            self._parsed[path] = (keys[path], families)
+            changed += 1
+
+        if changed or not self._families:
+            self._families = self._merge()
+
+    #---------------------------------------------------------------------------
+    def _merge(self) -> Tuple:
+        """Merge the families of all files by name."""
+        merged: Dict[str, Metric] = {}
+        for path in sorted(self._parsed):
+            for name, documentation, typ, samples in self._parsed[path][1]:
+                family = merged.get(name)
+                if family is None:
+                    family = merged[name] = Metric(name, documentation, typ)
+                family.samples.extend(samples)
+        return tuple(merged.values())
+
+    #---------------------------------------------------------------------------
+    def gather(self):
+        """Yield the merged families of all hosts."""
+        self.acquire()
+        yield from self._families
+
+    #---------------------------------------------------------------------------
+    def close(self) -> None:
+        """Stop the parsing processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
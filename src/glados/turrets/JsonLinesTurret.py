@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+JsonLinesTurret which tails an append-only JSON lines file.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+
+The file holds one JSON value per line. A metadata object names the gauge:
+    {"name": "govee_sensors", "description": "...", "labels": ["location"]}
+and every other line is a sample, either as in JsonTurret's "metrics":
+    [["room123"], 44.2]
+    [["room123"], 44.2, 1689646260]
+or as an object:
+    {"labels": ["room123"], "value": 44.2, "timestamp": 1689646260}
+with an optional timestamp. The latest value of each label set is kept.
+A metadata object with "metrics" (i.e. a whole JsonTurret document on one
+line) is a snapshot replacing all series.
+"""
+
+import json
+import os
+from typing import Any, BinaryIO, Dict, Optional
+
+from ..metricStore import MetricStore
+from ..selfMetrics import TURRET_STATS
+from ..utils import parseTimestamp
+from .Turret import Turret
+
+#-------------------------------------------------------------------------------
+class JsonLinesTurret(Turret):
+    """Tail a JSON lines file, only parsing lines appended since the last
+    acquire. Truncation restarts reading from the beginning of the file and
+    rotation finishes the old file before following the new one.
+    """
+    # Bytes read at a time so a large backlog does not sit in memory at once.
+    readSize = 1 << 20
+
+    #---------------------------------------------------------------------------
+    def __init__(self, jsonLinesFile: str, hostname=""):
+        """Initialization.
+
+        Args:
+            jsonLinesFile: Path to a json lines file to tail.
+        """
+        super().__init__(jsonLinesFile, hostname)
+        # Latest value of each series; None until a metadata line is read.
+        self.store: Optional[MetricStore] = None
+        self.badLines = 0
+
+        self._file: Optional[BinaryIO] = None
+        self._partial = b""
+        # exportTimestamps the lines read so far were parsed with, as it may
+        # be set by TurretSettings after the first read.
+        self._parsedTimestamps = self.exportTimestamps
+
+        self.acquire()
+
+    #---------------------------------------------------------------------------
+    def _open(self) -> None:
+        """Open the file at its current path."""
+        # pylint: disable-next=consider-using-with
+        self._file = open(self._fileName, "rb")
+        self._partial = b""
+
+    #---------------------------------------------------------------------------
+    def _rotated(self) -> bool:
+        """Whether the path now refers to a different file than the open one."""
+        assert self._file is not None
+        try:
+            stat = os.stat(self._fileName)
+        except FileNotFoundError:
+            # Mid rotation; keep following the old file until a new one exists.
+            return False
+        openStat = os.fstat(self._file.fileno())
+        return (stat.st_ino, stat.st_dev) != (openStat.st_ino, openStat.st_dev)
+
+    #---------------------------------------------------------------------------
+    def _readNew(self) -> None:
+        """Parse complete lines appended to the open file since the last read.
+        A trailing partial line is kept until the rest of it is written.
+        """
+        assert self._file is not None
+        if os.fstat(self._file.fileno()).st_size < self._file.tell():
+            print(f"[W] {self._fileName} was truncated; reading from start.")
+            self._file.seek(0)
+            self._partial = b""
+
+        while True:
+            chunk = self._file.read(self.readSize)
+            if not chunk:
+                break
+            TURRET_STATS.countRead(self._fileName, len(chunk))
+            self._feed(chunk)
+
+    #---------------------------------------------------------------------------
+    def _feed(self, chunk: bytes) -> None:
+        """Parse the complete lines of a chunk, keeping a trailing partial
+        line until the rest of it arrives.
+        """
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            if line.strip():
+                self._parseLine(line)
+
+    #---------------------------------------------------------------------------
+    def _parseLine(self, line: bytes) -> None:
+        """Parse a single metadata or sample line."""
+        try:
+            entry: Any = json.loads(line)
+            if isinstance(entry, dict) and "name" in entry:
+                self._setMetadata(entry)
+                if "metrics" in entry:
+                    self._setSnapshot(entry)
+                return
+            if isinstance(entry, dict):
+                labels, value = entry["labels"], entry["value"]
+                timestamp = entry.get("timestamp")
+            else:
+                labels, value, *rest = entry
+                timestamp = rest[0] if rest else None
+            if self.store is None:
+                raise ValueError("Sample before metadata.")
+            if timestamp is not None and self.exportTimestamps:
+                timestamp = parseTimestamp(timestamp)
+            else:
+                timestamp = None
+            self.store.set([str(l) for l in labels], float(value), timestamp)
+        except (ValueError, KeyError, TypeError):
+            self.badLines += 1
+
+    #---------------------------------------------------------------------------
+    def _setMetadata(self, entry: Dict[str, Any]) -> None:
+        """Name the gauge. Values are dropped if the labels change."""
+        labels = list(entry.get("labels", []))
+        if self.store is None or self.store.labels != labels:
+            self.store = MetricStore(entry["name"], "", labels)
+        self.store.name = entry["name"]
+        self.store.documentation = entry.get("description", "")
+
+    #---------------------------------------------------------------------------
+    def _setSnapshot(self, entry: Dict[str, Any]) -> None:
+        """Replace all series with the "metrics" of a JsonTurret document."""
+        assert self.store is not None
+        timestamp = entry.get("timestamp", entry.get("date"))
+        if timestamp is not None and self.exportTimestamps:
+            self.store.timestamp = parseTimestamp(timestamp)
+        self.store.begin()
+        for labels, value, *rest in entry["metrics"]:
+            sampleTime = None
+            if rest and self.exportTimestamps:
+                sampleTime = parseTimestamp(rest[0])
+            self.store.set([str(l) for l in labels], float(value), sampleTime)
+
+    #---------------------------------------------------------------------------
+    def _rewind(self) -> None:
+        """Drop all series and read the open file again from the start."""
+        assert self._file is not None
+        if self.store is not None:
+            self.store = MetricStore(
+                self.store.name, self.store.documentation, self.store.labels
+            )
+        self._file.seek(0)
+        self._partial = b""
+
+    #---------------------------------------------------------------------------
+    def acquire(self) -> None:
+        """Read any lines appended (or rotated in) since the last acquire.
+        The file is read again if exportTimestamps has changed.
+        """
+        if self._file is None:
+            self._open()
+        elif self._parsedTimestamps != self.exportTimestamps:
+            self._rewind()
+        self._parsedTimestamps = self.exportTimestamps
+        self._readNew()
+
+        if self._rotated():
+            assert self._file is not None
+            self._file.close()
+            if self._partial.strip():
+                self._parseLine(self._partial)
+            self._open()
+            self._readNew()
+
+        if self.store is not None:
+            self.gauge = self.store.family()
+
+    #---------------------------------------------------------------------------
+    def gather(self):
+        """Yield the gauge once the metadata line has been read."""
+        self.acquire()
+        if self.store is not None:
+            yield self.gauge
+
+    #---------------------------------------------------------------------------
+    def close(self) -> None:
+        """Close the tailed file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
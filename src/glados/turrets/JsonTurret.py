@@ -6,12 +6,19 @@ Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
 """
 
 import json
+from typing import Any, Dict, Optional
 
-from .Turret import Turret, TurretGauge
+from ..fileCache import FILE_CACHE
+from ..metricStore import MetricStore
+from ..utils import parseTimestamp
+from .Turret import Turret
 
 #-------------------------------------------------------------------------------
 class JsonTurret(Turret):
-    """Collect CPU statistics."""
+    """Serve the metrics of a JSON file. Samples are at the file's "timestamp"
+    or "date" (or its modification time) unless a metric gives its own as a
+    third element, e.g. [["room123", "temp"], 24.0, 1689646260].
+    """
     #---------------------------------------------------------------------------
     def __init__(self, jsonFile: str, hostname=""):
         """Initialization.
@@ -20,23 +27,64 @@ class JsonTurret(Turret):
             jsonFile: Path to a json file to read for information.
         """
         super().__init__(jsonFile, hostname)
+        self.data: Optional[Dict[str, Any]] = None
+        self.store: Optional[MetricStore] = None
+        # exportTimestamps the gauge was built with, as it may be set by
+        # TurretSettings after the first parse.
+        self._builtTimestamps: Optional[bool] = None
 
         self._parseJson()
 
     #---------------------------------------------------------------------------
     def _parseJson(self) -> None:
-        """Parse the JSON file."""
-        self._readFileInfo()
-        self.data = json.loads(self._turretFileInfo)
-        # TODO: Add timestamp once TurretGauge supports it.
-        self.gauge = TurretGauge(
-            self.data["name"], self.data["description"], self.data["labels"]
-        )
+        """Parse the JSON file and fill the gauge. The file is only re-parsed
+        and the gauge only rebuilt when the file has changed; an unchanged
+        gauge is never mutated so it is safe to keep serving. Series are
+        updated in place unless the name, description or labels change.
+        The gauge is also rebuilt when exportTimestamps changes.
+        """
+        data = FILE_CACHE.parse(self._fileName, json.loads)
+        if data is self.data and self._builtTimestamps == self.exportTimestamps:
+            return
+        self.data = data
+        self._builtTimestamps = self.exportTimestamps
+        store = self.store
+        if (store is None or store.name != data["name"]
+                or store.documentation != data["description"]
+                or store.labels != list(data["labels"])):
+            store = MetricStore(
+                data["name"], data["description"], data["labels"]
+            )
+        store.timestamp = self._dataTimestamp(data)
+        store.begin()
+        for labels, value, *timestamp in data["metrics"]:
+            if timestamp and self.exportTimestamps:
+                store.set(labels, value, parseTimestamp(timestamp[0]))
+            else:
+                store.set(labels, value)
+        self.gauge = store.family()
+        self.store = store
+
+    #---------------------------------------------------------------------------
+    def _dataTimestamp(self, data: Dict[str, Any]) -> Optional[float]:
+        """Time recorded in the file, else its modification time."""
+        if not self.exportTimestamps:
+            return None
+        for key in ("timestamp", "date"):
+            if key in data:
+                try:
+                    return parseTimestamp(data[key])
+                except ValueError:
+                    print(f"[W] Invalid {key} in {self._fileName}.")
+        return self.fileTimestamp()
+
+    #---------------------------------------------------------------------------
+    def gather(self):
+        """Yield the gauge without reading the file beyond _parseJson."""
+        self.acquire()
+        yield self.gauge
 
     #---------------------------------------------------------------------------
     def acquire(self) -> None:
         """Acquire the data. File format / naming convention here."""
         self._parseJson()
-
-        for labels, value in self.data["metrics"]:
-            self.addMetric(labels, value)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+MmapTurret which serves a binary metric file updated in place by a producer.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+import os.path as op
+import struct
+from typing import Optional
+
+from ..metricStore import StoreFamily
+from ..mmapMetrics import MmapMetricReader
+from .Turret import Turret
+
+#-------------------------------------------------------------------------------
+class MmapTurret(Turret):
+    """Serve a file written by MmapMetricWriter. The file stays mapped; each
+    acquire copies its values once, without decoding or parsing anything,
+    and it is only mapped again when the producer replaces it. Nothing is
+    served until the producer has created the file.
+    """
+    #---------------------------------------------------------------------------
+    def __init__(self, metricFile: str, hostname=""):
+        """Initialization.
+
+        Args:
+            metricFile: Path to a binary metric file, which may not exist yet.
+        """
+        # The file only exists once its producer has started.
+        super().__init__(hostname=hostname)
+        self._fileName = op.realpath(metricFile)
+        self._inputFile = True
+        self.reader: Optional[MmapMetricReader] = None
+        # Gauge of the last consistent copy (None -> none made yet).
+        self.gauge: Optional[StoreFamily] = None
+        self._updated: Optional[float] = None
+
+        self.acquire()
+
+    #---------------------------------------------------------------------------
+    def _refresh(self) -> bool:
+        """Map the file if it is not mapped yet or was replaced.
+
+        Returns:
+            replaced: Whether the label table may have changed.
+        """
+        if self.reader is None:
+            self.reader = MmapMetricReader(self._fileName)
+            return True
+        return self.reader.refresh()
+
+    #---------------------------------------------------------------------------
+    def acquire(self) -> None:
+        """Copy the values, keeping the last copy while the file is missing
+        or the writer is busy.
+        """
+        try:
+            replaced = self._refresh()
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, struct.error) as exc:
+            print(f"[W] Unable to map {self._fileName}: {exc}")
+            return
+        reader = self.reader
+        assert reader is not None
+        read = reader.read()
+        if read is None:
+            print(f"[W] Unable to read {self._fileName} consistently.")
+            return
+        values, updated = read
+        if not replaced and self._updated == updated:
+            return
+        self._updated = updated
+        self.gauge = StoreFamily(
+            reader.name, reader.description, reader.labels, reader.labelDicts,
+            values, None, updated if self.exportTimestamps else None
+        )
+
+    #---------------------------------------------------------------------------
+    def gather(self):
+        """Yield the gauge of the last consistent copy, if any."""
+        self.acquire()
+        if self.gauge is not None:
+            yield self.gauge
+
+    #---------------------------------------------------------------------------
+    def close(self) -> None:
+        """Unmap the file."""
+        if self.reader is not None:
+            self.reader.close()
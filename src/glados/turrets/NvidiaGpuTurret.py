@@ -6,13 +6,36 @@ Monitor statistics from GPU using simple 'nvidia-smi'.
 Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
 """
 
-from dataclasses import dataclass
-import math
-from typing import Dict, List
-
-from ..utils import runCommand, strToFloat
+import atexit
+import itertools
+import re
+import subprocess
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..fileCache import FILE_CACHE
+from ..utils import runCommand, runCommandAsync, runInExecutor, strToFloat
+from ..metricStore import MetricStore
+from ..selfMetrics import TURRET_STATS
 from .Turret import Turret
-from .Turret import TurretGauge
+
+#-------------------------------------------------------------------------------
+# Rules between the devices of the nvidia-smi table: the "|===" line under the
+# header and the "+---" line after each device (exactly three columns each).
+_NV_DEVICE_RULE = re.compile(r"\+-+\+-+\+-+\+|\|=+\+=+\+=+\|")
+_NV_VERSIONS = re.compile(
+    r"Driver Version:\s*(\S+)(?:.*CUDA Version:\s*(\S+))?"
+)
+# |  0    1   0   0  |     19MiB / 40192MiB | 42      0 |  3   0    2    0    0 |
+_NV_MIG_ROW = re.compile(
+    r"\|\s*(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*\|\s*(\d+)MiB\s*/\s*(\d+)MiB\s*\|"
+    r"\s*(\d+)"
+)
+# |    0   N/A  N/A      1234      C   /path/to/app1                      30MiB |
+_NV_PROCESS_ROW = re.compile(
+    r"\|\s*(\d+)\s+(\S+)\s+(\S+)\s+(\d+)\s+(\S+)\s+(.*?)\s+(\d+MiB|N/A)\s*\|"
+)
 
 #-------------------------------------------------------------------------------
 def rmStrDups(line: str) -> str:
@@ -25,19 +48,13 @@ def rmStrDups(line: str) -> str:
         outStr: line with contiguous duplicates removed.
     """
 
-    outStr = ""
-    for char in line:
-        if outStr and char == outStr[-1]:
-            continue
-        outStr = outStr + char
-
-    return outStr
+    return "".join(char for char, _ in itertools.groupby(line))
 
 #-------------------------------------------------------------------------------
-@dataclass
 class Device:
-    """Data class for keeping Nvidia device information."""
-    # TODO: Keep track of processes on this device.
+    """Nvidia device information from the nvidia-smi table."""
+    __slots__ = ("id", "fanSpeed", "temp", "perf", "pwr", "pwrMax", "memUse",
+                 "memMax", "usage", "busId")
 
     #---------------------------------------------------------------------------
     def __init__(self, nvSmiChunk: List[str]):
@@ -45,19 +62,29 @@ class Device:
         |   0  NVIDIA GeForce ...  On   | 00000000:2A:00.0 Off |                  N/A |
         |  0%   38C    P8    18W / 220W |     30MiB /  8192MiB |      0%      Default |
         |                               |                      |                  N/A |
+        Each line is split once; unreadable values are nan.
         """
-        self.__sections = [""]
-        keys = ["id", "fanSpeed", "temp", "pwr", "pwrMax", "memUse", "memMax",
-                "usage"]
-        for key in keys:
-            setattr(self, key, math.nan)
-        for key in ["perf", "busId"]:
-            setattr(self, key, "")
-
         assert len(nvSmiChunk) == 4, "[E] len(nvSmiChunk) != 4"
-        self._processLine1(nvSmiChunk[1])
-        self._processLine2(nvSmiChunk[2])
-        # Don't do anything with line 3.
+
+        # Line 1: |   0  NVIDIA GeForce ...  On   | 00000000:2A:00.0 Off | ...
+        cells = nvSmiChunk[1].split("|")
+        self.id = int(cells[1].split(maxsplit=1)[0])
+        self.busId = cells[2].split(maxsplit=1)[0] if cells[2].strip() else ""
+
+        # Line 2: |  0%   38C    P8    18W / 220W |  30MiB /  8192MiB |  0% ...
+        cells = nvSmiChunk[2].split("|")
+        words = cells[1].split() + [""] * 6
+        self.fanSpeed = strToFloat(words[0].rstrip("%"))
+        self.temp = strToFloat(words[1].rstrip("C"))
+        self.perf = words[2]
+        self.pwr = strToFloat(words[3].rstrip("W"))
+        self.pwrMax = strToFloat(words[5].rstrip("W"))
+        words = cells[2].split() + [""] * 3
+        self.memUse = strToFloat(words[0].replace("MiB", ""))
+        self.memMax = strToFloat(words[2].replace("MiB", ""))
+        words = cells[3].split() + [""]
+        self.usage = strToFloat(words[0].rstrip("%"))
+        # Line 3 holds nothing of interest.
 
     #---------------------------------------------------------------------------
     def __str__(self) -> str:
@@ -68,47 +95,89 @@ class Device:
             outStr += f"{key} = {getattr(self, key)}\n"
         return outStr
 
+#-------------------------------------------------------------------------------
+class MigDevice:
+    """A MIG device from the "MIG devices" section of nvidia-smi."""
+    __slots__ = ("gpu", "gi", "ci", "mig", "memUse", "memMax", "sm")
+
     #---------------------------------------------------------------------------
-    def _getValue(self, section: int, word: int, remove="") -> str:
-        """Get a value from a line in nvidia-smi.
+    def __init__(self, match: re.Match):
+        """Initialization from a match of _NV_MIG_ROW."""
+        gpu, gi, ci, mig, memUse, memMax, sm = match.groups()
+        self.gpu = int(gpu)
+        self.gi = gi
+        self.ci = ci
+        self.mig = mig
+        self.memUse = float(memUse)
+        self.memMax = float(memMax)
+        self.sm = float(sm)
 
-        Args:
-            section: The section of a nvidia-smi line gated by '|'.
-            word: The token in that section.
-            rep: What (if anything) to remove in that word.
+#-------------------------------------------------------------------------------
+class GpuProcess:
+    """A process from the "Processes" section of nvidia-smi."""
+    __slots__ = ("gpu", "gi", "ci", "pid", "type", "name", "memUse")
 
-        Returns: The value as a string.
-        """
+    #---------------------------------------------------------------------------
+    def __init__(self, match: re.Match):
+        """Initialization from a match of _NV_PROCESS_ROW."""
+        gpu, gi, ci, pid, procType, name, memUse = match.groups()
+        self.gpu = int(gpu)
+        self.gi = gi
+        self.ci = ci
+        self.pid = pid
+        self.type = procType
+        self.name = name
+        self.memUse = strToFloat(memUse.replace("MiB", ""))
 
-        return self.__sections[section].split()[word].replace(remove, "")
+#-------------------------------------------------------------------------------
+def scanNvSmi(nvSmiLines: List[str]) -> Iterator[Tuple[str, Any]]:
+    """Walk the nvidia-smi table once.
 
-    #---------------------------------------------------------------------------
-    def _processLine1(self, line: str):
-        """Process the 1st line of an nvidia-smi device chunk. Expected format:
-        |   0  NVIDIA GeForce ...  On   | 00000000:2A:00.0 Off |                  N/A |
-        """
-        self.__sections = line.split("|")
-        self.id = int(self._getValue(1, 0))
-        self.busId = self._getValue(2, 0)
+    Args:
+        nvSmiLines: Output of nvidia-smi.
 
-    #---------------------------------------------------------------------------
-    def _processLine2(self, line: str):
-        """Process the 2nd line of an nvidia-smi device chunk. Expected format:
-        |  0%   38C    P8    18W / 220W |     30MiB /  8192MiB |      0%      Default |
-        """
-        self.__sections = line.split("|")
+    Yields:
+        ("device", chunk): 4 line chunk (rule and 3 lines) of each device.
+        ("mig", match): Match of _NV_MIG_ROW for each MIG device.
+        ("process", match): Match of _NV_PROCESS_ROW for each process.
+    """
+
+    section = ""
+    chunk: List[str] = []
+    for line in nvSmiLines:
+        if section == "devices":
+            if _NV_DEVICE_RULE.fullmatch(line.rstrip()):
+                if len(chunk) == 4:
+                    yield "device", chunk
+                chunk = [line]
+                continue
+            if line.startswith("|"):
+                chunk.append(line)
+                continue
+            # The device table ends at the first line outside of it.
+            section = "done"
+        if not line.startswith("|"):
+            continue
+        if section == "mig":
+            match = _NV_MIG_ROW.match(line)
+            if match:
+                yield "mig", match
+        elif section == "processes":
+            match = _NV_PROCESS_ROW.match(line)
+            if match:
+                yield "process", match
+        elif section == "" and line.startswith("|==="):
+            section = "devices"
+            chunk = [line]
+            continue
 
-        # First section.
-        self.fanSpeed = strToFloat(self._getValue(1, 0, "%"))
-        self.temp = strToFloat(self._getValue(1, 1, "C"))
-        self.perf = self._getValue(1, 2)
-        self.pwr = strToFloat(self._getValue(1, 3, "W"))
-        self.pwrMax = strToFloat(self._getValue(1, 5, "W"))
+        if line.startswith("| MIG devices:"):
+            section = "mig"
+        elif line.startswith("| Processes:"):
+            section = "processes"
 
-        # Second section.
-        self.memUse = strToFloat(self._getValue(2, 0, "MiB"))
-        self.memMax = strToFloat(self._getValue(2, 2, "MiB"))
-        self.usage = strToFloat(self._getValue(3, 0, "%"))
+    if section == "devices" and len(chunk) == 4:
+        yield "device", chunk
 
 #-------------------------------------------------------------------------------
 def getNvChunks(nvSmiLines: List[str]) -> List[List[str]]:
@@ -120,37 +189,17 @@ def getNvChunks(nvSmiLines: List[str]) -> List[List[str]]:
     Returns:
         chunks: chunks of 4 line lists, each defining a 'device' in nvidia-smi.
     """
-    # Trim off everything before "|===" where each device information starts.
-    startPos = min(i for i, _line in enumerate(nvSmiLines) if "|===" in _line)
-    nvSmiLines = nvSmiLines[startPos:]
-
-    # Get the indices of all cutoff points between devices.
-    idxs = []
-    for idx, line in enumerate(nvSmiLines):
-        if rmStrDups(line) in ["+-+-+-+", "|=+=+=|"]:
-            idxs.append(idx)
-    idxs.append(len(nvSmiLines))
-
-    # Loop through indices and get device chunks.
-    chunks = []
-    for i in range(len(idxs) - 1):
-        idx1 = idxs[i]
-        idx2 = idxs[i + 1]
-        if idx2 - idx1 != 4:
-            continue
-        chunk = []
-        for line in nvSmiLines[idx1:idx2]:
-            chunk.append(line)
-        chunks.append(chunk)
-
-    return chunks
+    return [chunk for kind, chunk in scanNvSmi(nvSmiLines) if kind == "device"]
 
 #-------------------------------------------------------------------------------
 class NvInfo:
     """Nvidia Information class based on 'nvidia-smi' output."""
+    __slots__ = ("date", "driverVersion", "cudaVersion", "nGpus", "devs",
+                 "migDevices", "processes")
+
     #---------------------------------------------------------------------------
     def __init__(self, nvSmiOut: str):
-        """Initialize NvInfo data from nvidia-smi output.
+        """Initialize NvInfo data from nvidia-smi output in a single pass.
 
         Args:
             nvSmiOut: Output of running `nvidia-smi`.
@@ -158,60 +207,355 @@ class NvInfo:
         self.date = ""
         self.driverVersion = ""
         self.cudaVersion = ""
-        self.nGpus = math.nan
         self.devs: Dict[int, Device] = {}
+        self.migDevices: List[MigDevice] = []
+        self.processes: List[GpuProcess] = []
 
         nvSmiLines = nvSmiOut.splitlines()
-        chunks = getNvChunks(nvSmiLines)
-        for chunk in chunks:
-            dev = Device(chunk)
-            self.devs[dev.id] = dev
+        if nvSmiLines:
+            self.date = nvSmiLines[0].strip()
+        for line in nvSmiLines[1:4]:
+            match = _NV_VERSIONS.search(line)
+            if match:
+                self.driverVersion = match.group(1)
+                self.cudaVersion = match.group(2) or ""
+                break
+
+        for kind, item in scanNvSmi(nvSmiLines):
+            if kind == "device":
+                try:
+                    dev = Device(item)
+                except (IndexError, ValueError):
+                    print("[W] Skipping unreadable nvidia-smi device.")
+                    continue
+                self.devs[dev.id] = dev
+            elif kind == "mig":
+                self.migDevices.append(MigDevice(item))
+            else:
+                self.processes.append(GpuProcess(item))
+        self.nGpus = len(self.devs)
+
+    #---------------------------------------------------------------------------
+    def deviceMetrics(self) -> Dict[int, Dict[str, float]]:
+        """Metrics of each device keyed by device id, then metric name."""
+        return {
+            devId: {
+                "usage_pct": dev.usage,
+                "temperature": dev.temp,
+                "power": dev.pwr,
+                "mem_use_mb": dev.memUse,
+                "mem_max_mb": dev.memMax,
+            } for devId, dev in self.devs.items()
+        }
+
+#-------------------------------------------------------------------------------
+# Fields requested from 'nvidia-smi --query-gpu' and the metric names they are
+# exported as. "index" must come first.
+NV_QUERY_FIELDS = {
+    "index": "",
+    "utilization.gpu": "usage_pct",
+    "temperature.gpu": "temperature",
+    "power.draw": "power",
+    "memory.used": "mem_use_mb",
+    "memory.total": "mem_max_mb",
+    "fan.speed": "fan_pct",
+    "clocks.sm": "sm_clock_mhz",
+    "ecc.errors.uncorrected.volatile.total": "ecc_uncorrected",
+    "clocks_throttle_reasons.active": "throttle_reasons",
+}
 
-        self.date = nvSmiLines.pop(0).strip()
-        self._handleHeader(nvSmiLines.pop(1))
+#-------------------------------------------------------------------------------
+def parseNvQueryLine(line: str) -> Optional[Dict[str, float]]:
+    """Parse one line of 'nvidia-smi --query-gpu=<NV_QUERY_FIELDS> --format=csv,
+    noheader,nounits' output.
+
+    Args:
+        line: A single CSV line, e.g. "0, 5, 38, 18.07, 30, 8192, 0, ...".
+
+    Returns:
+        metrics: Metric name -> value including "index", or None if the line
+            is not a complete record. Unsupported values ("[N/A]") are nan and
+            the throttle reason bitmask is decoded from hex.
+    """
+    words = [w.strip() for w in line.split(",")]
+    if len(words) != len(NV_QUERY_FIELDS) or not words[0].isdigit():
+        return None
+
+    metrics = {"index": float(words[0])}
+    for (field, metric), word in list(zip(NV_QUERY_FIELDS.items(), words))[1:]:
+        if field == "clocks_throttle_reasons.active" and word.startswith("0x"):
+            metrics[metric] = float(int(word, 16))
+        else:
+            metrics[metric] = strToFloat(word)
+
+    return metrics
+
+#-------------------------------------------------------------------------------
+class NvSmiStream:
+    """A long-lived 'nvidia-smi --query-gpu ... -l N' process whose CSV output
+    is parsed by a reader thread as lines arrive. A process which exits is
+    only restarted after a delay, doubling while it keeps exiting.
+    """
+    # Seconds before restarting nvidia-smi, doubling up to maxRestartDelay.
+    restartDelay = 1.0
+    maxRestartDelay = 60.0
+
+    #---------------------------------------------------------------------------
+    def __init__(self, loopSeconds: float = 1, cmd: Optional[List[str]] = None):
+        """Initialization.
+
+        Args:
+            loopSeconds: Seconds between reports from nvidia-smi.
+            cmd: Command to run instead of nvidia-smi (e.g. replaying recorded
+                output in tests).
+        """
+        fields = ",".join(NV_QUERY_FIELDS)
+        self.cmd = cmd if cmd else [
+            "nvidia-smi", f"--query-gpu={fields}",
+            "--format=csv,noheader,nounits", "-l", f"{loopSeconds}"
+        ]
+        self.records: Dict[int, Dict[str, float]] = {}
+        self.lastUpdate = 0.0
+        self.ready = threading.Event()
+        self.restarts = 0
+        self._proc: Optional[subprocess.Popen] = None
+        self._thread: Optional[threading.Thread] = None
+        # Time of the last start and earliest time of the next one.
+        self._started = 0.0
+        self._restartAt = 0.0
+        # Delay before the next restart (None -> restartDelay).
+        self._backoff: Optional[float] = None
+
+    #---------------------------------------------------------------------------
+    @property
+    def alive(self) -> bool:
+        """Whether the nvidia-smi process is still running."""
+        return self._proc is not None and self._proc.poll() is None
 
     #---------------------------------------------------------------------------
-    def _handleHeader(self, hLine: str):
-        """Process the header line."""
-        self.driverVerion = hLine.split("Driver Version:")[0].split()[0].strip()
-        self.cudaVerion = hLine.split("CUDA Version:")[0].split()[0].strip()
+    @property
+    def restartIn(self) -> float:
+        """Seconds until the process may be (re)started."""
+        return max(self._restartAt - time.monotonic(), 0.0)
+
+    #---------------------------------------------------------------------------
+    def start(self) -> None:
+        """Start (or restart) the nvidia-smi process and its reader. Records
+        of an earlier process are dropped.
+        """
+        self.stop()
+        now = time.monotonic()
+        if self._started:
+            self.restarts += 1
+            # A process which ran for a while starts the backoff over.
+            delay = self._backoff or self.restartDelay
+            if now - self._started >= self.maxRestartDelay:
+                delay = self.restartDelay
+            self._backoff = min(delay * 2, self.maxRestartDelay)
+        self._started = now
+        self._restartAt = now + (self._backoff or self.restartDelay)
+        self.records = {}
+        self.lastUpdate = 0.0
+        self.ready.clear()
+        TURRET_STATS.countFork()
+        # pylint: disable=consider-using-with
+        self._proc = subprocess.Popen(
+            self.cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            encoding="UTF-8", bufsize=1
+        )
+        # pylint: enable=consider-using-with
+        self._thread = threading.Thread(
+            target=self._read, args=(self._proc,), daemon=True,
+            name="glados-nvidia-smi"
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    #---------------------------------------------------------------------------
+    def stop(self) -> None:
+        """Terminate the nvidia-smi process."""
+        if self.alive:
+            assert self._proc is not None
+            self._proc.terminate()
+            self._proc.wait()
+        atexit.unregister(self.stop)
+
+    #---------------------------------------------------------------------------
+    def _read(self, proc: subprocess.Popen) -> None:
+        """Parse lines until the process exits."""
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            if proc is not self._proc:
+                # Restarted; leave the records to the new process.
+                break
+            metrics = parseNvQueryLine(line)
+            if metrics is None:
+                continue
+            self.records[int(metrics.pop("index"))] = metrics
+            self.lastUpdate = time.time()
+            self.ready.set()
+        proc.stdout.close()
 
 #-------------------------------------------------------------------------------
 class NvidiaGpuTurret(Turret):
     """NvidiaGpu Usage statistics."""
+    # Seconds between reports of a persistent 'nvidia-smi --query-gpu' process
+    # (0 -> fork nvidia-smi and parse its table on every acquire).
+    streamInterval: float = 0
+    # Command to run in place of the streaming nvidia-smi.
+    streamCommand: Optional[List[str]] = None
+
     #---------------------------------------------------------------------------
     def __init__(self, file="", hostname=""):
         """Initialization."""
         super().__init__(file, hostname)
         self._turretFileInfo = ""
+        self._stream: Optional[NvSmiStream] = None
+        self.store = MetricStore(
+            f"gpu_metrics_{self.hostname}",
+            "Multiple GPU metrics",
+            ["host", "device", "metric"]
+        )
+        self.processStore = MetricStore(
+            f"gpu_processes_{self.hostname}",
+            "GPU memory used by each process in MiB",
+            ["host", "device", "pid", "process"]
+        )
+        self.migStore = MetricStore(
+            f"gpu_mig_{self.hostname}",
+            "MIG device metrics",
+            ["host", "device", "gi", "ci", "mig", "metric"]
+        )
+        # Process and MIG families, only known from the nvidia-smi table.
+        self.tableFamilies: Tuple = ()
+
+    #---------------------------------------------------------------------------
+    def _readNvStream(self) -> Dict[int, Dict[str, float]]:
+        """Read the latest records of the streaming nvidia-smi, (re)starting it
+        if it is not running. Fails, rather than serving the records of a
+        process which exited, until it may be restarted.
+        """
+        if self._stream is None:
+            self._stream = NvSmiStream(self.streamInterval, self.streamCommand)
+        stream = self._stream
+        if not stream.alive:
+            if stream.restartIn:
+                raise RuntimeError(f"nvidia-smi exited; restarting in "
+                                   f"{stream.restartIn:.1f}s.")
+            stream.start()
+
+        waitTime = self.timeout if self.timeout else 3 * self.streamInterval
+        if not stream.ready.wait(waitTime):
+            raise RuntimeError(f"No nvidia-smi records within {waitTime}s.")
+
+        return dict(stream.records)
 
     #---------------------------------------------------------------------------
     def _readNvInfo(self) -> NvInfo:
-        """Read nvidia-smi."""
+        """Read nvidia-smi. Output from a file is only re-parsed when the file
+        has changed.
+        """
         if self._fileName:
-            self._readFileInfo()
-        else:
-            outStr, _errStr, returnCode = runCommand("nvidia-smi")
-            assert returnCode == 0
-            self._turretFileInfo = outStr
+            return FILE_CACHE.parse(self._fileName, NvInfo)
+
+        outStr, _errStr, returnCode = runCommand(
+            "nvidia-smi", timeout=self.timeout
+        )
+        assert returnCode == 0
+        self._turretFileInfo = outStr
 
         return NvInfo(self._turretFileInfo)
 
     #---------------------------------------------------------------------------
-    def acquire(self):
-        """Acquire storage stats and call collector."""
-        nvInfo = self._readNvInfo()
+    async def _readNvInfoAsync(self) -> NvInfo:
+        """Read nvidia-smi without blocking the event loop."""
+        if self._fileName:
+            return FILE_CACHE.parse(self._fileName, NvInfo)
 
-        self.gauge = TurretGauge(
-            f"gpu_metrics_{self.hostname}",
-            "Multiple GPU metrics",
-            ["host", "device", "metric"]
+        outStr, _errStr, returnCode = await runCommandAsync(
+            "nvidia-smi", timeout=self.timeout
         )
+        assert returnCode == 0
+        self._turretFileInfo = outStr
+
+        return NvInfo(self._turretFileInfo)
+
+    #---------------------------------------------------------------------------
+    def _streaming(self) -> bool:
+        """Whether to read from a persistent nvidia-smi process."""
+        return not self._fileName and bool(self.streamInterval)
+
+    #---------------------------------------------------------------------------
+    def acquire(self):
+        """Acquire GPU stats and call collector."""
+        if self._streaming():
+            self._setGauge(self._readNvStream())
+            self.tableFamilies = ()
+        else:
+            nvInfo = self._readNvInfo()
+            self._setGauge(nvInfo.deviceMetrics())
+            self._setTableFamilies(nvInfo)
 
-        for devId, device in nvInfo.devs.items():
+    #---------------------------------------------------------------------------
+    async def acquireAsync(self):
+        """Acquire GPU stats without blocking the event loop."""
+        if self._streaming():
+            self._setGauge(await runInExecutor(self._readNvStream))
+            self.tableFamilies = ()
+        else:
+            nvInfo = await self._readNvInfoAsync()
+            self._setGauge(nvInfo.deviceMetrics())
+            self._setTableFamilies(nvInfo)
+
+    #---------------------------------------------------------------------------
+    def gather(self):
+        """Yield the device gauge, then any process and MIG families."""
+        self.acquire()
+        yield self.gauge
+        yield from self.tableFamilies
+
+    #---------------------------------------------------------------------------
+    async def gatherAsync(self) -> Tuple:
+        """Async counterpart of gather."""
+        await self.acquireAsync()
+        return (self.gauge, *self.tableFamilies)
+
+    #---------------------------------------------------------------------------
+    def _setGauge(self, devMetrics: Dict[int, Dict[str, float]]) -> None:
+        """Fill the gauge from per device metrics."""
+        self.store.begin()
+        for devId, metrics in devMetrics.items():
             devName = f"device_{devId}"
-            self.addMetric([self.hostname, devName, "usage_pct"], device.usage)
-            self.addMetric([self.hostname, devName, "temperature"], device.temp)
-            self.addMetric([self.hostname, devName, "power"], device.pwr)
-            self.addMetric([self.hostname, devName, "mem_use_mb"], device.memUse)
-            self.addMetric([self.hostname, devName, "mem_max_mb"], device.memMax)
+            for metric, value in metrics.items():
+                self.store.set([self.hostname, devName, metric], value)
+
+        self.store.timestamp = self.fileTimestamp()
+        self.gauge = self.store.family()
+
+    #---------------------------------------------------------------------------
+    def _setTableFamilies(self, nvInfo: NvInfo) -> None:
+        """Fill the process and MIG families from the nvidia-smi table. The
+        MIG family is only served on GPUs in MIG mode.
+        """
+        timestamp = self.fileTimestamp()
+        self.processStore.begin()
+        for proc in nvInfo.processes:
+            self.processStore.set(
+                [self.hostname, f"device_{proc.gpu}", proc.pid, proc.name],
+                proc.memUse
+            )
+        self.processStore.timestamp = timestamp
+        families = [self.processStore.family()]
+
+        if nvInfo.migDevices:
+            self.migStore.begin()
+            for mig in nvInfo.migDevices:
+                labels = [self.hostname, f"device_{mig.gpu}", mig.gi, mig.ci,
+                          mig.mig]
+                self.migStore.set(labels + ["mem_use_mb"], mig.memUse)
+                self.migStore.set(labels + ["mem_max_mb"], mig.memMax)
+                self.migStore.set(labels + ["sm_count"], mig.sm)
+            self.migStore.timestamp = timestamp
+            families.append(self.migStore.family())
+
+        self.tableFamilies = tuple(families)
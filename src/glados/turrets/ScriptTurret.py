@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+ScriptTurret which supervises a long-running script emitting JSON lines.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+
+The script is started once and kept running; it prints lines as read by
+JsonLinesTurret, typically a whole JsonTurret document per iteration:
+    while true; do
+        echo '{"name": "room_temp", "labels": ["room"],
+               "metrics": [[["room123"], 21.5]]}'
+        sleep 10
+    done
+(on one line), so that nothing is forked per scrape.
+"""
+
+import atexit
+import os
+import resource
+import signal
+import subprocess
+import time
+from typing import Callable, Optional, Tuple
+
+from ..selfMetrics import TURRET_STATS
+from .JsonLinesTurret import JsonLinesTurret
+
+#-------------------------------------------------------------------------------
+class ScriptTurret(JsonLinesTurret):
+    """Run a script as a child process and parse the JSON lines of its stdout
+    without blocking. At most maxReadBytes are read per acquire; whatever is
+    left fills the pipe and blocks the script until the next one. A script
+    which exits, or exceeds maxCpuPercent, is restarted after a delay which
+    doubles while it keeps failing.
+    """
+    # Address space limit of the script in MiB (None -> unlimited).
+    maxMemoryMB: Optional[float] = None
+    # CPU usage, averaged between acquires, above which the script is killed.
+    maxCpuPercent: Optional[float] = None
+    # Niceness the script runs at.
+    niceness = 10
+    # Seconds before restarting a script, doubling up to maxRestartDelay.
+    restartDelay = 1.0
+    maxRestartDelay = 60.0
+    # Bytes of output parsed per acquire.
+    maxReadBytes = 1 << 20
+    # Seconds a script is given to exit after SIGTERM before SIGKILL.
+    stopTimeout = 2.0
+
+    #---------------------------------------------------------------------------
+    def __init__(self, script: str, hostname=""):
+        """Initialization.
+
+        Args:
+            script: Path to an executable script.
+        """
+        self.restarts = 0
+        self._proc: Optional[subprocess.Popen] = None
+        self._started = 0.0
+        self._restartAt = 0.0
+        # Delay before the next restart (None -> restartDelay).
+        self._backoff: Optional[float] = None
+        # Limits applied to the running script, as (maxMemoryMB, niceness).
+        self._limits: Optional[Tuple] = None
+        # (monotonic time, CPU seconds) of the script at the last acquire.
+        self._cpuSample: Optional[Tuple[float, float]] = None
+        super().__init__(script, hostname)
+        atexit.register(self.close)
+
+    #---------------------------------------------------------------------------
+    @property
+    def pid(self) -> Optional[int]:
+        """Process ID of the running script."""
+        return self._proc.pid if self._proc is not None else None
+
+    #---------------------------------------------------------------------------
+    def _start(self, now: float) -> None:
+        """Start the script with its stdout as a non-blocking pipe, limited
+        before it runs.
+        """
+        TURRET_STATS.countFork()
+        limits = (self.maxMemoryMB, self.niceness)
+        try:
+            # pylint: disable-next=consider-using-with,subprocess-popen-preexec-fn
+            self._proc = subprocess.Popen(
+                [self._fileName], stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE, start_new_session=True,
+                preexec_fn=self._childLimiter(*limits)
+            )
+        except (OSError, subprocess.SubprocessError) as exc:
+            print(f"[W] Unable to start {self._fileName}: {exc}")
+            self._scheduleRestart(now)
+            return
+        assert self._proc.stdout is not None
+        os.set_blocking(self._proc.stdout.fileno(), False)
+        self._started = now
+        self._partial = b""
+        self._limits = limits
+        self._cpuSample = None
+
+    #---------------------------------------------------------------------------
+    @staticmethod
+    def _childLimiter(
+        maxMemoryMB: Optional[float], niceness: int
+    ) -> Callable[[], None]:
+        """Function run in the child before exec which sets its memory limit
+        and niceness.
+
+        Args:
+            maxMemoryMB: Address space limit in MiB (None -> unlimited).
+            niceness: Niceness to run at.
+
+        Returns:
+            limit: Function for Popen's preexec_fn.
+        """
+        def limit() -> None:
+            if maxMemoryMB is not None:
+                nBytes = int(maxMemoryMB * (1 << 20))
+                resource.setrlimit(resource.RLIMIT_AS, (nBytes, nBytes))
+            os.nice(niceness - os.nice(0))
+        return limit
+
+    #---------------------------------------------------------------------------
+    def _applyLimits(self) -> None:
+        """Apply the memory limit and niceness to the running script if they
+        changed since it was started.
+        """
+        assert self._proc is not None
+        limits = (self.maxMemoryMB, self.niceness)
+        if limits == self._limits:
+            return
+        self._limits = limits
+        try:
+            if self.maxMemoryMB is not None:
+                nBytes = int(self.maxMemoryMB * (1 << 20))
+                resource.prlimit(
+                    self._proc.pid, resource.RLIMIT_AS, (nBytes, nBytes)
+                )
+            os.setpriority(os.PRIO_PROCESS, self._proc.pid, self.niceness)
+        except (OSError, ValueError) as exc:
+            print(f"[W] Unable to limit {self._fileName}: {exc}")
+
+    #---------------------------------------------------------------------------
+    def _read(self) -> None:
+        """Parse up to maxReadBytes of the output available now."""
+        assert self._proc is not None and self._proc.stdout is not None
+        fd = self._proc.stdout.fileno()
+        nRead = 0
+        while nRead < self.maxReadBytes:
+            try:
+                chunk = os.read(fd, min(self.readSize, self.maxReadBytes - nRead))
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            nRead += len(chunk)
+            TURRET_STATS.countRead(self._fileName, len(chunk))
+            self._feed(chunk)
+        # A line which never ends would otherwise grow without bound.
+        if len(self._partial) > self.maxReadBytes:
+            self.badLines += 1
+            self._partial = b""
+
+    #---------------------------------------------------------------------------
+    def _cpuSeconds(self) -> float:
+        """User and system CPU seconds used by the script so far."""
+        assert self._proc is not None
+        with open(f"/proc/{self._proc.pid}/stat", encoding="UTF-8") as finp:
+            # Fields after the parenthesized command; utime and stime are the
+            # 14th and 15th fields of the whole line.
+            fields = finp.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    #---------------------------------------------------------------------------
+    def _overCpu(self, now: float) -> bool:
+        """Whether the script used more than maxCpuPercent since the last
+        acquire.
+        """
+        if self.maxCpuPercent is None:
+            return False
+        try:
+            cpu = self._cpuSeconds()
+        except (OSError, IndexError, ValueError):
+            return False
+        previous, self._cpuSample = self._cpuSample, (now, cpu)
+        if previous is None or now <= previous[0]:
+            return False
+        percent = 100.0 * (cpu - previous[1]) / (now - previous[0])
+        if percent <= self.maxCpuPercent:
+            return False
+        print(f"[W] {self._fileName} used {percent:.0f}% CPU "
+              f"(max {self.maxCpuPercent}%); restarting it.")
+        return True
+
+    #---------------------------------------------------------------------------
+    def _scheduleRestart(self, now: float) -> None:
+        """Restart after the current delay, resetting the delay if the script
+        had been running for a while.
+        """
+        delay = self._backoff or self.restartDelay
+        if self._started and now - self._started >= self.maxRestartDelay:
+            delay = self.restartDelay
+        self._restartAt = now + delay
+        self._backoff = min(delay * 2, self.maxRestartDelay)
+        self.restarts += 1
+
+    #---------------------------------------------------------------------------
+    def _stop(self) -> None:
+        """Terminate the script and anything it started, then drop its pipe."""
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        if proc.poll() is None:
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+                proc.wait(self.stopTimeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait()
+            except ProcessLookupError:
+                proc.wait()
+        assert proc.stdout is not None
+        proc.stdout.close()
+
+    #---------------------------------------------------------------------------
+    def acquire(self) -> None:
+        """Parse the output of the script, (re)starting it if it is due."""
+        now = time.monotonic()
+        if self._proc is not None and self._proc.poll() is not None:
+            # Parse what it printed before exiting.
+            self._read()
+            if self._partial.strip():
+                self._parseLine(self._partial)
+            returnCode = self._proc.returncode
+            self._stop()
+            self._scheduleRestart(now)
+            print(f"[W] {self._fileName} exited with code {returnCode}; "
+                  f"restarting in {self._restartAt - now:.3g}s.")
+
+        if self._proc is None and now >= self._restartAt:
+            self._start(now)
+
+        if self._proc is not None:
+            self._applyLimits()
+            self._read()
+            if self._overCpu(now):
+                self._stop()
+                self._scheduleRestart(now)
+
+        if self.store is not None:
+            self.gauge = self.store.family()
+
+    #---------------------------------------------------------------------------
+    def close(self) -> None:
+        """Stop the script."""
+        self._stop()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+SharedMemoryTurret which aggregates the metrics of many worker processes.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+from array import array
+import os
+import struct
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ..metricStore import StoreFamily
+from ..sharedMetrics import (
+    AGGREGATIONS, SharedSegment, aggregate, staleWorkers
+)
+from .Turret import Turret
+
+#-------------------------------------------------------------------------------
+class SharedMemoryTurret(Turret):
+    """Own a shared-memory segment which workers report to through
+    SharedMetricsProducer, and serve one series per registered series with
+    the values of all workers summed, maxed or the latest taken. Rows of
+    workers which exited without closing are freed once their heartbeat
+    stops.
+    """
+    # Size of the segment, fixed when it is created.
+    maxWorkers = 256
+    maxSeries = 4096
+    # Seconds without a heartbeat after which a worker's row is freed.
+    workerTimeout = 30.0
+
+    #---------------------------------------------------------------------------
+    def __init__(self, segmentName: str, hostname=""):
+        """Create the segment, or take over one left by an earlier run.
+
+        Args:
+            segmentName: Name of the segment producers attach to.
+        """
+        super().__init__(hostname=hostname)
+        # Named by its segment, which is not a file.
+        self._fileName = segmentName
+        try:
+            self.segment = SharedSegment.create(
+                segmentName, self.maxWorkers, self.maxSeries
+            )
+        except FileExistsError:
+            self.segment = self._reuseSegment(segmentName)
+        self._nSeries = 0
+        self._aggs = np.zeros(0, np.uint8)
+        self._labelDicts: List[Dict[str, str]] = []
+        # Gauge name -> (label names, series indices).
+        self._groups: Dict[str, Tuple[List[str], np.ndarray]] = {}
+
+        self.acquire()
+
+    #---------------------------------------------------------------------------
+    def _reuseSegment(self, segmentName: str) -> SharedSegment:
+        """Attach to an existing segment so that the producers still writing
+        to it survive a restart, unless it is not a segment of this size, in
+        which case it is replaced.
+
+        Args:
+            segmentName: Name of the existing segment.
+
+        Returns:
+            segment: The attached or new segment.
+        """
+        shm = shared_memory.SharedMemory(segmentName)
+        try:
+            segment = SharedSegment(shm)
+        except (ValueError, TypeError, struct.error):
+            shm.close()
+        else:
+            if (segment.maxWorkers, segment.maxSeries) == \
+                    (self.maxWorkers, self.maxSeries):
+                print(f"[I] Attached to existing shared memory {segmentName}.")
+                return segment
+            segment.close()
+
+        print(f"[W] Replacing incompatible shared memory {segmentName}.")
+        shm.unlink()
+        return SharedSegment.create(
+            segmentName, self.maxWorkers, self.maxSeries
+        )
+
+    #---------------------------------------------------------------------------
+    def _readSeries(self, nSeries: int) -> None:
+        """Learn the series registered since the last acquire."""
+        aggs = list(self._aggs)
+        members: Dict[str, List[int]] = {}
+        for idx, (name, labels, agg) in enumerate(
+            self.segment.records(self._nSeries), self._nSeries
+        ):
+            if idx >= nSeries:
+                break
+            aggs.append(AGGREGATIONS.index(agg))
+            self._labelDicts.append(labels)
+            members.setdefault(name, []).append(idx)
+
+        for name, indices in members.items():
+            labelNames, old = self._groups.get(name, ([], np.zeros(0, int)))
+            for idx in indices:
+                labelNames = labelNames + [l for l in self._labelDicts[idx]
+                                           if l not in labelNames]
+            self._groups[name] = (labelNames, np.append(old, indices))
+        self._aggs = np.array(aggs, np.uint8)
+        self._nSeries = nSeries
+
+    #---------------------------------------------------------------------------
+    def _reap(self) -> None:
+        """Free the rows of workers whose heartbeat stopped."""
+        if not staleWorkers(self.segment, self.workerTimeout).size:
+            return
+        with self.segment.lock():
+            # Checked again: a worker may have beaten in the meantime.
+            for row in staleWorkers(self.segment, self.workerTimeout):
+                self.segment.values[row] = np.nan
+                self.segment.pids[row] = 0
+                self.segment.heartbeats[row] = 0.0
+
+    #---------------------------------------------------------------------------
+    def acquire(self) -> None:
+        """Aggregate the values of all workers."""
+        self._reap()
+        nSeries = self.segment.nSeries
+        if nSeries != self._nSeries:
+            self._readSeries(nSeries)
+        values, isSet = aggregate(self.segment, nSeries, self._aggs)
+
+        families = []
+        for name, (labelNames, indices) in self._groups.items():
+            indices = indices[isSet[indices]]
+            families.append(StoreFamily(
+                name, "", labelNames,
+                [self._labelDicts[i] for i in indices],
+                array("d", values[indices].tobytes())
+            ))
+        self.families = families
+
+    #---------------------------------------------------------------------------
+    def gather(self):
+        """Yield one gauge per registered name."""
+        self.acquire()
+        yield from self.families
+
+    #---------------------------------------------------------------------------
+    def close(self) -> None:
+        """Remove the segment and its lock file."""
+        lockPath = self.segment.lock().path
+        self.segment.shm.unlink()
+        self.segment.close()
+        try:
+            os.remove(lockPath)
+        except FileNotFoundError:
+            pass
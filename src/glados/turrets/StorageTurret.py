@@ -6,19 +6,94 @@ Example of using 'acquire' and allowing Turret to invoke 'collect'.
 Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
 """
 
-from ..utils import runCommand
+import math
+import os
+import os.path as op
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from ..metricStore import MetricStore
+from ..selfMetrics import TURRET_STATS
+from ..utils import runCommand, runCommandAsync, runInExecutor
 from .Turret import Turret
-from .Turret import TurretGauge
+
+#-------------------------------------------------------------------------------
+# Filesystems without user data which 'df' does not report by default.
+PSEUDO_FS_TYPES = [
+    "autofs", "binfmt_misc", "bpf", "cgroup", "cgroup2", "configfs", "debugfs",
+    "devpts", "efivarfs", "fusectl", "hugetlbfs", "mqueue", "nsfs", "proc",
+    "pstore", "rpc_pipefs", "securityfs", "selinuxfs", "sysfs", "tracefs",
+]
+
+# Filesystems whose statvfs may hang and so are queried with a timeout.
+NETWORK_FS_TYPES = {
+    "afs", "ceph", "cifs", "fuse.sshfs", "glusterfs", "gpfs", "lustre",
+    "ncpfs", "nfs", "nfs4", "smb3", "smbfs", "beegfs",
+}
+
+_OCTAL_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+#-------------------------------------------------------------------------------
+def parseMountInfo(mountInfo: str) -> Dict[str, str]:
+    """Parse the contents of /proc/<pid>/mountinfo.
+
+    Args:
+        mountInfo: Contents of a mountinfo file.
+
+    Returns:
+        mounts: Mount point -> filesystem type. Escaped characters in mount
+            points (e.g. '\\040' for spaces) are decoded and the last of any
+            stacked mounts wins.
+    """
+
+    mounts = {}
+    for line in mountInfo.splitlines():
+        words = line.split()
+        if "-" not in words[6:]:
+            continue
+        sep = words.index("-", 6)
+        mnt = _OCTAL_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), words[4])
+        mounts[mnt] = words[sep + 1]
+
+    return mounts
 
 #-------------------------------------------------------------------------------
 class StorageUsageTurret(Turret):
     """Storage Usage statistics."""
+    # "statvfs" reads mountinfo and calls os.statvfs per mount, "df" parses the
+    # output of df and "auto" uses statvfs unless reading from a file.
+    backend = "auto"
+    mountInfoFile = "/proc/self/mountinfo"
+    # Filesystem types to skip, or if includeFsTypes is set, to keep.
+    excludeFsTypes: List[str] = PSEUDO_FS_TYPES
+    includeFsTypes: Optional[List[str]] = None
+    # Seconds to wait on statvfs of a network mount before skipping it.
+    mountTimeout = 1.0
+
     #---------------------------------------------------------------------------
     def __init__(self, file="", hostname=""):
         """Initialization."""
         super().__init__(file, hostname)
         self._turretFileInfo = ""
-        self._readDfInfo()
+        # Mounts whose statvfs is still blocked from a previous acquire.
+        self._hungMounts: Set[str] = set()
+        self._hungLock = threading.Lock()
+        self.store = MetricStore(
+            "storage_usage", "Mount usage pct.", ["host", "mnt", "metric"]
+        )
+        if self._backend() == "df":
+            self._readDfInfo()
+
+    #---------------------------------------------------------------------------
+    def _backend(self) -> str:
+        """Resolve which backend to use."""
+        if self.backend != "auto":
+            return self.backend
+        if self._fileName or not op.exists(self.mountInfoFile):
+            return "df"
+        return "statvfs"
 
     #---------------------------------------------------------------------------
     def _readDfInfo(self) -> None:
@@ -26,27 +101,147 @@ class StorageUsageTurret(Turret):
         if self._fileName:
             self._readFileInfo()
         else:
-            outStr, _errStr, returnCode = runCommand("df")
+            outStr, _errStr, returnCode = runCommand(
+                "df", timeout=self.timeout
+            )
+            assert returnCode == 0
+            self._turretFileInfo = outStr
+
+    #---------------------------------------------------------------------------
+    async def _readDfInfoAsync(self) -> None:
+        """Read df without blocking the event loop."""
+        if self._fileName:
+            self._readFileInfo()
+        else:
+            outStr, _errStr, returnCode = await runCommandAsync(
+                "df", timeout=self.timeout
+            )
             assert returnCode == 0
             self._turretFileInfo = outStr
 
     #---------------------------------------------------------------------------
     def acquire(self):
         """Acquire storage stats and call collector."""
+        if self._backend() == "statvfs":
+            self._readStatVfs()
+            return
         self._readDfInfo()
+        self._parseDfInfo()
 
-        self.gauge = TurretGauge(
-            "storage_usage", "Mount usage pct.", ["host", "mnt", "metric"]
-        )
+    #---------------------------------------------------------------------------
+    async def acquireAsync(self):
+        """Acquire storage stats without blocking the event loop."""
+        if self._backend() == "statvfs":
+            await runInExecutor(TURRET_STATS.profiled(self._readStatVfs))
+            return
+        await self._readDfInfoAsync()
+        self._parseDfInfo()
+
+    #---------------------------------------------------------------------------
+    def _parseDfInfo(self) -> None:
+        """Parse the output of df into the gauge."""
+        self.store.begin()
 
         mnt = ""
         usePct = 0.0
         for line in self._turretFileInfo.splitlines()[1:]:
-            words = line.split()
+            words = line.split(maxsplit=5)
 
             _fs, _sizeStr, _useStr, availStr, usePctStr, mnt = words
             usePct = float(usePctStr.replace("%", ""))
-            self.gauge.add_metric([self.hostname, mnt, "usePct"], usePct)
+            self.store.set([self.hostname, mnt, "usePct"], usePct)
 
             availGB = float(availStr) / (1024.0 * 1024.0)
-            self.gauge.add_metric([self.hostname, mnt, "availGB"], availGB)
+            self.store.set([self.hostname, mnt, "availGB"], availGB)
+
+        self.store.timestamp = self.fileTimestamp()
+        self.gauge = self.store.family()
+
+    #---------------------------------------------------------------------------
+    def _wantFsType(self, fsType: str) -> bool:
+        """Whether a filesystem type passes the include / exclude filters."""
+        if self.includeFsTypes is not None:
+            return fsType in self.includeFsTypes
+        return fsType not in self.excludeFsTypes
+
+    #---------------------------------------------------------------------------
+    def _statNetworkMounts(
+        self, mnts: List[str]
+    ) -> Dict[str, Optional[os.statvfs_result]]:
+        """Call statvfs on network mounts all at once, each in its own daemon
+        thread, and wait up to mountTimeout in total. A mount which does not
+        answer keeps its thread and is skipped until that call returns.
+
+        Args:
+            mnts: Network mount points.
+
+        Returns:
+            stats: Mount point -> statvfs (None -> failed or timed out).
+        """
+        results: Dict[str, Optional[os.statvfs_result]] = {}
+        done: Dict[str, threading.Event] = {}
+
+        def statVfs(mnt: str, event: threading.Event) -> None:
+            try:
+                results[mnt] = os.statvfs(mnt)
+            except OSError:
+                results[mnt] = None
+            with self._hungLock:
+                event.set()
+                self._hungMounts.discard(mnt)
+
+        for mnt in mnts:
+            with self._hungLock:
+                if mnt in self._hungMounts:
+                    continue
+            done[mnt] = threading.Event()
+            threading.Thread(
+                target=statVfs, args=(mnt, done[mnt]), daemon=True,
+                name="glados-statvfs"
+            ).start()
+
+        deadline = time.monotonic() + self.mountTimeout
+        for mnt, event in done.items():
+            event.wait(max(deadline - time.monotonic(), 0.0))
+            with self._hungLock:
+                if not event.is_set():
+                    print(f"[W] statvfs of '{mnt}' timed out; skipping it.")
+                    self._hungMounts.add(mnt)
+        return {mnt: results.get(mnt) for mnt in done}
+
+    #---------------------------------------------------------------------------
+    def _readStatVfs(self) -> None:
+        """Fill the gauge from mountinfo and statvfs of each mount."""
+        with open(self.mountInfoFile, "r", encoding="UTF-8") as finp:
+            mounts = parseMountInfo(finp.read())
+
+        mounts = {m: t for m, t in mounts.items() if self._wantFsType(t)}
+        networkStats = self._statNetworkMounts(
+            [m for m, t in mounts.items() if t in NETWORK_FS_TYPES]
+        )
+
+        self.store.begin()
+        for mnt, fsType in mounts.items():
+            if fsType in NETWORK_FS_TYPES:
+                stat = networkStats.get(mnt)
+            else:
+                try:
+                    stat = os.statvfs(mnt)
+                except OSError:
+                    continue
+            # Like df, skip filesystems without any blocks.
+            if stat is None or not stat.f_blocks:
+                continue
+
+            used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+            avail = stat.f_bavail * stat.f_frsize
+            # df rounds the percentage up.
+            usePct = 0.0
+            if used:
+                usePct = float(math.ceil(100.0 * used / (used + avail)))
+            self.store.set([self.hostname, mnt, "usePct"], usePct)
+
+            availGB = avail / (1024.0 * 1024.0 * 1024.0)
+            self.store.set([self.hostname, mnt, "availGB"], availGB)
+
+        self.gauge = self.store.family()
@@ -5,30 +5,64 @@ CPU Stats Turret.
 Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
 """
 
+import os
 import os.path as op
+import time
 from typing import Dict, Optional, List, Tuple
 
 from prometheus_client.registry import Collector
 from prometheus_client.core import GaugeMetricFamily
 
+from ..fileCache import FILE_CACHE
+from ..selfMetrics import TURRET_STATS
+from ..utils import runInExecutor
 from . import hostname as hostnameActual
 
 #-------------------------------------------------------------------------------
 class TurretGauge(GaugeMetricFamily):
     """Basic Gauge."""
     #---------------------------------------------------------------------------
-    # TODO: Add timestamp.
     def __init__(
-        self, name="", documentation="", labels: Optional[List] = None
+        self, name="", documentation="", labels: Optional[List] = None,
+        timestamp: Optional[float] = None
     ):
-        """Initialization."""
+        """Initialization.
+
+        Args:
+            timestamp: Default time (seconds since epoch) of the samples added
+                (None -> the time of the scrape).
+        """
         if not isinstance(labels, List):
             labels = [""]
         super().__init__(name, documentation, labels=labels)
+        self.timestamp = timestamp
+
+    #---------------------------------------------------------------------------
+    def add_metric(self, labels, value, timestamp=None):
+        """Add a sample, at the gauge's timestamp unless one is given."""
+        if timestamp is None:
+            timestamp = self.timestamp
+        super().add_metric(labels, value, timestamp)
 
 #-------------------------------------------------------------------------------
 class Turret(Collector):
     """Basic turret."""
+    # Collection budgets in seconds, overridable per turret from the config.
+    # interval: Time between acquisitions (None -> global sleepTime).
+    # timeout: Time allowed for any command run by acquire (None -> no limit).
+    # maxStaleness: Age after which a snapshot is dropped (None -> 3*interval).
+    interval: Optional[float] = None
+    timeout: Optional[float] = None
+    maxStaleness: Optional[float] = None
+    # Relative cost of an acquisition ("low", "medium" or "high"), cached with
+    # plugin metadata so it is known without importing the plugin.
+    cost = "low"
+    # Whether samples carry the time recorded by their source (e.g. a date in a
+    # JsonTurret file or the modification time of a turret file). Off unless
+    # set through TurretSettings: Prometheus rejects samples older than its
+    # head block and does not mark explicitly timestamped series stale.
+    exportTimestamps = False
+
     #---------------------------------------------------------------------------
     def __init__(self, file: str = "", hostname: str = ""):
         """Initialization."""
@@ -36,18 +70,44 @@ class Turret(Collector):
         self.metrics: Dict[str, List[Tuple[List[str], float]]] = {}
         self.hostname = hostname if hostname else hostnameActual
 
-        # TODO: Add getter / setter method around this self._fileName.
+        # Set by a scheduler which owns acquisition; collect() then only serves
+        # the latest published snapshot of (timestamp, metric families).
+        self.scheduled = False
+        self._snapshot: Tuple[float, Tuple] = (0.0, ())
+
         self._fileName = op.realpath(file) if op.exists(file) else file
+        # Whether the input file was given rather than a system file like
+        # /proc/stat whose modification time is meaningless.
+        self._inputFile = bool(file)
         self._turretFileInfo = ""
 
         if self._fileName and not op.exists(self._fileName):
             raise FileNotFoundError(self._fileName)
 
+    #---------------------------------------------------------------------------
+    @property
+    def fileName(self) -> str:
+        """Path of the file this turret reads, if any."""
+        return self._fileName
+
     #---------------------------------------------------------------------------
     def _readFileInfo(self):
-        """If the Turret was given a file to read then process the file."""
-        with open(self._fileName, "r", encoding="UTF-8") as finp:
-            self._turretFileInfo = finp.read()
+        """If the Turret was given a file to read then process the file. The
+        contents are only re-read when the file has changed.
+        """
+        self._turretFileInfo = FILE_CACHE.read(self._fileName)
+
+    #---------------------------------------------------------------------------
+    def fileTimestamp(self) -> Optional[float]:
+        """Modification time of the input file, if any and timestamps are
+        exported.
+        """
+        if not self._inputFile or not self.exportTimestamps:
+            return None
+        try:
+            return os.stat(self._fileName).st_mtime
+        except OSError:
+            return None
 
     #---------------------------------------------------------------------------
     def addMetric(self, labels: List[str], value: float) -> None:
@@ -66,9 +126,16 @@ class Turret(Collector):
         raise NotImplementedError
 
     #---------------------------------------------------------------------------
-    def collect(self):
-        """Basic Collector.collect method. Calls acquire to get gauges and
-        metrics, then creates and yields each gauge.
+    async def acquireAsync(self):
+        """Async counterpart of acquire. Turrets which wait on subprocesses
+        should override this; the default runs acquire in an executor.
+        """
+        await runInExecutor(TURRET_STATS.profiled(self.acquire))
+
+    #---------------------------------------------------------------------------
+    def gather(self):
+        """Read any input file, call acquire and yield the resulting gauge.
+        Turrets which do not use acquire may override this directly.
         """
         if self._fileName:
             self._readFileInfo()
@@ -76,3 +143,81 @@ class Turret(Collector):
         self.acquire()
 
         yield self.gauge
+
+    #---------------------------------------------------------------------------
+    async def gatherAsync(self) -> Tuple:
+        """Async counterpart of gather. Turrets which override acquireAsync
+        are awaited natively while all others run gather in an executor.
+
+        Returns:
+            families: Tuple of metric families.
+        """
+        if type(self).acquireAsync is Turret.acquireAsync:
+            return await runInExecutor(
+                TURRET_STATS.profiled(lambda: tuple(self.gather()))
+            )
+
+        await self.acquireAsync()
+        return (self.gauge,)
+
+    #---------------------------------------------------------------------------
+    def gatherAll(self) -> Tuple:
+        """Gather all metric families, recording the collection in
+        TURRET_STATS.
+
+        Returns:
+            families: Tuple of metric families.
+        """
+        return TURRET_STATS.measure(self, lambda: tuple(self.gather()))
+
+    #---------------------------------------------------------------------------
+    async def gatherAllAsync(self) -> Tuple:
+        """Async counterpart of gatherAll."""
+        return await TURRET_STATS.measureAsync(self, self.gatherAsync)
+
+    #---------------------------------------------------------------------------
+    def refresh(self) -> None:
+        """Gather all metric families and publish them as the new snapshot."""
+        self.publish(self.gatherAll())
+
+    #---------------------------------------------------------------------------
+    def publish(self, families: Tuple) -> None:
+        """Atomically replace the snapshot served by collect.
+
+        Args:
+            families: Tuple of metric families which must not be mutated after
+                being published.
+        """
+        self._snapshot = (time.time(), families)
+
+    #---------------------------------------------------------------------------
+    @property
+    def snapshotTime(self) -> float:
+        """Time at which the current snapshot was published (0 if never)."""
+        return self._snapshot[0]
+
+    #---------------------------------------------------------------------------
+    def isStale(self, now: Optional[float] = None) -> bool:
+        """Whether the current snapshot is older than maxStaleness.
+
+        Args:
+            now: Time to compare against (None -> time.time()).
+        """
+        if self.maxStaleness is None:
+            return False
+        now = time.time() if now is None else now
+        return now - self.snapshotTime > self.maxStaleness
+
+    #---------------------------------------------------------------------------
+    def collect(self):
+        """Basic Collector.collect method. When scheduled, yield the latest
+        published snapshot unless it is stale. Otherwise gather the metric
+        families inline.
+        """
+        if not self.scheduled:
+            yield from self.gatherAll()
+            return
+
+        if self.isStale():
+            return
+        yield from self._snapshot[1]
@@ -5,6 +5,46 @@ Initializaton for turrets module.
 Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
 """
 
+from importlib import import_module
 import socket
+from typing import Dict, Tuple
 
 hostname = socket.gethostname()
+
+# Turret class name -> (module, whether it runs by default without any input
+# file). Turret modules are only imported once a turret is used so that startup
+# does not pay for modules (and their dependencies) which are never enabled.
+TURRET_MANIFEST: Dict[str, Tuple[str, bool]] = {
+    "CpuStatsTurret": ("CpuStatsTurret", True),
+    "CpuUtilTurret": ("CpuUtilTurret", True),
+    "StorageUsageTurret": ("StorageTurret", True),
+    "NvidiaGpuTurret": ("NvidiaGpuTurret", True),
+    "JsonTurret": ("JsonTurret", False),
+    "JsonLinesTurret": ("JsonLinesTurret", False),
+    "ScriptTurret": ("ScriptTurret", False),
+    "CsvTurret": ("CsvTurret", False),
+    "MmapTurret": ("MmapTurret", False),
+    "SharedMemoryTurret": ("SharedMemoryTurret", False),
+    "HostRootTurret": ("HostRootTurret", False),
+}
+
+#-------------------------------------------------------------------------------
+def loadTurretClass(turretName: str) -> type:
+    """Import the module of a turret and return its class.
+
+    Args:
+        turretName: Name of a turret in TURRET_MANIFEST.
+
+    Returns:
+        turretClass: The turret class.
+    """
+
+    moduleName, _ = TURRET_MANIFEST[turretName]
+    return getattr(import_module(f"{__name__}.{moduleName}"), turretName)
+
+#-------------------------------------------------------------------------------
+def __getattr__(name: str):
+    """Import turret modules on first access (e.g. 'turrets.JsonTurret')."""
+    if name in {m for m, _ in TURRET_MANIFEST.values()} | {"Turret"}:
+        return import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -6,6 +6,10 @@ Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
 """
 
 import argparse
+import asyncio
+from asyncio.subprocess import Process as AsyncProcess
+import contextvars
+from datetime import datetime, timezone
 import json
 import math
 from os.path import exists as ope
@@ -13,9 +17,10 @@ import shlex
 import subprocess
 import sys
 
-from typing import Tuple, Dict
+from typing import Any, Callable, Tuple, Dict, Optional
 
 from . import __version__
+from .selfMetrics import TURRET_STATS
 
 #-------------------------------------------------------------------------------
 def getParamsFromConfig(configFile: str = "") -> Dict:
@@ -32,6 +37,25 @@ def getParamsFromConfig(configFile: str = "") -> Dict:
         "sleepTime": 5,
         "FileTurrets": [],
         "JsonTurrets": [],
+        "JsonTurretDirs": [],
+        "JsonLinesTurrets": [],
+        "ScriptDirs": [],
+        "CsvTurrets": [],
+        "MmapTurrets": [],
+        "SharedMemorySegments": [],
+        "HostRoots": [],
+        "Plugins": [],
+        "PluginDirs": [],
+        "PluginCache": "",
+        "BackfillDir": "",
+        "BackfillGap": 60,
+        "BackfillRenders": 720,
+        "Push": {},
+        "ProfileDir": "",
+        "ProfileSeconds": 30,
+        "TurretSettings": {},
+        "maxWorkers": 0,
+        "runtime": "threads",
     }
 
     if isinstance(configFile, str) and ope(configFile):
@@ -64,6 +88,39 @@ def strToFloat(floatStr: str) -> float:
         floatVal = math.nan
     return floatVal
 
+#-------------------------------------------------------------------------------
+def parseTimestamp(value: Any) -> float:
+    """Convert a timestamp to seconds since the epoch.
+
+    Args:
+        value: Seconds since the epoch as a number or string, or an ISO 8601
+            date such as "2023-07-18 02:11:00 UTC" (naive dates are UTC).
+
+    Returns:
+        timestamp: Seconds since the epoch.
+
+    Raises:
+        ValueError: If value is not a timestamp.
+    """
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid timestamp '{value}'.")
+
+    text = value.strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    for suffix in (" UTC", "Z"):
+        if text.endswith(suffix):
+            text = text[:-len(suffix)] + "+00:00"
+    date = datetime.fromisoformat(text)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
 #-------------------------------------------------------------------------------
 def getArgs(argv=None):
     """Get arguments."""
@@ -89,13 +146,47 @@ def getArgs(argv=None):
         "-v", "--version", action='version', version=f"turret {__version__}"
     )
 
+    # 'bench'
+    # - Benchmark turret parsing and scraping on synthetic input.
+    benchP = subparser.add_parser(
+        "bench", help="Benchmark turret parsing and scrape latency."
+    )
+    benchP.add_argument(
+        "-o", "--output", type=str, default="",
+        help="File to save the results to as JSON."
+    )
+    benchP.add_argument(
+        "-c", "--compare", type=str, default="",
+        help="Results of an earlier run to compare against."
+    )
+    benchP.add_argument(
+        "-t", "--threshold", type=float, default=0.2,
+        help="Fractional slowdown counted as a regression (default 0.2)."
+    )
+    benchP.add_argument(
+        "-k", "--filter", type=str, default="",
+        help="Only run cases whose name contains this, e.g. 'nvidia'."
+    )
+    benchP.add_argument(
+        "-r", "--repeat", type=int, default=5,
+        help="Timed repetitions per measurement."
+    )
+    benchP.add_argument(
+        "-l", "--label", type=str, default="",
+        help="Name saved with the results, e.g. a commit hash."
+    )
+    benchP.add_argument(
+        "--quick", action="store_true", help="Only run the smaller cases."
+    )
+
     args = parser.parse_args(argv[1:])
 
     return args
 
 #-------------------------------------------------------------------------------
 def runCommand(
-    cmdStr: str, shell=False, stdout=None, stderr=None
+    cmdStr: str, shell=False, stdout=None, stderr=None,
+    timeout: Optional[float] = None
 ) -> Tuple[str, str, int]:
     """Run a shell command from Python.
 
@@ -104,6 +195,7 @@ def runCommand(
         shell: Whether or not to run with shell as True or False.
         stdout: How to direct stdout (None -> subprocess.PIPE).
         stderr: How to direct stderr (None -> subprocess.PIPE).
+        timeout: Seconds after which the command is killed (None -> no limit).
 
     Returns:
         outStr: Results of stdout.
@@ -120,18 +212,101 @@ def runCommand(
 
     cmd = cmdStr if shell else shlex.split(cmdStr)
 
+    TURRET_STATS.countFork()
     try:
         proc = subprocess.run(
-            cmd, stdout=stdout, stderr=stderr, shell=shell, check=False
+            cmd, stdout=stdout, stderr=stderr, shell=shell, check=False,
+            timeout=timeout
         )
     except FileNotFoundError:
         stdout = ""
         stderr = f"Command {cmd[0]} not found"
         returnCode = 127
         return stdout, stderr, returnCode
+    except subprocess.TimeoutExpired:
+        stdout = ""
+        stderr = f"Command {cmdStr} timed out after {timeout}s"
+        returnCode = 124
+        return stdout, stderr, returnCode
 
     outStr = proc.stdout.decode("utf-8") if proc.stdout else ""
     errStr = proc.stderr.decode("utf-8") if proc.stderr else ""
     returnCode = proc.returncode
 
     return outStr, errStr, returnCode
+
+#-------------------------------------------------------------------------------
+async def runCommandAsync(
+    cmdStr: str, timeout: Optional[float] = None
+) -> Tuple[str, str, int]:
+    """Run a command without blocking the event loop. Never uses a shell.
+
+    Args:
+        cmdStr: Command to run.
+        timeout: Seconds after which the command is killed (None -> no limit).
+
+    Returns:
+        outStr: Results of stdout.
+        errStr: Results of stderr.
+        returnCode: Return code of the command.
+    """
+
+    assert isinstance(cmdStr, str)
+
+    cmd = shlex.split(cmdStr)
+
+    TURRET_STATS.countFork()
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError:
+        return "", f"Command {cmd[0]} not found", 127
+
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        await _killProcess(proc)
+        return "", f"Command {cmdStr} timed out after {timeout}s", 124
+    except BaseException:
+        # Cancelled by the caller (e.g. the scheduler's own timeout).
+        await _killProcess(proc)
+        raise
+
+    outStr = stdout.decode("utf-8") if stdout else ""
+    errStr = stderr.decode("utf-8") if stderr else ""
+
+    return outStr, errStr, proc.returncode
+
+#-------------------------------------------------------------------------------
+async def _killProcess(proc: AsyncProcess) -> None:
+    """Kill a command which is still running and reap it."""
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+    await asyncio.shield(proc.wait())
+
+#-------------------------------------------------------------------------------
+async def runInExecutor(func: Callable[[], Any]) -> Any:
+    """Run a blocking function in the default executor of the running loop.
+    A worker thread cannot be stopped, so when cancelled this only returns
+    once the function has finished; callers can tell a refresh is still in
+    flight from the task not being done.
+
+    Args:
+        func: Function to call without arguments.
+
+    Returns:
+        result: Return value of func.
+    """
+
+    future = asyncio.get_running_loop().run_in_executor(
+        None, contextvars.copy_context().run, func
+    )
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait({future})
+        raise
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Watch directories for JSON files and deploy a JsonTurret for each.
+
+Copyright © 2023, J. Robert Michael, PhD. All rights reserved.
+"""
+
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import os.path as op
+import select
+import struct
+import threading
+from typing import Dict, List, Optional
+
+from prometheus_client.registry import CollectorRegistry
+
+from .fileCache import FILE_CACHE, FileKey, fileKey
+from .selfMetrics import TURRET_STATS
+from .turrets.JsonTurret import JsonTurret
+
+# Flags and event masks from <sys/inotify.h>.
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+_EVENT = struct.Struct("iIII")
+
+#-------------------------------------------------------------------------------
+class Inotify:
+    """Minimal inotify wrapper reporting (directory, name, mask) events."""
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        """Initialization. Raises OSError if inotify is unavailable."""
+        libcName = ctypes.util.find_library("c")
+        if not libcName:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libcName, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify not supported")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[int, str] = {}
+
+    #---------------------------------------------------------------------------
+    def addWatch(self, directory: str, mask: int) -> None:
+        """Watch a directory.
+
+        Args:
+            directory: Directory to watch.
+            mask: Events to report.
+        """
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), ctypes.c_uint32(mask)
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+        self._dirs[wd] = directory
+
+    #---------------------------------------------------------------------------
+    def read(self, timeout: float) -> List:
+        """Wait for events.
+
+        Args:
+            timeout: Seconds to wait for events.
+
+        Returns:
+            events: List of (directory, name, mask).
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            buf = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+
+        events = []
+        pos = 0
+        while pos < len(buf):
+            wd, mask, _cookie, length = _EVENT.unpack_from(buf, pos)
+            pos += _EVENT.size
+            name = os.fsdecode(buf[pos:pos + length].rstrip(b"\0"))
+            pos += length
+            events.append((self._dirs.get(wd, ""), name, mask))
+
+        return events
+
+    #---------------------------------------------------------------------------
+    def close(self) -> None:
+        """Close the inotify file descriptor."""
+        os.close(self.fd)
+
+#-------------------------------------------------------------------------------
+class JsonTurretWatcher:
+    """Create, refresh and retire JsonTurrets as JSON files appear, change or
+    disappear in a set of directories. Files are only parsed when they change
+    and the turrets are owned by the watcher rather than a scheduler.
+    """
+    #---------------------------------------------------------------------------
+    def __init__(
+        self, dirs: List[str], registry: CollectorRegistry,
+        pattern: str = "*.json", pollInterval: float = 5.0,
+        usePoll: bool = False
+    ):
+        """Initialization.
+
+        Args:
+            dirs: Directories to watch.
+            registry: Registry to (un)register turrets with.
+            pattern: Glob pattern of file names to deploy turrets for.
+            pollInterval: Seconds between scans when polling.
+            usePoll: Poll even if inotify is available.
+        """
+        self.dirs = [op.realpath(d) for d in dirs]
+        self.registry = registry
+        self.pattern = pattern
+        self.pollInterval = pollInterval
+        self.turrets: Dict[str, JsonTurret] = {}
+        self._keys: Dict[str, Optional[FileKey]] = {}
+        self._inotify: Optional[Inotify] = None
+        self._stopEvent = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if not usePoll:
+            try:
+                self._inotify = Inotify()
+                mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+                for directory in self.dirs:
+                    self._inotify.addWatch(directory, mask)
+            except OSError as exc:
+                print(f"[W] inotify unavailable ({exc}); polling instead.")
+                if self._inotify:
+                    self._inotify.close()
+                self._inotify = None
+
+    #---------------------------------------------------------------------------
+    def start(self) -> None:
+        """Deploy turrets for existing files and start watching."""
+        self._stopEvent.clear()
+        self.scan()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="glados-watcher"
+        )
+        self._thread.start()
+
+    #---------------------------------------------------------------------------
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop watching and retire all turrets.
+
+        Args:
+            timeout: Seconds to wait for the watcher thread to finish.
+        """
+        self._stopEvent.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+        for fileName in list(self.turrets):
+            self._remove(fileName)
+
+    #---------------------------------------------------------------------------
+    def scan(self) -> None:
+        """Compare the directories against the deployed turrets."""
+        seen = set()
+        for directory in self.dirs:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in fnmatch.filter(names, self.pattern):
+                fileName = op.join(directory, name)
+                seen.add(fileName)
+                try:
+                    key = fileKey(fileName)
+                except OSError:
+                    continue
+                if fileName not in self._keys or self._keys[fileName] != key:
+                    self._update(fileName)
+
+        for fileName in set(self._keys) - seen:
+            self._remove(fileName)
+
+    #---------------------------------------------------------------------------
+    def _run(self) -> None:
+        """Watch until stopped."""
+        while not self._stopEvent.is_set():
+            if not self._inotify:
+                self._stopEvent.wait(self.pollInterval)
+                self.scan()
+                continue
+
+            for directory, name, mask in self._inotify.read(0.5):
+                if mask & IN_Q_OVERFLOW:
+                    self.scan()
+                    continue
+                if not fnmatch.fnmatch(name, self.pattern):
+                    continue
+                fileName = op.join(directory, name)
+                if mask & (IN_MOVED_FROM | IN_DELETE):
+                    self._remove(fileName)
+                else:
+                    self._update(fileName)
+
+    #---------------------------------------------------------------------------
+    def _update(self, fileName: str) -> None:
+        """Deploy or refresh the turret of a new or changed file."""
+        try:
+            self._keys[fileName] = fileKey(fileName)
+            turret = self.turrets.get(fileName)
+            if turret:
+                turret.refresh()
+                return
+
+            turret = JsonTurret(fileName)
+            turret.scheduled = True
+            turret.refresh()
+            self.registry.register(turret)
+            self.turrets[fileName] = turret
+            print(f"[I] Found turret JsonTurret:\n    {fileName}")
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            # Partially written or invalid files are retried when they change.
+            print(f"[W] Unable to deploy turret for {fileName}: {exc}")
+
+    #---------------------------------------------------------------------------
+    def _remove(self, fileName: str) -> None:
+        """Retire the turret of a removed file."""
+        self._keys.pop(fileName, None)
+        FILE_CACHE.forget(fileName)
+        turret = self.turrets.pop(fileName, None)
+        if turret:
+            self.registry.unregister(turret)
+            TURRET_STATS.forget(turret)
+            print(f"[I] Retired turret JsonTurret:\n    {fileName}")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+""" Test backfill of unscraped renders. """
+
+import os
+import shutil
+import tempfile
+import unittest as ut
+
+from prometheus_client.core import GaugeMetricFamily
+
+from glados.backfill import BackfillSink, mergeRenders
+
+#-------------------------------------------------------------------------------
+def gauge(value, timestamp=None):
+    """ A family with a single sample. """
+    family = GaugeMetricFamily("test_value", "Test value.", labels=["host"])
+    family.add_metric(["h"], value, timestamp)
+    return (family,)
+
+#-------------------------------------------------------------------------------
+class TestMergeRenders(ut.TestCase):
+    """ Test mergeRenders. """
+    #---------------------------------------------------------------------------
+    def testMerge(self):
+        """ Samples are timestamped, deduplicated and in time order. """
+        families = mergeRenders([
+            (100.0, gauge(1.0)), (105.0, gauge(2.0, 50.0)),
+            (110.0, gauge(2.0, 50.0)), (115.0, gauge(3.0)),
+        ])
+        self.assertEqual(len(families), 1)
+        self.assertEqual(
+            [(s.value, s.timestamp) for s in families[0].samples],
+            [(2.0, 50.0), (1.0, 100.0), (3.0, 115.0)]
+        )
+
+#-------------------------------------------------------------------------------
+class TestBackfillSink(ut.TestCase):
+    """ Test BackfillSink. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.sink = BackfillSink(self.tmpDir, gap=30.0)
+        self.sink.scraped(0.0, now=0.0)
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    #---------------------------------------------------------------------------
+    def testNoGap(self):
+        """ Nothing is written while scrapes keep up. """
+        for now in range(5, 100, 5):
+            self.sink.record(float(now), gauge(now))
+            self.sink.scraped(float(now), now=float(now))
+        self.sink.flush()
+        self.assertEqual(os.listdir(self.tmpDir), [])
+
+    #---------------------------------------------------------------------------
+    def testGap(self):
+        """ Renders between scrapes around a gap are written out. """
+        for now in range(5, 100, 5):
+            self.sink.record(float(now), gauge(now))
+        self.sink.scraped(95.0, now=96.0)
+        # Scrapes only queue the renders; writing happens on flush.
+        self.assertEqual(self.sink.files, [])
+        self.assertEqual(len(self.sink.flush()), 1)
+
+        self.assertEqual(len(self.sink.files), 1)
+        with open(self.sink.files[0], "r", encoding="UTF-8") as finp:
+            lines = finp.read().splitlines()
+        self.assertEqual(lines[:2], ["# HELP test_value Test value.",
+                                     "# TYPE test_value gauge"])
+        self.assertEqual(lines[2], 'test_value{host="h"} 5.0 5.0')
+        self.assertEqual(lines[-2], 'test_value{host="h"} 90.0 90.0')
+        self.assertEqual(lines[-1], "# EOF")
+
+        # Renders which were written or served are not written again.
+        self.sink.record(100.0, gauge(100))
+        self.sink.scraped(100.0, now=200.0)
+        self.assertEqual(self.sink.flush(), [])
+        self.assertEqual(len(self.sink.files), 1)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+""" Test the benchmark harness. """
+
+import unittest as ut
+
+from glados.bench import (
+    compareResults, cpuInfo, csvTable, dfOutput, jsonTurretData,
+    nvidiaSmiTable, runBenchmarks
+)
+from glados.turrets.CpuStatsTurret import parseCpuInfoSpeeds
+from glados.turrets.CsvTurret import parseCsv
+from glados.turrets.NvidiaGpuTurret import NvInfo
+
+#-------------------------------------------------------------------------------
+class TestBench(ut.TestCase):
+    """ Test the benchmark harness. """
+    #---------------------------------------------------------------------------
+    def testGenerators(self):
+        """ Synthetic input parses to the requested size. """
+        devs = NvInfo(nvidiaSmiTable(16)).deviceMetrics()
+        self.assertEqual(sorted(devs), list(range(16)))
+        self.assertEqual(devs[3]["temperature"], 33.0)
+        self.assertEqual(devs[3]["mem_use_mb"], 1315.0)
+
+        self.assertEqual(len(dfOutput(100).splitlines()), 101)
+        self.assertEqual(len(parseCpuInfoSpeeds(cpuInfo(64))), 64)
+        self.assertEqual(len(jsonTurretData(10)["metrics"]), 10)
+        self.assertEqual(parseCsv(csvTable(10)).values.shape, (10, 3))
+
+    #---------------------------------------------------------------------------
+    def testRunBenchmarks(self):
+        """ Every kind of case runs and reports all metrics. """
+        sizes = {"nvidia": (2,), "df": (3,), "cpuinfo": (4,), "json": (5,),
+                 "csv": (6,)}
+        results = runBenchmarks(sizes, repeat=1)
+        self.assertEqual(sorted(results),
+                         ["cpuinfo-4", "csv-6", "df-3", "json-5", "nvidia-2"])
+        # Five metrics and one process per GPU.
+        self.assertEqual(results["nvidia-2"]["series"], 12)
+        self.assertEqual(results["df-3"]["series"], 6)
+        self.assertEqual(results["cpuinfo-4"]["series"], 4)
+        self.assertEqual(results["json-5"]["series"], 5)
+        self.assertEqual(results["csv-6"]["series"], 18)
+        for result in results.values():
+            for metric in ("parseSec", "collectSec", "peakKiB", "renderSec",
+                           "scrapeSec", "exposureBytes"):
+                self.assertGreater(result[metric], 0, metric)
+
+        self.assertEqual(list(runBenchmarks(sizes, 1, "df")), ["df-3"])
+
+    #---------------------------------------------------------------------------
+    def testCompareResults(self):
+        """ Only increases beyond the threshold and the noise floor count. """
+        baseline = {
+            "df-10": {"parseSec": 0.010, "renderSec": 1e-5, "peakKiB": 100.0},
+            "gone-1": {"parseSec": 1.0},
+        }
+        results = {
+            "df-10": {"parseSec": 0.013, "renderSec": 3e-5, "peakKiB": 110.0},
+            "new-1": {"parseSec": 1.0},
+        }
+        rows = compareResults(baseline, results, threshold=0.2)
+        self.assertEqual(
+            [(name, metric, regressed) for name, metric, _, _, regressed
+             in rows],
+            [("df-10", "parseSec", True), ("df-10", "peakKiB", False),
+             ("df-10", "renderSec", False)]
+        )
+        self.assertFalse(any(r[-1] for r in
+                             compareResults(baseline, results, 0.5)))
@@ -9,6 +9,8 @@ import timeout_decorator
 from timeout_decorator.timeout_decorator import TimeoutError
 
 from glados.core import turretServer, getFileTurrets, getJsonTurrets
+from glados.core import applyTurretSettings
+from glados.utils import getParamsFromConfig
 
 #-------------------------------------------------------------------------------
 def getOpenPort() -> int:
@@ -55,6 +57,31 @@ class TestGetJsonTurrets(ut.TestCase):
             dirTurret = dir(turret)
             self.assertTrue(all([f in dirTurret for f in fxns]))
 
+#-------------------------------------------------------------------------------
+class TestApplyTurretSettings(ut.TestCase):
+    """Test invocation of applyTurretSettings function."""
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.testDataDir = op.join(op.dirname(op.realpath(__file__)), "data")
+        config = op.join(self.testDataDir, "config4.json")
+        self.settings = getParamsFromConfig(config)["TurretSettings"]
+
+    #---------------------------------------------------------------------------
+    def testFileSettings(self):
+        """Test settings keyed by file basename."""
+        turret = getJsonTurrets([op.join(self.testDataDir, "goveeSensor.json")])[0]
+        applyTurretSettings(turret, self.settings)
+        self.assertEqual(turret.interval, 30)
+        self.assertIsNone(turret.maxStaleness)
+
+    #---------------------------------------------------------------------------
+    def testUnknownSetting(self):
+        """Test that unknown settings are ignored."""
+        turret = getJsonTurrets([op.join(self.testDataDir, "goveeSensor.json")])[0]
+        applyTurretSettings(turret, {"JsonTurret": {"foo": 1, "_fileName": ""}})
+        self.assertFalse(hasattr(turret, "foo"))
+        self.assertNotEqual(turret.fileName, "")
+
 #-------------------------------------------------------------------------------
 class TestTurretServer(ut.TestCase):
     """ Test invocations of turretServer. """
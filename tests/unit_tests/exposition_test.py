@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+""" Test serving pre-rendered metrics. """
+
+import gzip
+import http.client
+import shutil
+import tempfile
+import unittest as ut
+
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import CollectorRegistry
+
+from glados.backfill import BackfillSink
+from glados.exposition import ExpositionCache, startExpositionServer
+
+#-------------------------------------------------------------------------------
+class ValueCollector:
+    """ Collector of a single settable gauge. """
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        self.value = 1.0
+        self.collects = 0
+
+    #---------------------------------------------------------------------------
+    def collect(self):
+        """ Yield the gauge. """
+        self.collects += 1
+        yield GaugeMetricFamily("test_value", "Test value.", value=self.value)
+
+#-------------------------------------------------------------------------------
+class TestExpositionCache(ut.TestCase):
+    """ Test ExpositionCache. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.registry = CollectorRegistry()
+        self.collector = ValueCollector()
+        self.registry.register(self.collector)
+        self.cache = ExpositionCache(self.registry)
+
+    #---------------------------------------------------------------------------
+    def get(self, **environ):
+        """ Call the WSGI app. Returns (status, headers, body). """
+        response = {}
+        def startResponse(status, headers):
+            response["status"] = status
+            response["headers"] = dict(headers)
+        body = b"".join(self.cache.app(environ, startResponse))
+        return response["status"], response["headers"], body
+
+    #---------------------------------------------------------------------------
+    def testScrapesDoNotCollect(self):
+        """ Scrapes serve the render without collecting again. """
+        self.cache.render()
+        collects = self.collector.collects
+        for _ in range(3):
+            status, headers, body = self.get()
+        self.assertEqual(status, "200 OK")
+        self.assertIn(b"test_value 1.0", body)
+        self.assertEqual(headers["Content-Length"], str(len(body)))
+        self.assertEqual(self.collector.collects, collects)
+
+    #---------------------------------------------------------------------------
+    def testGzip(self):
+        """ Gzip is served when accepted. """
+        _, _, plain = self.get()
+        _, headers, body = self.get(HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(body), plain)
+
+    #---------------------------------------------------------------------------
+    def testETag(self):
+        """ Unchanged renders keep their ETag and are not resent. """
+        _, headers, _ = self.get()
+        etag = headers["ETag"]
+        self.cache.render()
+        status, headers, body = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((status, headers["ETag"], body),
+                         ("304 Not Modified", etag, b""))
+        status, _, _ = self.get(HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+        self.assertEqual(status, "304 Not Modified")
+
+        self.collector.value = 2.0
+        self.cache.render()
+        status, headers, body = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status, "200 OK")
+        self.assertNotEqual(headers["ETag"], etag)
+        self.assertIn(b"test_value 2.0", body)
+
+    #---------------------------------------------------------------------------
+    def testBackfillOffScrapePath(self):
+        """ Backfill after a gap is written by the render loop, not scrapes. """
+        tmpDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpDir)
+        self.cache.backfill = BackfillSink(tmpDir, gap=0.0)
+        self.cache.backfill.scraped(0.0, now=0.0)
+        self.cache.render()
+        self.cache.render()
+        self.get()
+        self.assertEqual(self.cache.backfill.files, [])
+        self.cache.start()
+        self.cache.stop(1.0)
+        self.assertEqual(len(self.cache.backfill.files), 1)
+
+    #---------------------------------------------------------------------------
+    def testNameFilter(self):
+        """ Filtered requests are rendered live. """
+        _, _, body = self.get(QUERY_STRING="name[]=other")
+        self.assertNotIn(b"test_value", body)
+
+    #---------------------------------------------------------------------------
+    def testServer(self):
+        """ Serve over HTTP. """
+        server = startExpositionServer(0, self.cache, "127.0.0.1")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+            conn.request("GET", "/metrics", headers={"Accept-Encoding": "gzip"})
+            response = conn.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertIn(b"test_value", gzip.decompress(response.read()))
+            conn.close()
+        finally:
+            server.shutdown()
+            server.server_close()
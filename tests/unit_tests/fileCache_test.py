@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+""" Test the file cache for file based turrets. """
+
+import json
+import os
+import os.path as op
+import shutil
+import tempfile
+import unittest as ut
+
+from glados.fileCache import FileCache, fileKey
+from glados.turrets.JsonTurret import JsonTurret
+
+#-------------------------------------------------------------------------------
+class TestFileCache(ut.TestCase):
+    """ Test FileCache. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.fileName = op.join(self.tmpDir, "data.json")
+        self.write({"a": 1})
+        self.cache = FileCache()
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    #---------------------------------------------------------------------------
+    def write(self, data):
+        """ Write data and make sure the mtime moves forward. """
+        key = fileKey(self.fileName) if op.exists(self.fileName) else None
+        with open(self.fileName, "w", encoding="UTF-8") as fout:
+            json.dump(data, fout)
+        if key:
+            os.utime(self.fileName, ns=(key[2] + 1000, key[2] + 1000))
+
+    #---------------------------------------------------------------------------
+    def testReadHit(self):
+        """ Unchanged files are served from the cache. """
+        text = self.cache.read(self.fileName)
+        self.assertIs(self.cache.read(self.fileName), text)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    #---------------------------------------------------------------------------
+    def testReadChanged(self):
+        """ Changed files are re-read. """
+        self.cache.read(self.fileName)
+        self.write({"a": 22})
+        self.assertEqual(self.cache.read(self.fileName), '{"a": 22}')
+        self.assertEqual(self.cache.misses, 2)
+
+    #---------------------------------------------------------------------------
+    def testParseMemoized(self):
+        """ Parsed objects are memoized until the file changes. """
+        data = self.cache.parse(self.fileName, json.loads)
+        self.assertIs(self.cache.parse(self.fileName, json.loads), data)
+        self.write({"a": 2})
+        self.assertEqual(self.cache.parse(self.fileName, json.loads), {"a": 2})
+
+    #---------------------------------------------------------------------------
+    def testReplacedFile(self):
+        """ A file replaced by rename is re-read even with the same stat. """
+        self.cache.read(self.fileName)
+        key = fileKey(self.fileName)
+        newName = op.join(self.tmpDir, "new.json")
+        with open(newName, "w", encoding="UTF-8") as fout:
+            fout.write('{"b": 1}')
+        os.utime(newName, ns=(key[2], key[2]))
+        os.rename(newName, self.fileName)
+        self.assertEqual(self.cache.read(self.fileName), '{"b": 1}')
+
+    #---------------------------------------------------------------------------
+    def testProcNotCached(self):
+        """ Files reporting zero size are always re-read. """
+        self.assertIsNone(fileKey("/proc/self/stat"))
+        first = self.cache.read("/proc/self/stat")
+        self.assertIsNot(self.cache.read("/proc/self/stat"), first)
+        self.assertEqual(self.cache.hits, 0)
+
+    #---------------------------------------------------------------------------
+    def testForget(self):
+        """ Forgotten files are re-read. """
+        self.cache.parse(self.fileName, json.loads)
+        self.cache.forget(self.fileName)
+        self.cache.read(self.fileName)
+        self.assertEqual(self.cache.hits, 0)
+
+#-------------------------------------------------------------------------------
+class TestJsonTurretCaching(ut.TestCase):
+    """ Test that JsonTurret only re-parses changed files. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.fileName = op.join(self.tmpDir, "sensor.json")
+        self.data = {"name": "sensor", "description": "A sensor.",
+                     "labels": ["metric"], "metrics": [[["temp"], 20.0]]}
+        with open(self.fileName, "w", encoding="UTF-8") as fout:
+            json.dump(self.data, fout)
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    #---------------------------------------------------------------------------
+    def testUnchangedGaugeReused(self):
+        """ The gauge is rebuilt only when the file changes. """
+        turret = JsonTurret(self.fileName)
+        gauge = next(turret.collect())
+        self.assertIs(next(turret.collect()), gauge)
+        self.assertEqual(gauge.samples[0].value, 20.0)
+
+        key = fileKey(self.fileName)
+        self.data["metrics"] = [[["temp"], 21.0]]
+        with open(self.fileName, "w", encoding="UTF-8") as fout:
+            json.dump(self.data, fout)
+        os.utime(self.fileName, ns=(key[2] + 1000, key[2] + 1000))
+        self.assertEqual(next(turret.collect()).samples[0].value, 21.0)
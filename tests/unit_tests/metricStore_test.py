@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+""" Test the metric store. """
+
+import unittest as ut
+
+from prometheus_client.exposition import generate_latest
+from prometheus_client.registry import CollectorRegistry
+
+from glados.metricStore import MetricStore
+
+#-------------------------------------------------------------------------------
+def values(family):
+    """ {label values: value} of a family. """
+    return {tuple(s.labels.values()): s.value for s in family.samples}
+
+#-------------------------------------------------------------------------------
+class TestMetricStore(ut.TestCase):
+    """ Test MetricStore. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.store = MetricStore("test_gauge", "Test gauge.", ["host", "dev"])
+
+    #---------------------------------------------------------------------------
+    def testUpdateInPlace(self):
+        """ Series are reused across acquisitions. """
+        self.store.begin()
+        self.store.set(["h", "0"], 1.0)
+        self.store.set(["h", 1], 2.0)
+        first = self.store.family()
+
+        self.store.begin()
+        self.store.set(["h", "0"], 3.0)
+        self.store.set(["h", "1"], 4.0)
+        second = self.store.family()
+
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(values(first), {("h", "0"): 1.0, ("h", "1"): 2.0})
+        self.assertEqual(values(second), {("h", "0"): 3.0, ("h", "1"): 4.0})
+        self.assertIs(first.samples[0].labels, second.samples[0].labels)
+
+    #---------------------------------------------------------------------------
+    def testSweep(self):
+        """ Series which are not set are dropped. """
+        self.store.begin()
+        for dev in "012":
+            self.store.set(["h", dev], 1.0)
+        first = self.store.family()
+
+        self.store.begin()
+        self.store.set(["h", "2"], 5.0)
+        self.store.set(["h", "3"], 6.0)
+        second = self.store.family()
+
+        self.assertEqual(len(values(first)), 3)
+        self.assertEqual(values(second), {("h", "2"): 5.0, ("h", "3"): 6.0})
+
+    #---------------------------------------------------------------------------
+    def testTimestamps(self):
+        """ Series are at the store's timestamp unless given their own. """
+        self.store.timestamp = 10.0
+        self.store.begin()
+        self.store.set(["h", "0"], 1.0)
+        first = self.store.family()
+        self.store.set(["h", "1"], 2.0, 20.0)
+        self.store.set(["h", "2"], 3.0)
+        second = self.store.family()
+        self.assertEqual([s.timestamp for s in first.samples], [10.0])
+        self.assertEqual([s.timestamp for s in second.samples],
+                         [10.0, 20.0, 10.0])
+
+    #---------------------------------------------------------------------------
+    def testWrongLabels(self):
+        """ Series must have a value for each label. """
+        with self.assertRaises(ValueError):
+            self.store.set(["h"], 1.0)
+
+    #---------------------------------------------------------------------------
+    def testExposition(self):
+        """ Families render like any other gauge. """
+        self.store.begin()
+        self.store.set(["h", "0"], 1.5)
+        family = self.store.family()
+        registry = CollectorRegistry()
+        registry.register(type("C", (), {"collect": lambda self: [family]})())
+        self.assertIn(b'test_gauge{dev="0",host="h"} 1.5',
+                      generate_latest(registry))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+""" Test binary metric files and the MmapTurret. """
+
+import multiprocessing
+import os.path as op
+import shutil
+import tempfile
+import unittest as ut
+
+from glados.mmapMetrics import MmapMetricReader, MmapMetricWriter
+from glados.turrets.MmapTurret import MmapTurret
+
+#-------------------------------------------------------------------------------
+def writeLoop(path, nSeries, stopEvent):
+    """ Keep setting every value to the same, increasing number. """
+    writer = MmapMetricWriter(path, "loop", "", ["i"],
+                              [[str(i)] for i in range(nSeries)])
+    count = 0
+    while not stopEvent.is_set():
+        count += 1
+        with writer.update() as values:
+            for i in range(nSeries):
+                values[i] = count
+    writer.close()
+
+#-------------------------------------------------------------------------------
+class TestMmapMetrics(ut.TestCase):
+    """ Test MmapMetricWriter, MmapMetricReader and MmapTurret. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.fileName = op.join(self.tmpDir, "app.metrics")
+        self.writer = MmapMetricWriter(
+            self.fileName, "app_queue", "Queue depths.", ["queue", "host"],
+            [["in", "n1"], ["out", "n1"], ["in", "n2"]]
+        )
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        self.writer.close()
+        shutil.rmtree(self.tmpDir)
+
+    #---------------------------------------------------------------------------
+    def testReadWrite(self):
+        """ Values written in place are read back with their labels. """
+        reader = MmapMetricReader(self.fileName)
+        self.writer.set(["out", "n1"], 4.5)
+        with self.writer.update() as values:
+            values[self.writer.index(["in", "n2"])] = 7
+        values, updated = reader.read()
+        self.assertEqual(list(values), [0.0, 4.5, 7.0])
+        self.assertGreater(updated, 0)
+        self.assertEqual(reader.labelDicts[2], {"queue": "in", "host": "n2"})
+        # Label values are interned once per file.
+        self.assertIs(reader.labelDicts[0]["host"], reader.labelDicts[1]["host"])
+        with self.assertRaises(ValueError):
+            MmapMetricWriter(self.fileName, "x", "", ["a"], [["1", "2"]])
+        reader.close()
+
+    #---------------------------------------------------------------------------
+    def testConsistentReads(self):
+        """ A reader never sees a partial update of another process. """
+        nSeries = 1000
+        context = multiprocessing.get_context("spawn")
+        stopEvent = context.Event()
+        process = context.Process(
+            target=writeLoop, args=(self.fileName, nSeries, stopEvent)
+        )
+        process.start()
+        try:
+            reader = MmapMetricReader(self.fileName)
+            nReads = 0
+            while nReads < 200:
+                reader.refresh()
+                read = reader.read()
+                if read is None or len(read[0]) != nSeries:
+                    continue
+                self.assertEqual(len(set(read[0])), 1)
+                nReads += 1
+            reader.close()
+        finally:
+            stopEvent.set()
+            process.join(10)
+
+    #---------------------------------------------------------------------------
+    def testTurret(self):
+        """ The turret follows updates and replacement of the file. """
+        turret = MmapTurret(self.fileName)
+        self.writer.set(["in", "n1"], 3)
+        metric = next(turret.collect())
+        self.assertEqual(metric.name, "app_queue")
+        self.assertEqual(
+            {(s.labels["queue"], s.labels["host"]): s.value
+             for s in metric.samples},
+            {("in", "n1"): 3.0, ("out", "n1"): 0.0, ("in", "n2"): 0.0}
+        )
+
+        writer = MmapMetricWriter(self.fileName, "app_queue", "", ["queue"],
+                                  [["in"]])
+        writer.set(["in"], 9)
+        metric = next(turret.collect())
+        self.assertEqual([(s.labels, s.value) for s in metric.samples],
+                         [({"queue": "in"}, 9.0)])
+        writer.close()
+        turret.close()
+
+    #---------------------------------------------------------------------------
+    def testTurretBeforeFile(self):
+        """ A turret started before its producer serves nothing until then. """
+        fileName = op.join(self.tmpDir, "late.metrics")
+        turret = MmapTurret(fileName)
+        self.assertEqual(list(turret.collect()), [])
+        with open(fileName, "wb") as fout:
+            fout.write(b"not yet")
+        self.assertEqual(list(turret.collect()), [])
+
+        writer = MmapMetricWriter(fileName, "late", "", ["queue"], [["in"]])
+        writer.set(["in"], 2)
+        metric = next(turret.collect())
+        self.assertEqual([(s.labels, s.value) for s in metric.samples],
+                         [({"queue": "in"}, 2.0)])
+        writer.close()
+        turret.close()
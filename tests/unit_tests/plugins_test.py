@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+""" Test discovery of turret plugins. """
+
+from importlib.metadata import EntryPoint
+import json
+import os
+import os.path as op
+import shutil
+import sys
+import tempfile
+import unittest as ut
+from unittest import mock
+
+from glados import plugins
+from glados.core import getFileTurrets, getPluginTurrets
+
+PLUGIN_SOURCE = '''
+from glados.turrets.Turret import Turret, TurretGauge
+
+class EchoTurret(Turret):
+    interval = 7.0
+    cost = "high"
+
+    def acquire(self):
+        self.gauge = TurretGauge("echo", "Echo.", ["host"])
+        self.addMetric([self.hostname], 1.0)
+'''
+
+#-------------------------------------------------------------------------------
+class TestDiscoverPlugins(ut.TestCase):
+    """ Test discoverPlugins. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.pluginDir = op.join(self.tmpDir, "plugins")
+        self.cacheFile = op.join(self.tmpDir, "cache", "plugins.json")
+        os.makedirs(self.pluginDir)
+        with open(op.join(self.pluginDir, "echo.py"), "w",
+                  encoding="UTF-8") as fout:
+            fout.write(PLUGIN_SOURCE)
+        self.moduleName = plugins.PLUGIN_MODULE_PREFIX + "echo"
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        sys.modules.pop(self.moduleName, None)
+        shutil.rmtree(self.tmpDir)
+
+    #---------------------------------------------------------------------------
+    def discover(self, eps=()):
+        """ Discover plugins with the given entry points. """
+        with mock.patch.object(plugins, "entryPoints", return_value=list(eps)):
+            return plugins.discoverPlugins([self.pluginDir], self.cacheFile)
+
+    #---------------------------------------------------------------------------
+    def testBuiltins(self):
+        """ Built-in turrets are found without a cache. """
+        found = self.discover()
+        self.assertEqual(found["CpuUtilTurret"].source, "builtin")
+
+    #---------------------------------------------------------------------------
+    def testDirectoryPlugin(self):
+        """ Metadata is cached and cached plugins are not imported. """
+        plugin = self.discover()["EchoTurret"]
+        self.assertEqual((plugin.source, plugin.interval, plugin.cost),
+                         ("directory", 7.0, "high"))
+        with open(self.cacheFile, "r", encoding="UTF-8") as finp:
+            self.assertEqual(len(json.load(finp)), 1)
+
+        sys.modules.pop(self.moduleName)
+        plugin = self.discover()["EchoTurret"]
+        self.assertNotIn(self.moduleName, sys.modules)
+        self.assertEqual((plugin.interval, plugin.cost), (7.0, "high"))
+
+        turrets = getPluginTurrets(["EchoTurret", "NoTurret"],
+                                   {"EchoTurret": plugin})
+        self.assertEqual(len(turrets), 1)
+        self.assertEqual(next(turrets[0].collect()).name, "echo")
+
+    #---------------------------------------------------------------------------
+    def testEntryPoint(self):
+        """ Entry points are found and may name a class differently. """
+        ep = EntryPoint("UtilTurret",
+                        "glados.turrets.CpuUtilTurret:CpuUtilTurret",
+                        plugins.ENTRY_POINT_GROUP)
+        plugin = self.discover([ep])["UtilTurret"]
+        self.assertEqual(plugin.source, "entrypoint")
+        self.assertEqual(plugin.load().__name__, "CpuUtilTurret")
+        plugin = self.discover([ep])["UtilTurret"]
+        self.assertEqual(plugin.attr, "CpuUtilTurret")
+
+    #---------------------------------------------------------------------------
+    def testFileTurret(self):
+        """ Turret files resolve to plugins by class name. """
+        turretFile = op.join(self.tmpDir, "host1", "Echo.turret")
+        os.makedirs(op.dirname(turretFile))
+        with open(turretFile, "w", encoding="UTF-8") as fout:
+            fout.write("{}\n")
+        turrets = getFileTurrets([turretFile], self.discover())
+        self.assertEqual([type(t).__name__ for t in turrets], ["EchoTurret"])
+        self.assertEqual(turrets[0].hostname, "host1")
+
+    #---------------------------------------------------------------------------
+    def testBrokenPlugin(self):
+        """ Plugins which fail to import are skipped. """
+        with open(op.join(self.pluginDir, "broken.py"), "w",
+                  encoding="UTF-8") as fout:
+            fout.write("raise ImportError('broken')\n")
+        found = self.discover()
+        self.assertIn("EchoTurret", found)
+        self.assertNotIn(plugins.PLUGIN_MODULE_PREFIX + "broken", sys.modules)
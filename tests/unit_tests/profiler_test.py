@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+""" Test profiling turret collections. """
+
+import asyncio
+import os
+import pstats
+import tempfile
+import time
+import unittest as ut
+
+from prometheus_client.registry import CollectorRegistry
+
+from glados.exposition import ExpositionCache
+from glados.profiler import CollectionProfiler
+from glados.selfMetrics import TURRET_STATS
+from glados.turrets.Turret import Turret, TurretGauge
+
+#-------------------------------------------------------------------------------
+def hotSpot(n: int) -> int:
+    """ Function to find in profiles. """
+    return sum(i * i for i in range(n))
+
+#-------------------------------------------------------------------------------
+class HotTurret(Turret):
+    """ Turret spending its time in hotSpot. """
+    #---------------------------------------------------------------------------
+    def acquire(self):
+        self.gauge = TurretGauge("hot", "Hot turret.", ["host"])
+        self.addMetric([self.hostname], hotSpot(1000))
+
+#-------------------------------------------------------------------------------
+class HotAsyncTurret(Turret):
+    """ Async turret spending its time in hotSpot around a wait. """
+    #---------------------------------------------------------------------------
+    async def acquireAsync(self):
+        hotSpot(10)
+        await asyncio.sleep(0.01)
+        self.gauge = TurretGauge("hot_async", "Hot async turret.", ["host"])
+        self.addMetric([self.hostname], hotSpot(1000))
+
+#-------------------------------------------------------------------------------
+def hotSpotCalls(fileName: str) -> int:
+    """ Number of calls of hotSpot in a pstats file. """
+    stats = pstats.Stats(fileName)
+    return sum(
+        stat[1] for (_, _, func), stat in stats.stats.items() # type: ignore
+        if func == "hotSpot"
+    )
+
+#-------------------------------------------------------------------------------
+class TestCollectionProfiler(ut.TestCase):
+    """ Test CollectionProfiler. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.profiler = CollectionProfiler(self.tmpDir.name, seconds=0)
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        self.profiler.stop()
+        self.tmpDir.cleanup()
+
+    #---------------------------------------------------------------------------
+    def testProfile(self):
+        """ Collections are profiled per turret only while running. """
+        turret = HotTurret()
+        list(turret.collect())
+        self.assertIsNone(TURRET_STATS.profiler)
+
+        self.assertTrue(self.profiler.start())
+        self.assertFalse(self.profiler.start())
+        self.assertTrue(self.profiler.active)
+        for _ in range(3):
+            list(turret.collect())
+        files = self.profiler.stop()
+        self.assertFalse(self.profiler.active)
+        self.assertIsNone(TURRET_STATS.profiler)
+
+        self.assertEqual(len(files), 2)
+        self.assertTrue(files[0].endswith("-HotTurret.pstats"))
+        self.assertEqual(hotSpotCalls(files[0]), 3)
+        with open(files[1], "r", encoding="UTF-8") as finp:
+            summary = finp.read()
+        self.assertIn("==== HotTurret", summary)
+        self.assertIn("hotSpot", summary)
+
+        # Nothing is recorded once stopped.
+        list(turret.collect())
+        self.assertEqual(self.profiler.stop(), [])
+
+    #---------------------------------------------------------------------------
+    def testAsync(self):
+        """ Native and executor backed async collections are profiled. """
+        self.profiler.start()
+        asyncio.run(HotAsyncTurret().gatherAllAsync())
+        asyncio.run(HotTurret().gatherAllAsync())
+        files = self.profiler.stop()
+
+        self.assertEqual(len(files), 3)
+        self.assertEqual(hotSpotCalls(files[0]), 2)
+        self.assertEqual(hotSpotCalls(files[1]), 1)
+
+    #---------------------------------------------------------------------------
+    def testTimedRun(self):
+        """ A run with a length stops on its own. """
+        self.profiler.start(0.05)
+        list(HotTurret().collect())
+        deadline = time.time() + 5
+        while len(self.profiler.files) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(self.profiler.active)
+        self.assertEqual(len(self.profiler.files), 2)
+
+    #---------------------------------------------------------------------------
+    def testEndpoint(self):
+        """ /debug/profile starts and stops profiling from localhost only. """
+        cache = ExpositionCache(CollectorRegistry(), profiler=self.profiler)
+
+        def get(query, addr="127.0.0.1"):
+            response = {}
+            def startResponse(status, headers):
+                response["status"] = status
+            body = b"".join(cache.app({
+                "PATH_INFO": "/debug/profile", "QUERY_STRING": query,
+                "REMOTE_ADDR": addr
+            }, startResponse))
+            return response["status"], body
+
+        self.assertEqual(get("", "10.0.0.1")[0], "403 Forbidden")
+        self.assertEqual(get("seconds=abc")[0], "400 Bad Request")
+        self.assertEqual(get("seconds=0")[0], "202 Accepted")
+        self.assertEqual(get("seconds=0")[0], "409 Conflict")
+        list(HotTurret().collect())
+        status, body = get("stop")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(len(body.decode().split()), 2)
+        self.assertTrue(all(os.path.exists(f) for f in body.decode().split()))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+""" Test pushing metrics. """
+
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import shutil
+import tempfile
+import threading
+import unittest as ut
+
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import CollectorRegistry
+
+from glados.push import PushClient
+
+#-------------------------------------------------------------------------------
+class Receiver(ThreadingHTTPServer):
+    """ Local stand-in for a Pushgateway or import endpoint. """
+    daemon_threads = True
+
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), ReceiverHandler)
+        self.requests = []
+        self.failNext = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    #---------------------------------------------------------------------------
+    @property
+    def url(self):
+        """ URL of the receiver. """
+        return f"http://127.0.0.1:{self.server_port}"
+
+#-------------------------------------------------------------------------------
+class ReceiverHandler(BaseHTTPRequestHandler):
+    """ Record requests, failing the first server.failNext of them. """
+    protocol_version = "HTTP/1.1"
+
+    #---------------------------------------------------------------------------
+    def receive(self):
+        """ Record a request. """
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        status = 200
+        if self.server.failNext:
+            self.server.failNext -= 1
+            status = 503
+        else:
+            self.server.requests.append(
+                (self.command, self.path, self.client_address, body.decode())
+            )
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_PUT = receive
+    do_POST = receive
+
+    #---------------------------------------------------------------------------
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        """ Log nothing. """
+
+#-------------------------------------------------------------------------------
+class ValueCollector:
+    """ Collector of a single settable gauge. """
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        self.value = 1.0
+
+    #---------------------------------------------------------------------------
+    def collect(self):
+        """ Yield the gauge. """
+        yield GaugeMetricFamily("test_value", "Test value.", value=self.value)
+
+#-------------------------------------------------------------------------------
+class TestPushClient(ut.TestCase):
+    """ Test PushClient against a local receiver. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.receiver = Receiver()
+        self.registry = CollectorRegistry()
+        self.collector = ValueCollector()
+        self.registry.register(self.collector)
+        self.spoolDir = tempfile.mkdtemp()
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        self.receiver.shutdown()
+        self.receiver.server_close()
+        shutil.rmtree(self.spoolDir)
+
+    #---------------------------------------------------------------------------
+    def testPushgateway(self):
+        """ Pushes PUT the group over one connection, without timestamps. """
+        client = PushClient(self.registry, self.receiver.url, job="j",
+                            instance="node/1", retries=0)
+        self.assertTrue(client.push())
+        self.collector.value = 2.0
+        self.assertTrue(client.push())
+        client.stop()
+
+        (method, path, client1, body1), (_, _, client2, body2) = \
+            self.receiver.requests
+        self.assertEqual(method, "PUT")
+        self.assertEqual(path, "/metrics/job/j/instance/node%2F1")
+        self.assertEqual(client1, client2)
+        self.assertIn("test_value 1.0\n", body1)
+        self.assertIn("test_value 2.0\n", body2)
+
+    #---------------------------------------------------------------------------
+    def testRetry(self):
+        """ Failed pushes are retried. """
+        self.receiver.failNext = 1
+        client = PushClient(self.registry, self.receiver.url, retries=1)
+        self.assertTrue(client.push())
+        client.stop()
+        self.assertEqual(len(self.receiver.requests), 1)
+
+    #---------------------------------------------------------------------------
+    def testImportSpool(self):
+        """ Unsent batches are spooled and replayed in order. """
+        client = PushClient(self.registry, self.receiver.url + "/import",
+                            format="import", retries=0, spoolDir=self.spoolDir,
+                            maxSpool=2)
+        self.receiver.failNext = 3
+        for value in [1.0, 2.0, 3.0]:
+            self.collector.value = value
+            self.assertFalse(client.push())
+        self.assertEqual(len(os.listdir(self.spoolDir)), 2)
+
+        self.collector.value = 4.0
+        self.assertTrue(client.push())
+        client.stop()
+        self.assertEqual(os.listdir(self.spoolDir), [])
+
+        values = []
+        for method, path, _, body in self.receiver.requests:
+            self.assertEqual((method, path), ("POST", "/import"))
+            line = [l for l in body.splitlines() if l.startswith("test_value")]
+            value, timestamp = line[0].split()[1:]
+            values.append(float(value))
+            self.assertGreater(int(timestamp), 1e12)
+        self.assertEqual(values, [2.0, 3.0, 4.0])
+
+    #---------------------------------------------------------------------------
+    def testNoSpool(self):
+        """ With maxSpool=0 unsent batches are dropped, not kept. """
+        client = PushClient(self.registry, self.receiver.url + "/import",
+                            format="import", retries=0, maxSpool=0)
+        self.receiver.failNext = 3
+        for _ in range(3):
+            self.assertFalse(client.push())
+        self.assertEqual(client._spooled(), [])
+        self.assertTrue(client.push())
+        client.stop()
+        self.assertEqual(len(self.receiver.requests), 1)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+""" Test background collection of turrets. """
+
+import asyncio
+import glob
+import time
+import unittest as ut
+
+from glados.scheduler import TurretScheduler, AsyncTurretScheduler
+from glados.utils import runCommandAsync
+from glados.turrets.Turret import Turret, TurretGauge
+
+#-------------------------------------------------------------------------------
+class CountingTurret(Turret):
+    """Turret which counts how many times it has been acquired."""
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    #---------------------------------------------------------------------------
+    def acquire(self):
+        self.count += 1
+        self.gauge = TurretGauge("counting", "Acquisition count.", ["host"])
+        self.addMetric([self.hostname], self.count)
+
+#-------------------------------------------------------------------------------
+class FailingTurret(Turret):
+    """Turret which always fails to acquire."""
+    #---------------------------------------------------------------------------
+    def acquire(self):
+        raise RuntimeError("broken")
+
+#-------------------------------------------------------------------------------
+class SlowTurret(CountingTurret):
+    """Turret whose acquisitions after the first take a while."""
+    #---------------------------------------------------------------------------
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    #---------------------------------------------------------------------------
+    def acquire(self):
+        if self.count:
+            time.sleep(self.delay)
+        super().acquire()
+
+#-------------------------------------------------------------------------------
+def waitFor(predicate, timeout=2.0):
+    """ Poll predicate until it is true or timeout passes. """
+    start = time.time()
+    while not predicate() and time.time() - start < timeout:
+        time.sleep(0.01)
+    return predicate()
+
+#-------------------------------------------------------------------------------
+def commandRunning(cmdStr):
+    """ Whether any process is running cmdStr. """
+    cmdLine = cmdStr.replace(" ", "\0").encode() + b"\0"
+    for path in glob.glob("/proc/[0-9]*/cmdline"):
+        try:
+            with open(path, "rb") as f:
+                if f.read() == cmdLine:
+                    return True
+        except OSError:
+            continue
+    return False
+
+#-------------------------------------------------------------------------------
+class TestTurretScheduler(ut.TestCase):
+    """ Test TurretScheduler. """
+    #---------------------------------------------------------------------------
+    def testUnscheduledCollectAcquires(self):
+        """ Without a scheduler collect acquires inline. """
+        turret = CountingTurret()
+        next(turret.collect())
+        next(turret.collect())
+        self.assertEqual(turret.count, 2)
+
+    #---------------------------------------------------------------------------
+    def testCollectServesSnapshot(self):
+        """ Scheduled collect never acquires and yields the snapshot. """
+        turret = CountingTurret()
+        scheduler = TurretScheduler([turret], interval=60)
+        self.assertEqual(list(turret.collect()), [])
+
+        scheduler.start()
+        try:
+            self.assertTrue(waitFor(lambda: turret.snapshotTime > 0))
+            count = turret.count
+            for _ in range(5):
+                metric = next(turret.collect())
+                self.assertEqual(metric.samples[0].value, 1)
+            self.assertEqual(turret.count, count)
+            self.assertGreater(turret.snapshotTime, 0.0)
+        finally:
+            scheduler.stop(1.0)
+
+    #---------------------------------------------------------------------------
+    def testInterval(self):
+        """ Turrets are refreshed repeatedly on the interval. """
+        turret = CountingTurret()
+        scheduler = TurretScheduler([turret], interval=0.01)
+        scheduler.start()
+        try:
+            self.assertTrue(waitFor(lambda: turret.count >= 3))
+        finally:
+            scheduler.stop(1.0)
+
+    #---------------------------------------------------------------------------
+    def testFailureKeepsSnapshot(self):
+        """ A failing turret does not stop the others. """
+        good = CountingTurret()
+        bad = FailingTurret()
+        scheduler = TurretScheduler([bad, good], interval=0.01)
+        scheduler.start()
+        try:
+            self.assertTrue(waitFor(lambda: good.count >= 2))
+            self.assertEqual(list(bad.collect()), [])
+        finally:
+            scheduler.stop(1.0)
+
+    #---------------------------------------------------------------------------
+    def testPerTurretInterval(self):
+        """ Turret intervals override the scheduler default. """
+        fast = CountingTurret()
+        slow = CountingTurret()
+        slow.interval = 60
+        scheduler = TurretScheduler([fast, slow], interval=0.01)
+        self.assertEqual(fast.interval, 0.01)
+        self.assertEqual(slow.maxStaleness, 180)
+        scheduler.start()
+        try:
+            self.assertTrue(waitFor(lambda: fast.count >= 5))
+            self.assertEqual(slow.count, 1)
+        finally:
+            scheduler.stop(1.0)
+
+    #---------------------------------------------------------------------------
+    def testMinInterval(self):
+        """ The shortest turret interval is known, e.g. for rendering. """
+        fast = CountingTurret()
+        fast.interval = 1.0
+        scheduler = TurretScheduler([CountingTurret(), fast], interval=5.0)
+        self.assertEqual(scheduler.minInterval, 1.0)
+        self.assertEqual(TurretScheduler([], interval=5.0).minInterval, 5.0)
+
+    #---------------------------------------------------------------------------
+    def testStaleSnapshotDropped(self):
+        """ Snapshots older than maxStaleness are not served. """
+        turret = CountingTurret()
+        TurretScheduler([turret], interval=60)
+        turret.refresh()
+        self.assertEqual(len(list(turret.collect())), 1)
+        self.assertFalse(turret.isStale())
+        self.assertTrue(turret.isStale(turret.snapshotTime + 181))
+        turret.maxStaleness = 0.0
+        time.sleep(0.01)
+        self.assertEqual(list(turret.collect()), [])
+
+    #---------------------------------------------------------------------------
+    def testParallelRefresh(self):
+        """ Slow turrets are refreshed concurrently on the pool. """
+        turrets = [SlowTurret(0.3) for _ in range(4)]
+        for turret in turrets:
+            turret.count = 1
+        scheduler = TurretScheduler(turrets, interval=60, maxWorkers=4)
+        start = time.time()
+        scheduler.start()
+        try:
+            self.assertTrue(waitFor(lambda: all(t.count == 2 for t in turrets)))
+            self.assertLess(time.time() - start, 1.0)
+        finally:
+            scheduler.stop(1.0)
+
+    #---------------------------------------------------------------------------
+    def testTimeoutServesLastGoodValue(self):
+        """ A hung turret keeps its last snapshot and counts the timeout. """
+        turret = SlowTurret(0.5)
+        turret.timeout = 0.05
+        turret.maxStaleness = 60
+        scheduler = TurretScheduler([turret], interval=0.01)
+        scheduler.start()
+        try:
+            self.assertTrue(waitFor(lambda: scheduler.timeouts[turret] >= 1))
+            self.assertEqual(next(turret.collect()).samples[0].value, 1)
+            counter = next(scheduler.collect())
+            self.assertEqual(counter.name, "glados_turret_timeout")
+            self.assertEqual(counter.samples[0].name,
+                             "glados_turret_timeout_total")
+            self.assertGreaterEqual(counter.samples[0].value, 1)
+            # The late result is discarded and the turret is not resubmitted
+            # while it is still running.
+            time.sleep(0.6)
+            self.assertEqual(next(turret.collect()).samples[0].value, 1)
+        finally:
+            scheduler.stop(1.0)
+
+#-------------------------------------------------------------------------------
+class AsyncCommandTurret(CountingTurret):
+    """Turret which waits on a command without blocking the event loop."""
+    #---------------------------------------------------------------------------
+    def __init__(self, cmdStr):
+        super().__init__()
+        self.cmdStr = cmdStr
+
+    #---------------------------------------------------------------------------
+    async def acquireAsync(self):
+        _, _, returnCode = await runCommandAsync(self.cmdStr, self.timeout)
+        assert returnCode == 0
+        self.acquire()
+
+#-------------------------------------------------------------------------------
+class TestAsyncTurretScheduler(ut.TestCase):
+    """ Test AsyncTurretScheduler. """
+    #---------------------------------------------------------------------------
+    def testGatherAsyncFallback(self):
+        """ Turrets without acquireAsync are gathered in an executor. """
+        turret = CountingTurret()
+        families = asyncio.run(turret.gatherAsync())
+        self.assertEqual(families[0].samples[0].value, 1)
+
+    #---------------------------------------------------------------------------
+    def testConcurrentCommands(self):
+        """ Command turrets are all in flight on one event loop. """
+        turrets = [AsyncCommandTurret("sleep 0.3") for _ in range(20)]
+        scheduler = AsyncTurretScheduler(turrets, interval=60)
+        start = time.time()
+        scheduler.start()
+        try:
+            self.assertTrue(
+                waitFor(lambda: all(t.snapshotTime for t in turrets), 3)
+            )
+            self.assertLess(time.time() - start, 2.0)
+            self.assertEqual(next(turrets[0].collect()).samples[0].value, 1)
+        finally:
+            scheduler.stop(1.0)
+
+    #---------------------------------------------------------------------------
+    def testTimeoutKillsCommand(self):
+        """ A hung command turret times out and keeps its last value. """
+        turret = AsyncCommandTurret("true")
+        turret.interval = 0.01
+        turret.maxStaleness = 60
+        scheduler = AsyncTurretScheduler([turret, CountingTurret()])
+        scheduler.start()
+        try:
+            self.assertTrue(waitFor(lambda: turret.count >= 1))
+            turret.cmdStr = "sleep 5"
+            turret.timeout = 0.05
+            self.assertTrue(waitFor(lambda: scheduler.timeouts[turret] >= 2))
+            self.assertEqual(next(turret.collect()).samples[0].value,
+                             turret.count)
+        finally:
+            scheduler.stop(1.0)
+
+    #---------------------------------------------------------------------------
+    def testCancelKillsCommand(self):
+        """ A command whose caller is cancelled does not outlive it. """
+        cmdStr = "sleep 7.77"
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(asyncio.wait_for(runCommandAsync(cmdStr, 30), 0.2))
+        self.assertFalse(commandRunning(cmdStr))
+
+    #---------------------------------------------------------------------------
+    def testHungExecutorTurretSkipped(self):
+        """ A turret hung in an executor thread is not started again. """
+        turret = SlowTurret(0.5)
+        turret.interval = 0.01
+        turret.timeout = 0.05
+        turret.maxStaleness = 60
+        scheduler = AsyncTurretScheduler([turret])
+        scheduler.start()
+        try:
+            self.assertTrue(waitFor(lambda: scheduler.timeouts[turret] >= 1))
+            time.sleep(0.3)
+            # Still the first hung refresh: neither resubmitted nor recounted.
+            self.assertEqual(scheduler.timeouts[turret], 1)
+            self.assertEqual(turret.count, 1)
+            self.assertTrue(waitFor(lambda: scheduler.timeouts[turret] >= 2))
+            self.assertEqual(next(turret.collect()).samples[0].value, 1)
+        finally:
+            scheduler.stop(1.0)
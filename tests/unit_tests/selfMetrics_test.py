@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+""" Test the self metrics of turrets. """
+
+import asyncio
+import os
+import tempfile
+import unittest as ut
+
+from prometheus_client.registry import CollectorRegistry
+
+from glados.fileCache import FILE_CACHE
+from glados.selfMetrics import TurretStats, TURRET_STATS
+from glados.utils import runCommand, runCommandAsync
+from glados.turrets.Turret import Turret, TurretGauge
+
+#-------------------------------------------------------------------------------
+class ReadingTurret(Turret):
+    """Turret reading its file and running a command on every acquire."""
+    #---------------------------------------------------------------------------
+    def acquire(self):
+        runCommand("true")
+        self.gauge = TurretGauge("file_size", "Size of the file.", ["host"])
+        self.addMetric([self.hostname], len(self._turretFileInfo))
+
+#-------------------------------------------------------------------------------
+class ForkingAsyncTurret(Turret):
+    """Turret running a command without blocking the event loop."""
+    #---------------------------------------------------------------------------
+    async def acquireAsync(self):
+        await runCommandAsync("true")
+        self.gauge = TurretGauge("async", "Async turret.", ["host"])
+        self.addMetric([self.hostname], 1.0)
+
+#-------------------------------------------------------------------------------
+class BrokenTurret(Turret):
+    """Turret which always fails."""
+    #---------------------------------------------------------------------------
+    def acquire(self):
+        raise RuntimeError("broken")
+
+#-------------------------------------------------------------------------------
+def getValue(stats: TurretStats, name: str, **labels) -> float:
+    """ Value of a sample of the stats. """
+    registry = CollectorRegistry()
+    registry.register(stats)
+    value = registry.get_sample_value(name, labels)
+    assert value is not None, f"No sample {name} {labels}"
+    return value
+
+#-------------------------------------------------------------------------------
+class TestTurretStats(ut.TestCase):
+    """ Test TurretStats. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.realpath(os.path.join(self.tmpDir.name, "in"))
+        with open(self.fileName, "w", encoding="UTF-8") as fout:
+            fout.write("0123456789")
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        FILE_CACHE.forget(self.fileName)
+        self.tmpDir.cleanup()
+
+    #---------------------------------------------------------------------------
+    def testCollect(self):
+        """ Collections, samples, reads and forks are counted per turret. """
+        turret = ReadingTurret(self.fileName)
+        labels = {"turret": "ReadingTurret", "file": self.fileName}
+        for _ in range(3):
+            families = list(turret.collect())
+        self.assertEqual(families[0].samples[0].value, 10)
+
+        self.assertEqual(getValue(
+            TURRET_STATS, "glados_turret_collect_seconds_count", **labels
+        ), 3)
+        self.assertEqual(getValue(
+            TURRET_STATS, "glados_turret_collect_seconds_bucket", le="+Inf",
+            **labels
+        ), 3)
+        self.assertEqual(
+            getValue(TURRET_STATS, "glados_turret_samples", **labels), 1
+        )
+        self.assertEqual(
+            getValue(TURRET_STATS, "glados_turret_errors_total", **labels), 0
+        )
+        self.assertGreater(getValue(
+            TURRET_STATS, "glados_turret_last_success_timestamp", **labels
+        ), 0)
+        self.assertEqual(getValue(
+            TURRET_STATS, "glados_turret_subprocess_forks_total", **labels
+        ), 3)
+        # The file is only read again once it changes.
+        self.assertEqual(getValue(
+            TURRET_STATS, "glados_turret_file_read_bytes_total", **labels
+        ), 10)
+
+        TURRET_STATS.forget(turret)
+        registry = CollectorRegistry()
+        registry.register(TURRET_STATS)
+        self.assertIsNone(registry.get_sample_value(
+            "glados_turret_samples", labels
+        ))
+
+    #---------------------------------------------------------------------------
+    def testErrors(self):
+        """ Failed collections are counted and raised. """
+        stats = TurretStats()
+        turret = BrokenTurret()
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                stats.measure(turret, lambda: tuple(turret.gather()))
+        labels = {"turret": "BrokenTurret", "file": ""}
+        self.assertEqual(
+            getValue(stats, "glados_turret_errors_total", **labels), 2
+        )
+        self.assertEqual(
+            getValue(stats, "glados_turret_collect_seconds_count", **labels), 2
+        )
+        registry = CollectorRegistry()
+        registry.register(stats)
+        self.assertIsNone(registry.get_sample_value(
+            "glados_turret_last_success_timestamp", labels
+        ))
+
+    #---------------------------------------------------------------------------
+    def testAsync(self):
+        """ Subprocesses of async turrets are attributed to them. """
+        turret = ForkingAsyncTurret()
+        families = asyncio.run(turret.gatherAllAsync())
+        self.assertEqual(len(families), 1)
+        labels = {"turret": "ForkingAsyncTurret", "file": ""}
+        self.assertEqual(getValue(
+            TURRET_STATS, "glados_turret_subprocess_forks_total", **labels
+        ), 1)
+        self.assertEqual(
+            getValue(TURRET_STATS, "glados_turret_samples", **labels), 1
+        )
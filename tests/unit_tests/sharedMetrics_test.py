@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+""" Test shared-memory metrics and the SharedMemoryTurret. """
+
+import math
+import multiprocessing
+import os
+import time
+import unittest as ut
+from multiprocessing import shared_memory
+
+from glados.sharedMetrics import SharedMetricsProducer
+from glados.turrets.SharedMemoryTurret import SharedMemoryTurret
+
+#-------------------------------------------------------------------------------
+def reportLoss(segmentName, loss, close):
+    """ Report a loss from a worker process. """
+    producer = SharedMetricsProducer(segmentName)
+    producer.set(producer.register("train_loss", {"job": "a"}, "max"), loss)
+    producer.set(producer.register("samples", {"job": "a"}), 100)
+    if close:
+        producer.close()
+
+#-------------------------------------------------------------------------------
+class TestSharedMetrics(ut.TestCase):
+    """ Test SharedMetricsProducer and SharedMemoryTurret. """
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.segmentName = f"glados_test_{os.getpid()}"
+        SharedMemoryTurret.maxWorkers = 8
+        SharedMemoryTurret.maxSeries = 16
+        SharedMemoryTurret.workerTimeout = 0.5
+        SharedMetricsProducer.heartbeatInterval = 0.05
+        self.turret = SharedMemoryTurret(self.segmentName)
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        del SharedMemoryTurret.maxWorkers, SharedMemoryTurret.maxSeries
+        del SharedMemoryTurret.workerTimeout
+        del SharedMetricsProducer.heartbeatInterval
+        self.turret.close()
+
+    #---------------------------------------------------------------------------
+    def values(self):
+        """ Collect {(name, job): value}. """
+        return {(m.name, s.labels["job"]): s.value
+                for m in self.turret.collect() for s in m.samples}
+
+    #---------------------------------------------------------------------------
+    def testAggregation(self):
+        """ Workers' values are summed, maxed or the latest taken. """
+        workers = [SharedMetricsProducer(self.segmentName) for _ in range(3)]
+        for i, worker in enumerate(workers):
+            worker.set(worker.register("samples", {"job": "a"}), 10 * (i + 1))
+            worker.set(worker.register("train_loss", {"job": "a"}, "max"), i)
+            worker.set(worker.register("step", {"job": "a"}, "last"), 5 - i)
+        # The first registration decides how a series is combined.
+        self.assertEqual(workers[0].register("samples", {"job": "a"}, "max"),
+                         workers[2].register("samples", {"job": "a"}))
+        workers[1].register("unset", {"job": "a"})
+
+        self.assertEqual(self.values(), {
+            ("samples", "a"): 60.0, ("train_loss", "a"): 2.0,
+            ("step", "a"): 3.0,
+        })
+
+        workers[2].close()
+        self.assertEqual(self.values()[("samples", "a")], 30.0)
+        for worker in workers[:2]:
+            worker.close()
+        self.assertEqual(self.values(), {})
+
+    #---------------------------------------------------------------------------
+    def testWorkerProcesses(self):
+        """ Rows of workers which exit without closing are freed once their
+        heartbeat stops.
+        """
+        context = multiprocessing.get_context("spawn")
+        for loss, close in ((0.5, True), (0.25, False)):
+            process = context.Process(
+                target=reportLoss, args=(self.segmentName, loss, close)
+            )
+            process.start()
+            process.join(30)
+        self.assertEqual(self.values(), {("train_loss", "a"): 0.25,
+                                         ("samples", "a"): 100.0})
+        time.sleep(0.6)
+        self.assertEqual(self.values(), {})
+        self.assertFalse(self.turret.segment.pids.any())
+        self.assertTrue(math.isnan(self.turret.segment.values[0, 0]))
+
+        worker = SharedMetricsProducer(self.segmentName)
+        worker.set(worker.register("train_loss", {"job": "a"}), 0.125)
+        self.assertEqual(self.values(), {("train_loss", "a"): 0.125})
+        worker.close()
+
+    #---------------------------------------------------------------------------
+    def testHeartbeat(self):
+        """ Idle workers stay alive through their heartbeat. """
+        worker = SharedMetricsProducer(self.segmentName)
+        worker.set(worker.register("samples", {"job": "a"}), 1)
+        time.sleep(1.0)
+        self.assertEqual(self.values(), {("samples", "a"): 1.0})
+        worker.close()
+
+    #---------------------------------------------------------------------------
+    def testRestart(self):
+        """ A restarted turret keeps the segment of running workers. """
+        worker = SharedMetricsProducer(self.segmentName)
+        worker.set(worker.register("samples", {"job": "a"}), 1)
+        # The old turret exits without removing the segment.
+        self.turret.segment.close()
+        self.turret = SharedMemoryTurret(self.segmentName)
+        self.assertEqual(self.values(), {("samples", "a"): 1.0})
+        worker.set(worker.register("samples", {"job": "a"}), 2)
+        self.assertEqual(self.values(), {("samples", "a"): 2.0})
+        worker.close()
+
+    #---------------------------------------------------------------------------
+    def testRestartResized(self):
+        """ A segment of another size or format is replaced. """
+        self.turret.segment.close()
+        SharedMemoryTurret.maxSeries = 32
+        self.turret = SharedMemoryTurret(self.segmentName)
+        self.assertEqual(self.turret.segment.maxSeries, 32)
+
+        self.turret.segment.close()
+        shm = shared_memory.SharedMemory(self.segmentName)
+        shm.buf[:8] = b"NOTGLDOS"
+        shm.close()
+        self.turret = SharedMemoryTurret(self.segmentName)
+        self.assertEqual(self.turret.segment.maxSeries, 32)
+        self.assertEqual(self.values(), {})
+
+    #---------------------------------------------------------------------------
+    def testFull(self):
+        """ Producers beyond the size of the segment are refused. """
+        workers = [SharedMetricsProducer(self.segmentName) for _ in range(8)]
+        with self.assertRaises(ValueError):
+            SharedMetricsProducer(self.segmentName)
+        for i in range(16):
+            workers[0].register("metric", {"job": str(i)})
+        with self.assertRaises(ValueError):
+            workers[0].register("metric", {"job": "full"})
+        for worker in workers:
+            worker.close()
@@ -1,16 +1,32 @@
 #!/usr/bin/env python3
 """ Test file based turrets for glados. """
 
+import asyncio
 import math
+import os
 import os.path as op
 from os.path import dirname as opd, join as opj
+import shutil
+import tempfile
+import time
 import unittest as ut
+from unittest import mock
 import sys
 
+from prometheus_client.exposition import generate_latest
 from prometheus_client.metrics_core import GaugeMetricFamily
+from prometheus_client.registry import CollectorRegistry
 
 from glados import turrets
-from glados.turrets.NvidiaGpuTurret import getNvChunks
+from glados.bench import dfOutput
+from glados.core import applyTurretSettings, getScriptTurrets
+from glados.turrets.CsvTurret import CsvTurret, parseCsv
+from glados.turrets.HostRootTurret import HostRootTurret
+from glados.turrets.JsonLinesTurret import JsonLinesTurret
+from glados.turrets.ScriptTurret import ScriptTurret
+from glados.turrets.NvidiaGpuTurret import (
+    NvInfo, getNvChunks, parseNvQueryLine
+)
 
 #-------------------------------------------------------------------------------
 def sampleDebugger(sample):
@@ -78,6 +94,26 @@ class TestGoveeTurret(ut.TestCase):
         self.assertEqual(humidities, [44.2, 45.3, 47.0])
         self.assertEqual(temperatures, [24.0, 25.9, 31.6])
 
+    #---------------------------------------------------------------------------
+    def testTimestamps(self):
+        """ Samples are only at the date of the file when opted in. """
+        turret = self.turretFactory(self.testFileName)
+        metric = next(turret.collect())
+        self.assertEqual({s.timestamp for s in metric.samples}, {None})
+        registry = CollectorRegistry()
+        registry.register(turret)
+        for line in generate_latest(registry).decode().splitlines():
+            if not line.startswith("#"):
+                # Name with labels and the value, but no timestamp.
+                self.assertEqual(len(line.rsplit("} ", 1)[1].split()), 1)
+
+        turret = self.turretFactory(self.testFileName)
+        applyTurretSettings(
+            turret, {"JsonTurret": {"exportTimestamps": True}}
+        )
+        metric = next(turret.collect())
+        self.assertEqual({s.timestamp for s in metric.samples}, {1689646260.0})
+
 #-------------------------------------------------------------------------------
 class TestNvidiaFileTurret(ut.TestCase):
     #---------------------------------------------------------------------------
@@ -171,7 +207,564 @@ class TestNvidiaFileTurret(ut.TestCase):
 
         print(atDict)
 
-        self.assertDictEqual(self.gsDict, atDict)
+        # Values are compared one by one as NaN never equals a distinct NaN.
+        self.assertEqual(self.gsDict.keys(), atDict.keys())
+        for key, value in self.gsDict.items():
+            if math.isnan(value):
+                self.assertTrue(math.isnan(atDict[key]), key)
+            else:
+                self.assertEqual(value, atDict[key], key)
+
+    #---------------------------------------------------------------------------
+    def testProcesses(self):
+        """ Test the header and the processes section. """
+        with open(self.testFileName, "r") as finp:
+            nvInfo = NvInfo(finp.read())
+        self.assertEqual(nvInfo.driverVersion, "525.125.06")
+        self.assertEqual(nvInfo.cudaVersion, "12.0")
+        self.assertEqual(nvInfo.nGpus, 4)
+        self.assertEqual(nvInfo.migDevices, [])
+        self.assertEqual(
+            [(p.gpu, p.pid, p.name, p.memUse) for p in nvInfo.processes],
+            [(0, "1234", "/path/to/app1", 30.0),
+             (1, "1245", "/path/to/app2", 32.0),
+             (2, "1236", "/path/to/app3", 124.0)]
+        )
+
+        turret = self.turretFactory(self.testFileName, self.hostname)
+        families = list(turret.collect())
+        self.assertEqual(len(families), 2)
+        self.assertEqual(families[1].name, "gpu_processes_randomServer")
+        self.assertEqual(families[1].samples[2].labels, {
+            "host": "randomServer", "device": "device_2", "pid": "1236",
+            "process": "/path/to/app3"
+        })
+
+    #---------------------------------------------------------------------------
+    def testMig(self):
+        """ Test a GPU in MIG mode next to one which is not. """
+        testDataDir = opd(opd(self.testFileName))
+        with open(opj(testDataDir, "nvidiaSmiMig.txt"), "r") as finp:
+            nvInfo = NvInfo(finp.read())
+        self.assertEqual(nvInfo.driverVersion, "535.54.03")
+        self.assertEqual(nvInfo.cudaVersion, "12.2")
+        self.assertEqual(sorted(nvInfo.devs), [0, 1])
+        self.assertTrue(math.isnan(nvInfo.devs[0].usage))
+        self.assertEqual(nvInfo.devs[1].usage, 12.0)
+        self.assertEqual(nvInfo.devs[1].memUse, 2105.0)
+        self.assertEqual(
+            [(m.gpu, m.gi, m.ci, m.mig, m.memUse, m.memMax, m.sm)
+             for m in nvInfo.migDevices],
+            [(0, "1", "0", "0", 19.0, 20096.0, 42.0),
+             (0, "2", "0", "1", 19.0, 20096.0, 42.0)]
+        )
+        self.assertEqual(
+            [(p.gpu, p.gi, p.pid, p.type, p.name) for p in nvInfo.processes],
+            [(0, "1", "41234", "C", "python train.py"),
+             (1, "N/A", "51234", "C", "/usr/bin/app"),
+             (1, "N/A", "51235", "G", "Xorg")]
+        )
+        self.assertTrue(math.isnan(nvInfo.processes[2].memUse))
+
+    #---------------------------------------------------------------------------
+    def testGatherAsync(self):
+        """ Test that the async path yields the same samples. """
+        turret = self.turretFactory(self.testFileName, self.hostname)
+        allMetrics = asyncio.run(turret.gatherAsync())[0]
+        atDict = {}
+        for sample in allMetrics.samples:
+            key = tuple(v for _, v in sample.labels.items())
+            atDict[key] = sample.value
+        self.assertEqual(atDict.keys(), self.gsDict.keys())
+
+#-------------------------------------------------------------------------------
+class TestNvidiaStreamTurret(ut.TestCase):
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.hostname = "randomServer"
+        testDataDir = opj(opd(opd(op.realpath(__file__))), "data")
+        self.testFileName = opj(testDataDir, "nvidiaSmiQuery.csv")
+        self.turret = turrets.NvidiaGpuTurret.NvidiaGpuTurret("", self.hostname)
+        self.turret.streamInterval = 1
+        self.turret.timeout = 5
+        # Replay the recorded output and keep running like nvidia-smi -l.
+        self.turret.streamCommand = [
+            "sh", "-c", f"cat '{self.testFileName}'; exec sleep 60"
+        ]
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        if self.turret._stream:
+            self.turret._stream.stop()
+
+    #---------------------------------------------------------------------------
+    def testParseNvQueryLine(self):
+        """ Test parsing of a single query line. """
+        metrics = parseNvQueryLine(
+            "2, 7, 35, 24.00, 124, 8195, [N/A], 1980, 2, 0x0000000000000044"
+        )
+        self.assertEqual(metrics["index"], 2)
+        self.assertEqual(metrics["usage_pct"], 7.0)
+        self.assertEqual(metrics["sm_clock_mhz"], 1980.0)
+        self.assertEqual(metrics["ecc_uncorrected"], 2.0)
+        self.assertEqual(metrics["throttle_reasons"], 68.0)
+        self.assertTrue(math.isnan(metrics["fan_pct"]))
+        self.assertIsNone(parseNvQueryLine("No devices were found"))
+
+    #---------------------------------------------------------------------------
+    def testCollectionSpecifics(self):
+        """ Test that the latest streamed record of each device is used. """
+        metric = next(self.turret.collect())
+        for _ in range(100):
+            if self.turret._stream.records[1]["usage_pct"] == 5.0:
+                break
+            time.sleep(0.01)
+            metric = next(self.turret.collect())
+
+        atDict = {}
+        for sample in metric.samples:
+            atDict[(sample.labels["device"], sample.labels["metric"])] = \
+                sample.value
+        self.assertEqual(atDict[("device_0", "usage_pct")], 0.0)
+        self.assertEqual(atDict[("device_0", "temperature")], 38.0)
+        self.assertEqual(atDict[("device_0", "throttle_reasons")], 4.0)
+        self.assertEqual(atDict[("device_1", "power")], 20.0)
+        self.assertEqual(atDict[("device_1", "sm_clock_mhz")], 1410.0)
+        self.assertTrue(math.isnan(atDict[("device_1", "ecc_uncorrected")]))
+
+    #---------------------------------------------------------------------------
+    def testRestart(self):
+        """ An exited stream is restarted after a delay with no old records. """
+        self.turret.streamCommand = ["cat", self.testFileName]
+        next(self.turret.collect())
+        stream = self.turret._stream
+        for _ in range(100):
+            if not stream.alive:
+                break
+            time.sleep(0.01)
+        with self.assertRaisesRegex(RuntimeError, "restarting in"):
+            next(self.turret.collect())
+
+        stream.cmd = ["sleep", "60"]
+        stream._restartAt = 0.0
+        self.turret.timeout = 0.1
+        with self.assertRaisesRegex(RuntimeError, "No nvidia-smi records"):
+            next(self.turret.collect())
+        self.assertEqual(stream.records, {})
+        self.assertEqual(stream.restarts, 1)
+        self.assertGreater(stream.restartIn, 1.0)
+
+#-------------------------------------------------------------------------------
+class TestJsonLinesTurret(ut.TestCase):
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.testFileName = opj(self.tmpDir, "sensors.jsonl")
+        self.append(
+            '{"name": "govee_sensors", "description": "Govee metrics.", '
+            '"labels": ["location", "metric"]}\n'
+            '[["room123", "temp"], 24.0]\n'
+            '{"labels": ["room345", "temp"], "value": 25.9}\n'
+        )
+        self.turret = JsonLinesTurret(self.testFileName)
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        self.turret.close()
+        shutil.rmtree(self.tmpDir)
+
+    #---------------------------------------------------------------------------
+    def append(self, text, fileName=""):
+        """ Append text to the tailed file. """
+        with open(fileName or self.testFileName, "a", encoding="UTF-8") as fout:
+            fout.write(text)
+
+    #---------------------------------------------------------------------------
+    def values(self):
+        """ Collect {(location, metric): value}. """
+        metric = next(self.turret.collect())
+        return {(s.labels["location"], s.labels["metric"]): s.value
+                for s in metric.samples}
+
+    #---------------------------------------------------------------------------
+    def testCollectionSpecifics(self):
+        """ Both sample formats are read and the latest value wins. """
+        self.assertEqual(self.values(), {("room123", "temp"): 24.0,
+                                         ("room345", "temp"): 25.9})
+        self.append('[["room123", "temp"], 26.5]\nnot json\n')
+        self.assertEqual(self.values(), {("room123", "temp"): 26.5,
+                                         ("room345", "temp"): 25.9})
+        self.assertEqual(self.turret.badLines, 1)
+
+    #---------------------------------------------------------------------------
+    def testTimestamps(self):
+        """ Samples may carry their own timestamps when opted in. """
+        self.append('[["room123", "temp"], 26.5, 1689646260]\n')
+        metric = next(self.turret.collect())
+        self.assertEqual({s.timestamp for s in metric.samples}, {None})
+
+        self.turret.exportTimestamps = True
+        self.append('[["room123", "temp"], 26.5, 1689646260]\n'
+                    '{"labels": ["room345", "temp"], "value": 1, '
+                    '"timestamp": "2023-07-18 02:11:00 UTC"}\n')
+        metric = next(self.turret.collect())
+        self.assertEqual({s.timestamp for s in metric.samples}, {1689646260.0})
+
+    #---------------------------------------------------------------------------
+    def testTimestampSettings(self):
+        """ Lines read before the settings are applied are read again. """
+        self.append('[["room123", "temp"], 26.5, 1689646260]\n'
+                    '[["room345", "temp"], 26.5, 1689646260]\n')
+        turret = JsonLinesTurret(self.testFileName)
+        applyTurretSettings(
+            turret, {"JsonLinesTurret": {"exportTimestamps": True}}
+        )
+        metric = next(turret.collect())
+        turret.close()
+        self.assertEqual({s.timestamp for s in metric.samples}, {1689646260.0})
+        self.assertEqual(len(metric.samples), 2)
+
+    #---------------------------------------------------------------------------
+    def testPartialLine(self):
+        """ A line is only parsed once it is complete. """
+        self.append('[["room678", "temp"], 3')
+        self.assertNotIn(("room678", "temp"), self.values())
+        self.append('1.6]\n')
+        self.assertEqual(self.values()[("room678", "temp")], 31.6)
+
+    #---------------------------------------------------------------------------
+    def testTruncation(self):
+        """ A truncated file is read again from the start. """
+        with open(self.testFileName, "w", encoding="UTF-8") as fout:
+            fout.write('[["room123", "temp"], 1.0]\n')
+        self.assertEqual(self.values()[("room123", "temp")], 1.0)
+
+    #---------------------------------------------------------------------------
+    def testRotation(self):
+        """ The old file is finished before the new one is followed. """
+        self.append('[["room123", "temp"], 2.0]\n')
+        os.rename(self.testFileName, self.testFileName + ".1")
+        self.append('[["room345", "temp"], 3.0]\n')
+        self.assertEqual(self.values(), {("room123", "temp"): 2.0,
+                                         ("room345", "temp"): 3.0})
+
+    #---------------------------------------------------------------------------
+    def testSnapshot(self):
+        """ A line with "metrics" replaces all series. """
+        self.append('{"name": "govee_sensors", "labels": ["location", '
+                    '"metric"], "metrics": [[["room678", "temp"], 5.0]]}\n')
+        self.assertEqual(self.values(), {("room678", "temp"): 5.0})
+
+#-------------------------------------------------------------------------------
+class TestCsvTurret(ut.TestCase):
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.testFileName = opj(self.tmpDir, "capacity.csv")
+        self.write('host,mount,size,used\n'
+                   'node01,/scratch,100,40\n'
+                   'node02,"/data, old",200,50.5\n')
+        self.turret = CsvTurret(self.testFileName)
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    #---------------------------------------------------------------------------
+    def write(self, text):
+        """ Replace the CSV file, changing its modification time. """
+        with open(self.testFileName, "w", encoding="UTF-8") as fout:
+            fout.write(text)
+        stat = os.stat(self.testFileName)
+        os.utime(self.testFileName, ns=(stat.st_atime_ns,
+                                        stat.st_mtime_ns + 10 ** 9))
+
+    #---------------------------------------------------------------------------
+    def values(self):
+        """ Collect {(host, mount, metric): value}. """
+        metric = next(self.turret.collect())
+        return {(s.labels["host"], s.labels["mount"], s.labels["metric"]):
+                s.value for s in metric.samples}
+
+    #---------------------------------------------------------------------------
+    def testCollectionSpecifics(self):
+        """ Every value column is a series per row. """
+        metric = next(self.turret.collect())
+        self.assertEqual(metric.name, "capacity")
+        self.assertEqual(self.values(), {
+            ("node01", "/scratch", "size"): 100.0,
+            ("node02", "/data, old", "size"): 200.0,
+            ("node01", "/scratch", "used"): 40.0,
+            ("node02", "/data, old", "used"): 50.5,
+        })
+
+    #---------------------------------------------------------------------------
+    def testReload(self):
+        """ The file is only parsed again once it changes, and unchanged
+        labels are reused.
+        """
+        # Named, so that a value which is not a number does not turn its
+        # column into labels.
+        self.turret.labelColumns = ["host", "mount"]
+        self.turret.acquire()
+        table = self.turret.table
+        labelDicts = self.turret._labelDicts
+        self.turret.acquire()
+        self.assertIs(self.turret.table, table)
+
+        self.write('host,mount,size,used\n'
+                   'node01,/scratch,100,41\n'
+                   'node02,"/data, old",200,bad\n')
+        values = self.values()
+        self.assertIsNot(self.turret.table, table)
+        self.assertIs(self.turret._labelDicts, labelDicts)
+        self.assertEqual(values[("node01", "/scratch", "used")], 41.0)
+        self.assertTrue(math.isnan(values[("node02", "/data, old", "used")]))
+
+        self.write('host,mount,size,used\nnode03,/home,1,2\n')
+        self.assertEqual(set(self.values()), {("node03", "/home", "size"),
+                                              ("node03", "/home", "used")})
+
+    #---------------------------------------------------------------------------
+    def testLabelColumns(self):
+        """ Label columns may be numbers if named explicitly. """
+        table = parseCsv("rack,host,temp\n1,n1,30\n2,n2,31\n", ["rack", "host"])
+        self.assertEqual(table.labelNames, ["rack", "host"])
+        self.assertEqual(table.labels.tolist(), [["1", "n1"], ["2", "n2"]])
+        self.assertEqual(table.values.tolist(), [[30.0], [31.0]])
+        with self.assertRaises(ValueError):
+            parseCsv("rack,temp\n1,30\n", ["host"])
+        # Without rows there is nothing to tell label columns by.
+        self.assertEqual(parseCsv("host,temp\n").values.shape, (0, 2))
+
+    #---------------------------------------------------------------------------
+    def testInferredLabelColumns(self):
+        """ Label columns are inferred from every row, not just the first. """
+        text = "node,host,temp\n001,1,30\n002,n2,\n"
+        table = parseCsv(text)
+        self.assertEqual(table.labelNames, ["host"])
+        # Labels which all look like numbers are values unless named.
+        self.assertEqual(table.valueNames, ["node", "temp"])
+        self.assertEqual(table.values[:, 0].tolist(), [1.0, 2.0])
+
+        self.write(text)
+        applyTurretSettings(
+            self.turret, {"capacity.csv": {"labelColumns": ["node", "host"]}}
+        )
+        metric = next(self.turret.collect())
+        self.assertEqual(
+            {(s.labels["node"], s.labels["metric"]) for s in metric.samples},
+            {("001", "temp"), ("002", "temp")}
+        )
+
+#-------------------------------------------------------------------------------
+class TestScriptTurret(ut.TestCase):
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.turret = None
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        if self.turret is not None:
+            self.turret.close()
+        shutil.rmtree(self.tmpDir)
+
+    #---------------------------------------------------------------------------
+    def script(self, body, name="emitter.py"):
+        """ Write an executable python script. """
+        fileName = opj(self.tmpDir, name)
+        with open(fileName, "w", encoding="UTF-8") as fout:
+            fout.write(f"#!{sys.executable}\nimport json, sys, time\n{body}")
+        os.chmod(fileName, 0o755)
+        return fileName
+
+    #---------------------------------------------------------------------------
+    def waitFor(self, condition, timeout=10.0):
+        """ Acquire until condition() holds. """
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.02)
+            self.turret.acquire()
+
+    #---------------------------------------------------------------------------
+    def values(self):
+        """ {room: value} of the gauge, if any. """
+        if self.turret.store is None:
+            return {}
+        return {s.labels["room"]: s.value
+                for s in self.turret.store.family().samples}
+
+    #---------------------------------------------------------------------------
+    def testSnapshots(self):
+        """ Every line the warm script prints replaces the last. """
+        self.turret = ScriptTurret(self.script(
+            "for i in range(1000):\n"
+            "    print(json.dumps({'name': 'room_temp', 'labels': ['room'],"
+            " 'metrics': [[[f'room{i}'], i]]}), flush=True)\n"
+            "    time.sleep(0.01)\n"
+            "time.sleep(60)\n"
+        ))
+        pid = self.turret.pid
+        self.waitFor(lambda: len(self.values()) == 1
+                     and list(self.values().values())[0] >= 3)
+        self.assertEqual(len(self.values()), 1)
+        self.assertEqual(self.turret.pid, pid)
+        self.assertEqual(self.turret.restarts, 0)
+
+    #---------------------------------------------------------------------------
+    def testRestart(self):
+        """ A script which exits is restarted with a growing delay. """
+        self.turret = ScriptTurret(self.script(
+            "print(json.dumps({'name': 'room_temp', 'labels': ['room']}))\n"
+            "print(json.dumps([['room1'], 1.0]))\n"
+            "print('not json')\n"
+            "sys.exit(1)\n"
+        ))
+        self.turret.restartDelay = 0.05
+        self.waitFor(lambda: self.turret.restarts >= 3)
+        self.assertEqual(self.values(), {"room1": 1.0})
+        self.assertGreaterEqual(self.turret.badLines, 2)
+        # The delays so far were 0.05, 0.1 and 0.2 seconds.
+        self.assertGreater(self.turret._restartAt - time.monotonic(), 0.1)
+
+    #---------------------------------------------------------------------------
+    def testBackpressure(self):
+        """ Only maxReadBytes are read per acquire; the script waits. """
+        self.turret = ScriptTurret(self.script(
+            "print(json.dumps({'name': 'room_temp', 'labels': ['room']}))\n"
+            "for i in range(10 ** 6):\n"
+            "    print(json.dumps([['room1'], i]))\n"
+        ))
+        self.turret.maxReadBytes = 4096
+        self.turret.acquire()
+        time.sleep(0.2)
+        self.turret.acquire()
+        self.assertLess(self.values()["room1"], 1000)
+        self.assertIsNone(self.turret._proc.poll())
+
+    #---------------------------------------------------------------------------
+    def testLimits(self):
+        """ A script over its CPU cap is killed; memory is capped. """
+        self.turret = ScriptTurret(self.script("while True:\n    pass\n"))
+        self.turret.maxMemoryMB = 512
+        self.turret.maxCpuPercent = 20
+        self.turret.restartDelay = 60.0
+        self.turret.acquire()
+        with open(f"/proc/{self.turret.pid}/limits", encoding="UTF-8") as finp:
+            self.assertIn(str(512 << 20), finp.read())
+        self.waitFor(lambda: self.turret.restarts == 1)
+        self.assertIsNone(self.turret.pid)
+
+    #---------------------------------------------------------------------------
+    def testLimitsAtStart(self):
+        """ The script runs limited from its first instruction. """
+        script = self.script(
+            "import os, resource\n"
+            "print(json.dumps({'name': 'limits', 'labels': ['room']}))\n"
+            "print(json.dumps([['mem'], resource.getrlimit("
+            "resource.RLIMIT_AS)[0]]))\n"
+            "print(json.dumps([['nice'], os.nice(0)]), flush=True)\n"
+            "time.sleep(60)\n"
+        )
+        with mock.patch.object(ScriptTurret, "maxMemoryMB", 512), \
+                mock.patch.object(ScriptTurret, "niceness", 7):
+            self.turret = ScriptTurret(script)
+            self.waitFor(lambda: len(self.values()) == 2)
+        self.assertEqual(self.values(), {"mem": float(512 << 20), "nice": 7.0})
+
+    #---------------------------------------------------------------------------
+    def testGetScriptTurrets(self):
+        """ Only executable, visible files are run. """
+        self.script("time.sleep(60)\n")
+        self.script("time.sleep(60)\n", ".hidden.py")
+        with open(opj(self.tmpDir, "README"), "w", encoding="UTF-8") as fout:
+            fout.write("Not a script.")
+        scriptTurrets = getScriptTurrets([self.tmpDir, opj(self.tmpDir, "no")])
+        try:
+            self.assertEqual([t.fileName for t in scriptTurrets],
+                             [opj(self.tmpDir, "emitter.py")])
+        finally:
+            for turret in scriptTurrets:
+                turret.close()
+
+#-------------------------------------------------------------------------------
+class TestHostRootTurret(ut.TestCase):
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.nvidiaFile = opj(opd(opd(op.realpath(__file__))), "data",
+                              "randomServer", "NvidiaGpu.turret")
+        for host in ("node01", "node02"):
+            self.addHost(host)
+        os.makedirs(opj(self.root, ".snapshot", "node09"))
+        self.turret = HostRootTurret(self.root)
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        self.turret.close()
+        shutil.rmtree(self.root)
+
+    #---------------------------------------------------------------------------
+    def addHost(self, host, nMounts=2):
+        """ Write the turret files of a host. """
+        os.makedirs(opj(self.root, host), exist_ok=True)
+        shutil.copy(self.nvidiaFile, opj(self.root, host, "NvidiaGpu.turret"))
+        with open(opj(self.root, host, "Storage.turret"), "w",
+                  encoding="UTF-8") as fout:
+            fout.write(dfOutput(nMounts))
+        with open(opj(self.root, host, "Unknown.turret"), "w",
+                  encoding="UTF-8") as fout:
+            fout.write("Unknown")
+
+    #---------------------------------------------------------------------------
+    def families(self):
+        """ Collect {name: {host: number of samples}}. """
+        families = {}
+        for metric in self.turret.collect():
+            hosts = families.setdefault(metric.name, {})
+            for sample in metric.samples:
+                host = sample.labels["host"]
+                hosts[host] = hosts.get(host, 0) + 1
+        return families
+
+    #---------------------------------------------------------------------------
+    def testMerge(self):
+        """ Families of the same name are merged across hosts. """
+        families = self.families()
+        self.assertEqual(families["storage_usage"], {"node01": 4, "node02": 4})
+        self.assertEqual(families["gpu_metrics_node01"], {"node01": 20})
+        self.assertEqual(families["gpu_metrics_node02"], {"node02": 20})
+        self.assertEqual(self.turret.hosts, 2)
+
+    #---------------------------------------------------------------------------
+    def testChanges(self):
+        """ Only changed files are parsed; hosts come and go. """
+        parsed = dict(self.turret._parsed)
+        self.addHost("node03")
+        with open(opj(self.root, "node01", "Storage.turret"), "w",
+                  encoding="UTF-8") as fout:
+            fout.write(dfOutput(3))
+        shutil.rmtree(opj(self.root, "node02"))
+
+        families = self.families()
+        self.assertEqual(families["storage_usage"], {"node01": 6, "node03": 4})
+        self.assertNotIn("gpu_metrics_node02", families)
+        nvidiaFile = opj(self.root, "node01", "NvidiaGpu.turret")
+        self.assertIs(self.turret._parsed[nvidiaFile], parsed[nvidiaFile])
+
+    #---------------------------------------------------------------------------
+    def testPool(self):
+        """ Many changed files are parsed in a pool of processes. """
+        for i in range(3, 8):
+            self.addHost(f"node{i:02d}")
+        self.turret.minPoolFiles = 4
+        self.turret.chunkSize = 3
+        families = self.families()
+        self.assertIsNotNone(self.turret._executor)
+        self.assertEqual(len(families["storage_usage"]), 7)
+        self.assertIn("gpu_metrics_node07", families)
 
 #-------------------------------------------------------------------------------
 class TestNegativesFileTurret(ut.TestCase):
@@ -1,8 +1,20 @@
 #!/usr/bin/env python3
 """ Test basic utilities for glados. """
 
+import asyncio
+import os
+import os.path as op
+from os.path import dirname as opd, join as opj
+import shutil
+import tempfile
+import threading
+import time
 import unittest as ut
+from unittest import mock
 from glados import turrets
+from glados.turrets.StorageTurret import parseMountInfo
+from glados.turrets.CpuStatsTurret import parseCpuInfoSpeeds
+from glados.turrets.CpuUtilTurret import parseProcStat
 
 from prometheus_client.metrics_core import GaugeMetricFamily
 
@@ -65,6 +77,87 @@ class TestCpuStatsTurret(ut.TestCase):
         self.assertLess(0.0, min(speeds))
         self.assertGreater(10.0, max(speeds))
 
+#-------------------------------------------------------------------------------
+class TestFixtureCpuStatsTurret(ut.TestCase):
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.root = opj(opd(opd(op.realpath(__file__))), "data", "procRoot")
+        self.turret = turrets.CpuStatsTurret.CpuStatsTurret(self.root)
+
+    #---------------------------------------------------------------------------
+    def getSpeeds(self):
+        """ Collect and return (vcore, GHz) tuples. """
+        return [(s.labels["vcore"], s.value)
+                for s in next(self.turret.collect()).samples]
+
+    #---------------------------------------------------------------------------
+    def testParseCpuInfoSpeeds(self):
+        """ Test parsing of cpu MHz lines. """
+        cpuInfo = "processor\t: 7\ncpu MHz\t\t: 1500.5\n\n"
+        self.assertEqual(parseCpuInfoSpeeds(cpuInfo), [("7", 1.5005)])
+
+    #---------------------------------------------------------------------------
+    def testCpuInfo(self):
+        """ Test speeds from the fixture /proc/cpuinfo. """
+        self.assertEqual(self.getSpeeds(), [("0", 2.2), ("1", 3.1005)])
+
+    #---------------------------------------------------------------------------
+    def testCpuFreq(self):
+        """ Test speeds from the fixture sysfs cpufreq files. """
+        self.turret.source = "cpufreq"
+        self.assertEqual(self.getSpeeds(),
+                         [("0", 2.2), ("1", 3.1005), ("10", 1.0)])
+
+#-------------------------------------------------------------------------------
+class TestCpuUtilTurret(ut.TestCase):
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        fixtureRoot = opj(opd(opd(op.realpath(__file__))), "data", "procRoot")
+        self.root = tempfile.mkdtemp()
+        os.mkdir(opj(self.root, "proc"))
+        self.statFile = opj(self.root, "proc", "stat")
+        shutil.copy(opj(fixtureRoot, "proc", "stat"), self.statFile)
+        self.turret = turrets.CpuUtilTurret.CpuUtilTurret(self.root)
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    #---------------------------------------------------------------------------
+    def getUsages(self):
+        """ Collect and return vcore -> utilization. """
+        return {s.labels["vcore"]: s.value
+                for s in next(self.turret.collect()).samples}
+
+    #---------------------------------------------------------------------------
+    def testParseProcStat(self):
+        """ Test parsing of cpu lines. """
+        with open(self.statFile, "r", encoding="UTF-8") as finp:
+            jiffies = parseProcStat(finp.read())
+        self.assertEqual(jiffies, {"all": (400, 1000), "0": (250, 500),
+                                   "1": (150, 500)})
+
+    #---------------------------------------------------------------------------
+    def testIncrementalUsage(self):
+        """ Utilization is computed from the change between collections. """
+        self.assertEqual(self.getUsages(), {"all": 40.0, "0": 50.0, "1": 30.0})
+        with open(self.statFile, "w", encoding="UTF-8") as fout:
+            fout.write("cpu  400 0 100 600 100 0 0 0 0 0\n"
+                       "cpu0 300 0 50 200 50 0 0 0 0 0\n"
+                       "cpu1 100 0 50 400 50 0 0 0 0 0\n")
+        self.assertEqual(self.getUsages(), {"all": 50.0, "0": 100.0, "1": 0.0})
+        self.assertEqual(self.getUsages(), {"all": 0.0, "0": 0.0, "1": 0.0})
+
+    #---------------------------------------------------------------------------
+    def testNativeCollection(self):
+        """ Test collection from the real /proc/stat. """
+        turret = turrets.CpuUtilTurret.CpuUtilTurret()
+        for _ in range(2):
+            usages = {s.labels["vcore"]: s.value
+                      for s in next(turret.collect()).samples}
+            self.assertIn("all", usages)
+            self.assertTrue(all(0.0 <= u <= 100.0 for u in usages.values()))
+
 #-------------------------------------------------------------------------------
 class TestStorageUsageTurret(ut.TestCase):
     #---------------------------------------------------------------------------
@@ -113,3 +206,114 @@ class TestStorageUsageTurret(ut.TestCase):
         self.assertTrue(all("/" in mnt for mnt in mnts))
         self.assertTrue(all(float(pct) < 100. for pct in pcts))
         self.assertTrue(all(float(avail) > 0. for avail in avails))
+
+    #---------------------------------------------------------------------------
+    def testGatherAsync(self):
+        """ Test that df is read without blocking the event loop. """
+        turret = self.turretFactory()
+        metric = asyncio.run(turret.gatherAsync())[0]
+        self.assertEqual(metric.type, "gauge")
+        mnts = set(sample.labels["mnt"] for sample in metric.samples)
+        self.assertIn("/", mnts)
+
+#-------------------------------------------------------------------------------
+class TestStatVfsStorageUsageTurret(ut.TestCase):
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        testDataDir = opj(opd(opd(op.realpath(__file__))), "data")
+        self.mountInfoFile = opj(testDataDir, "mountinfo")
+        self.turret = turrets.StorageTurret.StorageUsageTurret()
+        self.turret.backend = "statvfs"
+        self.turret.mountInfoFile = self.mountInfoFile
+
+    #---------------------------------------------------------------------------
+    def getMounts(self):
+        """ Collect and return the set of mounts reported. """
+        metric = next(self.turret.collect())
+        for sample in metric.samples:
+            self.assertEqual(sorted(sample.labels.keys()),
+                             ["host", "metric", "mnt"])
+        return set(sample.labels["mnt"] for sample in metric.samples)
+
+    #---------------------------------------------------------------------------
+    def testParseMountInfo(self):
+        """ Test parsing of mountinfo including escaped mount points. """
+        with open(self.mountInfoFile, "r", encoding="UTF-8") as finp:
+            mounts = parseMountInfo(finp.read())
+        self.assertEqual(mounts["/"], "ext4")
+        self.assertEqual(mounts["/mnt/my data"], "ext4")
+        self.assertEqual(mounts["/mnt/nfs"], "nfs4")
+        self.assertEqual(mounts["/proc"], "proc")
+
+    #---------------------------------------------------------------------------
+    def testDefaultBackend(self):
+        """ Test that statvfs is used natively and df for files. """
+        self.assertEqual(turrets.StorageTurret.StorageUsageTurret()._backend(),
+                         "statvfs")
+
+    #---------------------------------------------------------------------------
+    def testCollectionSpecifics(self):
+        """ Pseudo and missing filesystems are skipped. """
+        mnts = self.getMounts()
+        self.assertIn("/", mnts)
+        self.assertNotIn("/proc", mnts)
+        self.assertNotIn("/mnt/my data", mnts)
+
+    #---------------------------------------------------------------------------
+    def testIncludeFsTypes(self):
+        """ Only included filesystem types are reported. """
+        self.turret.includeFsTypes = ["tmpfs"]
+        self.assertEqual(self.getMounts(), {"/dev/shm"})
+
+    #---------------------------------------------------------------------------
+    def testHungNetworkMount(self):
+        """ A network mount whose statvfs hangs is skipped. """
+        realStatVfs = os.statvfs
+        def slowStatVfs(mnt):
+            if mnt == "/mnt/nfs":
+                time.sleep(0.5)
+                return realStatVfs("/")
+            return realStatVfs(mnt)
+
+        self.turret.mountTimeout = 0.05
+        with mock.patch("os.statvfs", slowStatVfs):
+            self.assertNotIn("/mnt/nfs", self.getMounts())
+            self.assertIn("/mnt/nfs", self.turret._hungMounts)
+            # Skipped without waiting while it is still hung.
+            start = time.time()
+            self.assertNotIn("/mnt/nfs", self.getMounts())
+            self.assertLess(time.time() - start, 0.05)
+            time.sleep(0.6)
+            self.turret.mountTimeout = 1.0
+            self.assertIn("/mnt/nfs", self.getMounts())
+
+    #---------------------------------------------------------------------------
+    def testManyHungNetworkMounts(self):
+        """ Hung network mounts neither delay nor drop healthy ones. """
+        tmpDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpDir)
+        mnts = [f"/hung{i}" for i in range(6)] + ["/healthy"]
+        mountInfo = opj(tmpDir, "mountinfo")
+        with open(mountInfo, "w", encoding="UTF-8") as fout:
+            for i, mnt in enumerate(mnts):
+                fout.write(f"{i + 30} 1 0:{i + 50} / {mnt} rw - nfs "
+                           f"server:{mnt} rw\n")
+        self.turret.mountInfoFile = mountInfo
+        self.turret.mountTimeout = 0.2
+
+        realStatVfs = os.statvfs
+        release = threading.Event()
+        def hangingStatVfs(mnt):
+            if mnt.startswith("/hung"):
+                release.wait(5)
+            return realStatVfs("/")
+
+        with mock.patch("os.statvfs", hangingStatVfs):
+            try:
+                for _ in range(2):
+                    start = time.time()
+                    self.assertEqual(self.getMounts(), {"/healthy"})
+                    self.assertLess(time.time() - start, 0.5)
+                self.assertEqual(self.turret._hungMounts, set(mnts[:-1]))
+            finally:
+                release.set()
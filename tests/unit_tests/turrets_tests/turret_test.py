@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 """ Test basic utilities for glados. """
 
+from importlib import import_module
+import pkgutil
 import unittest as ut
 from collections.abc import Generator
 
+from glados import turrets
 from glados.turrets.Turret import Turret
 
 #-------------------------------------------------------------------------------
@@ -29,3 +32,28 @@ class TestTurret(ut.TestCase):
         self.assertIsInstance(collector, Generator)
         with self.assertRaises(NotImplementedError):
             yield collector
+
+#-------------------------------------------------------------------------------
+class TestTurretManifest(ut.TestCase):
+    """ Test that TURRET_MANIFEST lists every turret. """
+    #---------------------------------------------------------------------------
+    def testManifestMatchesModules(self):
+        """ Every *Turret class in a turret module is in the manifest. """
+        found = {}
+        for _, moduleName, _ in pkgutil.iter_modules(turrets.__path__):
+            module = import_module(f"glados.turrets.{moduleName}")
+            for name, obj in vars(module).items():
+                if (isinstance(obj, type) and issubclass(obj, Turret)
+                        and obj is not Turret
+                        and obj.__module__ == module.__name__):
+                    found[name] = moduleName
+        manifest = {n: m for n, (m, _) in turrets.TURRET_MANIFEST.items()}
+        self.assertDictEqual(found, manifest)
+
+    #---------------------------------------------------------------------------
+    def testLoadTurretClass(self):
+        """ Turret classes and modules are loaded on demand. """
+        turretClass = turrets.loadTurretClass("CpuUtilTurret")
+        self.assertIs(turretClass, turrets.CpuUtilTurret.CpuUtilTurret)
+        with self.assertRaises(AttributeError):
+            _ = turrets.NotATurret
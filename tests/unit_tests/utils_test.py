@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 """ Test basic utilities for glados. """
 
+import asyncio
 import math
 import os.path as op
+import time
 import unittest as ut
 
 from glados import utils
@@ -22,6 +24,24 @@ class TestStrToFloat(ut.TestCase):
             else:
                 self.assertEqual(gsValue, atValue)
 
+#-------------------------------------------------------------------------------
+class TestParseTimestamp(ut.TestCase):
+    """Test invocations of parseTimestamp."""
+    #---------------------------------------------------------------------------
+    def testTimestamps(self):
+        """Test numbers, strings and dates."""
+        for value in [1689646260, 1689646260.0, "1689646260",
+                      "2023-07-18 02:11:00 UTC", "2023-07-18T02:11:00Z",
+                      "2023-07-18 04:11:00+02:00", "2023-07-18 02:11:00"]:
+            self.assertEqual(utils.parseTimestamp(value), 1689646260.0)
+
+    #---------------------------------------------------------------------------
+    def testInvalid(self):
+        """Test that invalid timestamps raise ValueError."""
+        for value in ["yesterday", None, True, [1]]:
+            with self.assertRaises(ValueError):
+                utils.parseTimestamp(value)
+
 #-------------------------------------------------------------------------------
 class TestGetParamsFromConfig(ut.TestCase):
     """ Test invocations of TestGetParamsFromConfig function. """
@@ -32,7 +52,16 @@ class TestGetParamsFromConfig(ut.TestCase):
     #---------------------------------------------------------------------------
     def testNoConfig(self):
         """Test default options from no file input."""
-        gsParams = { "sleepTime": 5, "FileTurrets": [], "JsonTurrets": [] }
+        gsParams = { "sleepTime": 5, "FileTurrets": [], "JsonTurrets": [],
+                     "JsonTurretDirs": [], "JsonLinesTurrets": [],
+                     "ScriptDirs": [], "CsvTurrets": [], "MmapTurrets": [],
+                    "SharedMemorySegments": [], "HostRoots": [],
+                     "Plugins": [], "PluginDirs": [], "PluginCache": "",
+                     "BackfillDir": "", "BackfillGap": 60,
+                     "BackfillRenders": 720, "Push": {},
+                     "ProfileDir": "", "ProfileSeconds": 30,
+                     "TurretSettings": {},
+                     "maxWorkers": 0, "runtime": "threads" }
         params = utils.getParamsFromConfig()
         self.assertDictEqual(params, gsParams)
 
@@ -40,12 +69,31 @@ class TestGetParamsFromConfig(ut.TestCase):
     def testConfig1(self):
         """Test that config1.json matches up."""
         gsParams = {"sleepTime": 5, "FileTurrets": [],
-                    "JsonTurrets": ["./unit_tests/data/goveeSensor.json"]}
+                    "JsonTurrets": ["./unit_tests/data/goveeSensor.json"],
+                    "JsonTurretDirs": [], "JsonLinesTurrets": [],
+                    "ScriptDirs": [], "CsvTurrets": [], "MmapTurrets": [],
+                    "SharedMemorySegments": [], "HostRoots": [],
+                    "Plugins": [], "PluginDirs": [], "PluginCache": "",
+                    "BackfillDir": "", "BackfillGap": 60,
+                    "BackfillRenders": 720, "Push": {},
+                    "ProfileDir": "", "ProfileSeconds": 30,
+                    "TurretSettings": {},
+                    "maxWorkers": 0, "runtime": "threads"}
         config = op.join(self.testDataDir, "config1.json")
         print(type(config), config)
         params = utils.getParamsFromConfig(config)
         self.assertDictEqual(params, gsParams)
 
+    #---------------------------------------------------------------------------
+    def testConfig4(self):
+        """Test that per-turret settings in config4.json are read."""
+        config = op.join(self.testDataDir, "config4.json")
+        params = utils.getParamsFromConfig(config)
+        settings = params["TurretSettings"]
+        self.assertEqual(settings["StorageUsageTurret"]["interval"], 60)
+        self.assertEqual(settings["StorageUsageTurret"]["maxStaleness"], 180)
+        self.assertEqual(settings["CpuStatsTurret"], {"interval": 1})
+
 #-------------------------------------------------------------------------------
 class TestRunCommand(ut.TestCase):
     """ Test invocations of runCommand function. """
@@ -71,6 +119,14 @@ class TestRunCommand(ut.TestCase):
         self.assertEqual(errStr, "")
         self.assertEqual(rCode, 0)
 
+    #---------------------------------------------------------------------------
+    def testCommandTimeout(self):
+        """ Assert that runCommand kills commands which exceed the timeout. """
+        outStr, errStr, rCode = utils.runCommand("sleep 5", timeout=0.1)
+        self.assertEqual(outStr, "")
+        self.assertIn("timed out", errStr)
+        self.assertEqual(rCode, 124)
+
     #---------------------------------------------------------------------------
     def testShellInjection(self):
         """ Ensure runCommmand is RCE proof. """
@@ -78,3 +134,46 @@ class TestRunCommand(ut.TestCase):
         self.assertEqual(outStr, "foo; touch RCEfailure\n")
         self.assertEqual(errStr, "")
         self.assertEqual(rCode, 0)
+
+#-------------------------------------------------------------------------------
+class TestRunCommandAsync(ut.TestCase):
+    """ Test invocations of runCommandAsync function. """
+    #---------------------------------------------------------------------------
+    def testCommandNotFound(self):
+        """ Assert that runCommandAsync fails on command not found. """
+        outStr, errStr, rCode = asyncio.run(utils.runCommandAsync("foo"))
+        self.assertEqual(outStr, "")
+        self.assertEqual(errStr, "Command foo not found")
+        self.assertEqual(rCode, 127)
+
+    #---------------------------------------------------------------------------
+    def testGoodCommand(self):
+        """ Test a good call to runCommandAsync. """
+        outStr, errStr, rCode = asyncio.run(
+            utils.runCommandAsync("echo hello; world")
+        )
+        self.assertEqual(outStr, "hello; world\n")
+        self.assertEqual(errStr, "")
+        self.assertEqual(rCode, 0)
+
+    #---------------------------------------------------------------------------
+    def testCommandTimeout(self):
+        """ Assert that runCommandAsync kills commands past the timeout. """
+        outStr, errStr, rCode = asyncio.run(
+            utils.runCommandAsync("sleep 5", timeout=0.1)
+        )
+        self.assertEqual(outStr, "")
+        self.assertIn("timed out", errStr)
+        self.assertEqual(rCode, 124)
+
+    #---------------------------------------------------------------------------
+    def testConcurrentCommands(self):
+        """ Many commands can be in flight at once. """
+        async def runAll():
+            return await asyncio.gather(
+                *(utils.runCommandAsync("sleep 0.3") for _ in range(20))
+            )
+        start = time.time()
+        results = asyncio.run(runAll())
+        self.assertLess(time.time() - start, 3.0)
+        self.assertTrue(all(r[-1] == 0 for r in results))
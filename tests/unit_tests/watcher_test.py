@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+""" Test watching directories for JSON turrets. """
+
+import json
+import os
+import os.path as op
+import shutil
+import tempfile
+import time
+import unittest as ut
+
+from prometheus_client.registry import CollectorRegistry
+
+from glados.watcher import JsonTurretWatcher
+
+#-------------------------------------------------------------------------------
+def waitFor(predicate, timeout=3.0):
+    """ Poll predicate until it is true or timeout passes. """
+    start = time.time()
+    while not predicate() and time.time() - start < timeout:
+        time.sleep(0.01)
+    return predicate()
+
+#-------------------------------------------------------------------------------
+class TestJsonTurretWatcher(ut.TestCase):
+    """ Test JsonTurretWatcher with inotify. """
+    usePoll = False
+
+    #---------------------------------------------------------------------------
+    def setUp(self):
+        self.spoolDir = tempfile.mkdtemp()
+        self.registry = CollectorRegistry()
+        self.watcher = JsonTurretWatcher(
+            [self.spoolDir], self.registry, pollInterval=0.05,
+            usePoll=self.usePoll
+        )
+
+    #---------------------------------------------------------------------------
+    def tearDown(self):
+        self.watcher.stop(1.0)
+        shutil.rmtree(self.spoolDir)
+
+    #---------------------------------------------------------------------------
+    def drop(self, name, value, metric="job"):
+        """ Atomically drop a metric file into the spool directory. """
+        data = {"name": metric, "description": "Job metrics.",
+                "labels": ["metric"], "metrics": [[["progress"], value]]}
+        tmpName = op.join(self.spoolDir, f".{name}.tmp")
+        with open(tmpName, "w", encoding="UTF-8") as fout:
+            json.dump(data, fout)
+        os.rename(tmpName, op.join(self.spoolDir, name))
+
+    #---------------------------------------------------------------------------
+    def value(self, metric="job"):
+        """ Current value of a metric in the registry. """
+        return self.registry.get_sample_value(metric, {"metric": "progress"})
+
+    #---------------------------------------------------------------------------
+    def testExistingFiles(self):
+        """ Files present at start are deployed. """
+        self.drop("a.json", 1.0)
+        self.watcher.start()
+        self.assertEqual(self.value(), 1.0)
+
+    #---------------------------------------------------------------------------
+    def testLifecycle(self):
+        """ Turrets are created, refreshed and retired with their files. """
+        self.watcher.start()
+        self.assertIsNone(self.value())
+
+        self.drop("a.json", 1.0)
+        self.assertTrue(waitFor(lambda: self.value() == 1.0))
+
+        self.drop("a.json", 2.0)
+        self.assertTrue(waitFor(lambda: self.value() == 2.0))
+
+        self.drop("b.json", 3.0, metric="other")
+        self.assertTrue(waitFor(lambda: self.value("other") == 3.0))
+
+        os.remove(op.join(self.spoolDir, "a.json"))
+        self.assertTrue(waitFor(lambda: self.value() is None))
+        self.assertEqual(list(self.watcher.turrets),
+                         [op.join(op.realpath(self.spoolDir), "b.json")])
+
+    #---------------------------------------------------------------------------
+    def testInvalidFileRetried(self):
+        """ An invalid file is deployed once it becomes valid. """
+        self.watcher.start()
+        with open(op.join(self.spoolDir, "a.json"), "w",
+                  encoding="UTF-8") as fout:
+            fout.write("{")
+        time.sleep(0.2)
+        self.assertEqual(self.watcher.turrets, {})
+        self.drop("a.json", 4.0)
+        self.assertTrue(waitFor(lambda: self.value() == 4.0))
+
+#-------------------------------------------------------------------------------
+class TestPollingJsonTurretWatcher(TestJsonTurretWatcher):
+    """ Test JsonTurretWatcher when polling. """
+    usePoll = True